@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Generate a synthetic run dir in the layout of `RUN_DIR_STRUCTURE`, with
+finished runs in mixed states, logs and outputs, and build its index.
+
+    $ python3 -m benchmarks.gen_run_dir --run-dir /tmp/bench-run --runs 10000
+"""
+import argparse
+import json
+import os
+import random
+import uuid
+from argparse import ArgumentParser, Namespace
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+from genpei.const import DATE_FORMAT, RUN_DIR_STRUCTURE
+from genpei.type import OutputFile
+from genpei.util import reindex
+
+# Only finished runs, as genpei would dispatch the QUEUED runs and finish
+# the RUNNING runs without a live process at startup.
+STATE_WEIGHTS: Dict[str, float] = {
+    "COMPLETE": 0.8,
+    "EXECUTOR_ERROR": 0.1,
+    "CANCELED": 0.07,
+    "SYSTEM_ERROR": 0.03,
+}
+EXIT_CODES: Dict[str, str] = {
+    "COMPLETE": "0",
+    "EXECUTOR_ERROR": "1",
+    "CANCELED": "143",
+}
+LOG_LINE: str = "INFO [job trimming_and_qc] /tmp/abcdefgh$ docker run " + \
+    "--rm --workdir=/var/spool/cwl quay.io/biocontainers/fastqc:0.11.9\n"
+
+
+def parse_args() -> Namespace:
+    parser: ArgumentParser = argparse.ArgumentParser(
+        description="Generate a synthetic run dir for benchmarks.")
+    parser.add_argument("-r", "--run-dir", required=True, type=Path,
+                        help="The run dir to generate runs in.")
+    parser.add_argument("--runs", default=1000, type=int,
+                        help="Number of runs. (default: 1000)")
+    parser.add_argument("--outputs", default=5, type=int,
+                        help="Mean number of output files per run. " +
+                        "(default: 5)")
+    parser.add_argument("--output-size", default=1024 * 1024, type=int,
+                        help="Mean size in bytes of an output file. The " +
+                        "files are sparse. (default: 1048576)")
+    parser.add_argument("--log-size", default=16 * 1024, type=int,
+                        help="Mean size in bytes of stderr.log. " +
+                        "(default: 16384)")
+    parser.add_argument("--days", default=30, type=int,
+                        help="The runs are submitted over the last days. " +
+                        "(default: 30)")
+    parser.add_argument("--jobs", default=os.cpu_count() or 1, type=int,
+                        help="Number of processes writing the runs. " +
+                        "(default: the number of CPUs)")
+    parser.add_argument("--seed", default=0, type=int,
+                        help="Seed of the generated runs. (default: 0)")
+
+    return parser.parse_args()
+
+
+def around(rng: random.Random, mean: int) -> int:
+    """
+    A log-normal size or count with the given mean, as file sizes are.
+    """
+    if mean <= 0:
+        return 0
+
+    return int(rng.lognormvariate(0, 1) * mean / 1.6487)
+
+
+def write_text(path: Path, content: str, mtime: float) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open(mode="w") as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+def generate_run(args: Namespace, index: int) -> str:
+    rng: random.Random = random.Random(f"{args.seed}-{index}")
+    run_id: str = str(uuid.UUID(int=rng.getrandbits(128), version=4))
+    run_dir: Path = args.run_dir.joinpath(run_id[:2], run_id)
+    state: str = rng.choices(list(STATE_WEIGHTS),
+                             list(STATE_WEIGHTS.values()))[0]
+    submitted_at: datetime = datetime.now() - \
+        timedelta(seconds=rng.uniform(0, args.days * 24 * 60 * 60))
+    start_time: datetime = submitted_at + timedelta(seconds=rng.uniform(0, 60))
+    end_time: datetime = \
+        start_time + timedelta(seconds=rng.lognormvariate(6, 1.5))
+    mtime: float = end_time.timestamp()
+
+    def path(file_type: str) -> Path:
+        return run_dir.joinpath(RUN_DIR_STRUCTURE[file_type])
+
+    wf_params: str = json.dumps({
+        "fastq_1": {"class": "File", "location": "ERR034597_1.small.fq.gz"},
+        "fastq_2": {"class": "File", "location": "ERR034597_2.small.fq.gz"},
+    })
+    wf_url: str = "https://raw.githubusercontent.com/suecharo/genpei/" + \
+        "master/tests/resources/trimming_and_qc_remote.cwl"
+    write_text(path("run_request"), json.dumps({
+        "workflow_params": wf_params,
+        "workflow_type": "CWL",
+        "workflow_type_version": "v1.0",
+        "tags": json.dumps({"workflow_name": "trimming_and_qc"}),
+        "workflow_engine_parameters": json.dumps({}),
+        "workflow_url": wf_url,
+    }, indent=2), submitted_at.timestamp())
+    write_text(path("wf_params"), wf_params, submitted_at.timestamp())
+    write_text(path("attachments"), "[]", submitted_at.timestamp())
+    write_text(path("cmd"),
+               f"cwltool --outdir {path('outputs_dir')} {wf_url} " +
+               f"{path('wf_params')}", start_time.timestamp())
+    write_text(path("start_time"), start_time.strftime(DATE_FORMAT),
+               start_time.timestamp())
+    write_text(path("pid"), str(rng.randint(1000, 4000000)),
+               start_time.timestamp())
+    write_text(path("end_time"), end_time.strftime(DATE_FORMAT), mtime)
+    if state in EXIT_CODES:
+        write_text(path("exit_code"), EXIT_CODES[state], mtime)
+    else:
+        write_text(path("sys_error"), "Traceback (most recent call last):\n",
+                   mtime)
+    write_text(path("stdout"), "{}\n" if state != "COMPLETE" else
+               json.dumps({"qc_result_1": {"class": "File"}}, indent=4),
+               mtime)
+    write_text(path("stderr"),
+               LOG_LINE * (around(rng, args.log_size) // len(LOG_LINE) + 1),
+               mtime)
+    manifest: List[OutputFile] = []
+    if state == "COMPLETE":
+        outputs_dir: Path = path("outputs_dir")
+        outputs_dir.mkdir(parents=True, exist_ok=True)
+        for i in range(max(around(rng, args.outputs), 1)):
+            name: str = f"ERR034597_{i}.small_fastqc.html"
+            size: int = around(rng, args.output_size)
+            with outputs_dir.joinpath(name).open(mode="wb") as f:
+                f.truncate(size)
+            os.utime(outputs_dir.joinpath(name), (mtime, mtime))
+            manifest.append({
+                "name": name,
+                "path": str(outputs_dir.joinpath(name)),
+                "size": size,
+                "mtime": end_time.strftime(DATE_FORMAT),
+            })
+    write_text(path("outputs"), json.dumps(manifest), mtime)
+    write_text(path("state"), state, mtime)
+
+    return run_id
+
+
+def generate_runs(args: Namespace, indexes: Tuple[int, int]) -> None:
+    for index in range(*indexes):
+        generate_run(args, index)
+
+
+def generate_run_dir(args: Namespace) -> None:
+    chunk: int = 1000
+    with ProcessPoolExecutor(max_workers=args.jobs) as executor:
+        for future in [executor.submit(generate_runs, args,
+                                       (i, min(i + chunk, args.runs)))
+                       for i in range(0, args.runs, chunk)]:
+            future.result()
+    reindex(args.run_dir)
+
+
+def main() -> None:
+    args: Namespace = parse_args()
+    args.run_dir = args.run_dir.resolve()
+    generate_run_dir(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Drive HTTP load against a running genpei and report the latency
+percentiles and the throughput of each endpoint. The report is saved as
+JSON, and compared with the report of another commit by `--compare`.
+
+    $ genpei --run-dir /tmp/bench-run --workers 4 --threads 8 &
+    $ python3 -m benchmarks.load --concurrency 32 --duration 30 \\
+        --output head.json --compare base.json
+"""
+import argparse
+import http.client
+import json
+import random
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+BENCHMARKS_DIR: Path = Path(__file__).parent.resolve()
+ECHO_CWL: Path = BENCHMARKS_DIR.joinpath("echo.cwl")
+DEFAULT_MIX: str = "runs=2,run=4,status=8,service_info=1,post_runs=0"
+ENDPOINTS: List[str] = ["runs", "run", "status", "service_info", "post_runs"]
+
+
+def parse_args(sys_args: List[str]) -> Namespace:
+    parser: ArgumentParser = argparse.ArgumentParser(
+        description="Drive HTTP load against a running genpei.")
+    parser.add_argument("--url", default="http://127.0.0.1:8080",
+                        help="The URL of genpei. " +
+                        "(default: http://127.0.0.1:8080)")
+    parser.add_argument("--concurrency", default=16, type=int,
+                        help="Number of connections sending requests one " +
+                        "after another. (default: 16)")
+    parser.add_argument("--duration", default=30.0, type=float,
+                        help="Seconds to drive load for. (default: 30)")
+    parser.add_argument("--warmup", default=3.0, type=float,
+                        help="Seconds of load not measured first. " +
+                        "(default: 3)")
+    parser.add_argument("--mix", default=DEFAULT_MIX,
+                        help="Relative weights of the endpoints: runs " +
+                        "(GET /runs), run (GET /runs/<id>), status (GET " +
+                        "/runs/<id>/status), service_info (GET " +
+                        "/service-info) and post_runs (POST /runs). " +
+                        f"(default: {DEFAULT_MIX})")
+    parser.add_argument("--page-size", default=100, type=int,
+                        help="page_size of GET /runs. (default: 100)")
+    parser.add_argument("--stub-params", default="{}",
+                        help="workflow_engine_parameters of POST /runs, " +
+                        "e.g. the duration and outputs of the runs of a " +
+                        "genpei started with `--engine stub`. (default: {})")
+    parser.add_argument("--seed", default=0, type=int,
+                        help="Seed of the choice of the requests. " +
+                        "(default: 0)")
+    parser.add_argument("--output", type=Path,
+                        help="Save the report as JSON.")
+    parser.add_argument("--compare", type=Path,
+                        help="Compare with a saved report, and exit with " +
+                        "1 if an endpoint has regressed.")
+    parser.add_argument("--max-regression", default=0.2, type=float,
+                        help="Ratio by which p99 may rise or the throughput " +
+                        "may fall before it is a regression. (default: 0.2)")
+
+    return parser.parse_args(sys_args)
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights: Dict[str, float] = {}
+    for item in mix.split(","):
+        endpoint, weight = item.split("=")
+        if endpoint not in ENDPOINTS:
+            raise ValueError(f"Unknown endpoint {endpoint} in --mix.")
+        weights[endpoint] = float(weight)
+
+    return {endpoint: weight for endpoint, weight in weights.items()
+            if weight > 0}
+
+
+def encode_multipart(fields: Dict[str, str],
+                     files: Dict[str, Path]) -> Tuple[bytes, str]:
+    boundary: str = uuid.uuid4().hex
+    body: List[bytes] = []
+    for name, value in fields.items():
+        body.append((f"--{boundary}\r\nContent-Disposition: form-data; " +
+                     f"name=\"{name}\"\r\n\r\n{value}\r\n").encode())
+    for name, file in files.items():
+        body.append((f"--{boundary}\r\nContent-Disposition: form-data; " +
+                     f"name=\"{name}\"; filename=\"{file.name}\"\r\n" +
+                     "Content-Type: application/octet-stream\r\n\r\n")
+                    .encode())
+        body.append(file.read_bytes() + b"\r\n")
+    body.append(f"--{boundary}--\r\n".encode())
+
+    return b"".join(body), f"multipart/form-data; boundary={boundary}"
+
+
+class Driver:
+    """
+    Each connection sends the next request as soon as the response to the
+    previous one has been read (a closed loop), over a keep-alive
+    connection.
+    """
+
+    def __init__(self, args: Namespace) -> None:
+        self.args: Namespace = args
+        url: Any = urlsplit(args.url)
+        self.host: str = url.hostname
+        self.port: int = url.port or 80
+        self.prefix: str = url.path.rstrip("/")
+        self.weights: Dict[str, float] = parse_mix(args.mix)
+        self.run_ids: List[str] = []
+        self.post_body, self.post_content_type = encode_multipart({
+            "workflow_params": json.dumps({"message": "genpei"}),
+            "workflow_type": "CWL",
+            "workflow_type_version": "v1.0",
+            "tags": json.dumps({"workflow_name": "echo"}),
+            "workflow_engine_parameters": args.stub_params,
+            "workflow_url": ECHO_CWL.name,
+        }, {"workflow_attachment": ECHO_CWL})
+        self.latencies: Dict[str, List[float]] = \
+            {endpoint: [] for endpoint in self.weights}
+        self.errors: Dict[str, int] = \
+            {endpoint: 0 for endpoint in self.weights}
+        self.lock: threading.Lock = threading.Lock()
+
+    def connect(self) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection(self.host, self.port, timeout=60)
+
+    def load_run_ids(self) -> None:
+        conn: http.client.HTTPConnection = self.connect()
+        conn.request("GET", f"{self.prefix}/runs?page_size=1000")
+        res: http.client.HTTPResponse = conn.getresponse()
+        self.run_ids = [run["run_id"] for run in json.load(res)["runs"]]
+        conn.close()
+        if len(self.run_ids) == 0 and \
+                ("run" in self.weights or "status" in self.weights):
+            raise Exception("There is no run to request. Generate them " +
+                            "by `python3 -m benchmarks.gen_run_dir`.")
+
+    def request(self, conn: http.client.HTTPConnection, endpoint: str,
+                rng: random.Random) -> int:
+        headers: Dict[str, str] = {}
+        body: Optional[bytes] = None
+        method: str = "GET"
+        if endpoint == "runs":
+            path: str = f"/runs?page_size={self.args.page_size}"
+        elif endpoint == "run":
+            path = f"/runs/{rng.choice(self.run_ids)}"
+        elif endpoint == "status":
+            path = f"/runs/{rng.choice(self.run_ids)}/status"
+        elif endpoint == "service_info":
+            path = "/service-info"
+        else:
+            method = "POST"
+            path = "/runs"
+            body = self.post_body
+            headers["Content-Type"] = self.post_content_type
+        conn.request(method, self.prefix + path, body=body, headers=headers)
+        res: http.client.HTTPResponse = conn.getresponse()
+        res.read()
+
+        return res.status
+
+    def run_connection(self, index: int, start: float, end: float) -> None:
+        rng: random.Random = random.Random(f"{self.args.seed}-{index}")
+        endpoints: List[str] = list(self.weights)
+        weights: List[float] = list(self.weights.values())
+        conn: http.client.HTTPConnection = self.connect()
+        latencies: Dict[str, List[float]] = \
+            {endpoint: [] for endpoint in endpoints}
+        errors: Dict[str, int] = {endpoint: 0 for endpoint in endpoints}
+        while True:
+            endpoint: str = rng.choices(endpoints, weights)[0]
+            sent_at: float = time.perf_counter()
+            if sent_at >= end:
+                break
+            try:
+                status: int = self.request(conn, endpoint, rng)
+            except (OSError, http.client.HTTPException):
+                status = 0
+                conn.close()
+                conn = self.connect()
+            if sent_at < start:
+                continue
+            if status == 200:
+                latencies[endpoint].append(time.perf_counter() - sent_at)
+            else:
+                errors[endpoint] += 1
+        conn.close()
+        with self.lock:
+            for endpoint in endpoints:
+                self.latencies[endpoint].extend(latencies[endpoint])
+                self.errors[endpoint] += errors[endpoint]
+
+    def run(self) -> Dict[str, Any]:
+        self.load_run_ids()
+        start: float = time.perf_counter() + self.args.warmup
+        end: float = start + self.args.duration
+        threads: List[threading.Thread] = [
+            threading.Thread(target=self.run_connection, args=(i, start, end))
+            for i in range(self.args.concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        return make_report(self.args, self.latencies, self.errors)
+
+
+def percentile(values: List[float], ratio: float) -> float:
+    if len(values) == 0:
+        return 0.0
+
+    return values[min(int(len(values) * ratio), len(values) - 1)]
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCHMARKS_DIR,
+            capture_output=True, check=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(args: Namespace, latencies: Dict[str, List[float]],
+                errors: Dict[str, int]) -> Dict[str, Any]:
+    endpoints: Dict[str, Dict[str, float]] = {}
+    all_latencies: List[float] = []
+    for endpoint, values in latencies.items():
+        values.sort()
+        all_latencies.extend(values)
+        endpoints[endpoint] = summarize(values, errors[endpoint],
+                                        args.duration)
+    all_latencies.sort()
+
+    return {
+        "commit": get_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "params": {
+            "url": args.url,
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "mix": args.mix,
+            "page_size": args.page_size,
+            "stub_params": args.stub_params,
+        },
+        "total": summarize(all_latencies, sum(errors.values()),
+                           args.duration),
+        "endpoints": endpoints,
+    }
+
+
+def summarize(values: List[float], errors: int,
+              duration: float) -> Dict[str, float]:
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "throughput": len(values) / duration,
+        "mean": sum(values) / len(values) if len(values) != 0 else 0.0,
+        "p50": percentile(values, 0.5),
+        "p90": percentile(values, 0.9),
+        "p99": percentile(values, 0.99),
+        "max": values[-1] if len(values) != 0 else 0.0,
+    }
+
+
+def print_report(report: Dict[str, Any],
+                 base: Optional[Dict[str, Any]] = None) -> None:
+    print(f"commit: {report['commit']}, params: {report['params']}")
+    if base is not None:
+        print(f"compared with commit: {base['commit']}, " +
+              f"params: {base['params']}")
+    print(f"{'endpoint':<14}{'req/s':>10}{'p50 ms':>10}{'p90 ms':>10}" +
+          f"{'p99 ms':>10}{'errors':>8}")
+    rows: List[Tuple[str, Dict[str, float]]] = \
+        [*report["endpoints"].items(), ("total", report["total"])]
+    for endpoint, summary in rows:
+        print(f"{endpoint:<14}{summary['throughput']:>10.1f}" +
+              f"{summary['p50'] * 1000:>10.2f}" +
+              f"{summary['p90'] * 1000:>10.2f}" +
+              f"{summary['p99'] * 1000:>10.2f}{summary['errors']:>8}")
+        base_summary: Optional[Dict[str, float]] = \
+            get_base_summary(base, endpoint)
+        if base_summary is not None:
+            print(f"{'  change':<14}" +
+                  f"{change(summary, base_summary, 'throughput'):>10}" +
+                  f"{change(summary, base_summary, 'p50'):>10}" +
+                  f"{change(summary, base_summary, 'p90'):>10}" +
+                  f"{change(summary, base_summary, 'p99'):>10}")
+
+
+def get_base_summary(base: Optional[Dict[str, Any]],
+                     endpoint: str) -> Optional[Dict[str, float]]:
+    if base is None:
+        return None
+    if endpoint == "total":
+        return base["total"]  # type: ignore
+
+    return base["endpoints"].get(endpoint)  # type: ignore
+
+
+def change(summary: Dict[str, float], base_summary: Dict[str, float],
+           key: str) -> str:
+    if base_summary[key] == 0:
+        return "-"
+
+    return f"{(summary[key] / base_summary[key] - 1) * 100:+.1f}%"
+
+
+def find_regressions(report: Dict[str, Any], base: Dict[str, Any],
+                     max_regression: float) -> List[str]:
+    regressions: List[str] = []
+    for endpoint, summary in report["endpoints"].items():
+        base_summary: Optional[Dict[str, float]] = \
+            get_base_summary(base, endpoint)
+        if base_summary is None:
+            continue
+        if summary["p99"] > base_summary["p99"] * (1 + max_regression):
+            regressions.append(f"{endpoint}: p99 " +
+                               change(summary, base_summary, "p99"))
+        if summary["throughput"] < \
+                base_summary["throughput"] * (1 - max_regression):
+            regressions.append(f"{endpoint}: throughput " +
+                               change(summary, base_summary, "throughput"))
+
+    return regressions
+
+
+def main() -> None:
+    args: Namespace = parse_args(sys.argv[1:])
+    report: Dict[str, Any] = Driver(args).run()
+    if args.output is not None:
+        with args.output.open(mode="w") as f:
+            json.dump(report, f, indent=2)
+    base: Optional[Dict[str, Any]] = None
+    if args.compare is not None:
+        with args.compare.open(mode="r") as f:
+            base = json.load(f)
+    print_report(report, base)
+    if base is not None:
+        regressions: List[str] = \
+            find_regressions(report, base, args.max_regression)
+        for regression in regressions:
+            print(f"regression: {regression}")
+        if len(regressions) != 0:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from io import BytesIO
+from typing import Any, Callable, Dict, Tuple
+
+import pytest
+from flask import Flask
+from werkzeug.test import EnvironBuilder
+
+from genpei.run import get_run_log, prepare_exe_dir
+from genpei.upload import AttachmentWriter, GenpeiRequest
+from genpei.util import generate_run_id, get_path
+
+from .bench_util import pick_run_id
+
+
+def test_get_run_log_by_runs(run_dir_app: Tuple[Flask, int],
+                             measure: Callable[..., Any]) -> None:
+    app, runs = run_dir_app
+    with app.test_request_context():
+        measure(get_run_log, runs, "runs", pick_run_id())
+
+
+def test_get_run_log_by_outputs(outputs_app: Tuple[Flask, str, int],
+                                measure: Callable[..., Any]) -> None:
+    app, run_id, outputs = outputs_app
+    with app.test_request_context():
+        run_log: Any = measure(get_run_log, outputs, "outputs", run_id)
+
+    assert len(run_log["outputs"]) == outputs
+
+
+def post_attachments(request: GenpeiRequest, run_id: str) -> None:
+    """
+    Parse the multipart body as the controller does, streaming the file
+    parts into the exe dir, and finish the exe dir.
+    """
+    prepare_exe_dir(run_id, request.files)
+
+
+@pytest.mark.parametrize("attachments", [1, 10, 100])
+def test_prepare_exe_dir(empty_app: Flask, attachments: int,
+                         measure: Callable[..., Any]) -> None:
+    run_id: str = generate_run_id()
+    content: bytes = b"\0" * 1024
+
+    def setup() -> Tuple[Tuple[GenpeiRequest, str], Dict[str, Any]]:
+        builder: EnvironBuilder = EnvironBuilder(
+            method="POST", data={
+                f"file_{i}": (BytesIO(content), f"file_{i}.txt")
+                for i in range(attachments)})
+        request: GenpeiRequest = GenpeiRequest(builder.get_environ())
+        request.upload_dir = get_path(run_id, "exe_dir")
+
+        return (request, run_id), {}
+
+    with empty_app.test_request_context():
+        measure(post_attachments, attachments, "attachments", setup=setup)
+        request: GenpeiRequest = setup()[0][0]
+
+        # The file parts take the streaming path, not the spooled fallback
+        assert all(isinstance(file.stream, AttachmentWriter)
+                   for file in request.files.values())
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import json
+from typing import Any, Callable, List, Tuple
+
+import pytest
+from flask import Flask
+
+from genpei.util import (count_system_state, flatten_wf_engine_params,
+                         get_all_run_ids, get_outputs, get_state, read_file)
+
+
+def pick_run_id() -> str:
+    run_ids: List[str] = get_all_run_ids()
+
+    return run_ids[len(run_ids) // 2]
+
+
+def test_get_all_run_ids(run_dir_app: Tuple[Flask, int],
+                         measure: Callable[..., Any]) -> None:
+    app, runs = run_dir_app
+    with app.test_request_context():
+        run_ids: List[str] = measure(get_all_run_ids, runs, "runs")
+
+    assert len(run_ids) == runs
+
+
+def test_get_state(run_dir_app: Tuple[Flask, int],
+                   measure: Callable[..., Any]) -> None:
+    app, runs = run_dir_app
+    with app.test_request_context():
+        measure(get_state, runs, "runs", pick_run_id())
+
+
+def test_read_file(run_dir_app: Tuple[Flask, int],
+                   measure: Callable[..., Any]) -> None:
+    app, runs = run_dir_app
+    with app.test_request_context():
+        run_request: Any = \
+            measure(read_file, runs, "runs", pick_run_id(), "run_request")
+
+    assert run_request["workflow_type"] == "CWL"
+
+
+def test_count_system_state(run_dir_app: Tuple[Flask, int],
+                            measure: Callable[..., Any]) -> None:
+    app, runs = run_dir_app
+    with app.test_request_context():
+        state_counts: Any = measure(count_system_state, runs, "runs")
+
+    assert sum(state_counts.values()) == runs
+
+
+def test_get_outputs(outputs_app: Tuple[Flask, str, int],
+                     measure: Callable[..., Any]) -> None:
+    app, run_id, outputs = outputs_app
+    with app.test_request_context():
+        run_outputs: Any = measure(get_outputs, outputs, "outputs", run_id)
+
+    assert len(run_outputs) == outputs
+
+
+@pytest.mark.parametrize("params", [1, 10, 100])
+def test_flatten_wf_engine_params(empty_app: Flask, params: int,
+                                  measure: Callable[..., Any]) -> None:
+    wf_engine_params: str = json.dumps(
+        {f"--param-{i}": str(i) for i in range(params)})
+    with empty_app.test_request_context():
+        flattened: List[str] = measure(flatten_wf_engine_params, params,
+                                       "params", wf_engine_params)
+
+    assert len(flattened) >= params * 2
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# coding: utf-8
+"""
+Fixtures of the micro benchmarks: run dirs generated by `gen_run_dir` for
+each size in `--bench-runs`, and a run with each number of outputs in
+`--bench-outputs`. The run dirs are generated once per session.
+
+At the end of the session, the median time of each function is fitted
+against the size as `time ~ time0 + c * (size - size0) ** slope`, and the
+slope is reported as the complexity class of the function in that size.
+"""
+import math
+import os
+import shutil
+from argparse import Namespace
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pytest
+from _pytest.config import Config
+from _pytest.config.argparsing import Parser
+from _pytest.fixtures import SubRequest
+from _pytest.terminal import TerminalReporter
+from _pytest.tmpdir import TempPathFactory
+from flask import Flask
+
+from benchmarks.gen_run_dir import generate_run, generate_run_dir
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+from genpei.util import write_outputs_manifest
+
+# (function, size name) -> [(size, median seconds)]
+MEASUREMENTS: Dict[Tuple[str, str], List[Tuple[int, float]]] = \
+    defaultdict(list)
+
+
+def pytest_addoption(parser: Parser) -> None:
+    parser.addoption("--bench-runs", default="100,1000,10000",
+                     help="Comma separated numbers of runs of the " +
+                     "generated run dirs. (default: 100,1000,10000)")
+    parser.addoption("--bench-outputs", default="10,100,1000",
+                     help="Comma separated numbers of output files of a " +
+                     "run. (default: 10,100,1000)")
+
+
+def pytest_generate_tests(metafunc: pytest.Metafunc) -> None:
+    for fixture, option in [("run_dir_app", "--bench-runs"),
+                            ("outputs_app", "--bench-outputs")]:
+        if fixture in metafunc.fixturenames:
+            sizes: List[int] = [
+                int(size) for size in
+                str(metafunc.config.getoption(option)).split(",")]
+            metafunc.parametrize(fixture, sizes, indirect=True,
+                                 ids=[str(size) for size in sizes],
+                                 scope="session")
+
+
+def make_app(run_dir: Path) -> Flask:
+    args: Namespace = parse_args(["--run-dir", str(run_dir)])
+    app: Flask = create_app(handle_default_params(args))
+    app.testing = True
+
+    return app
+
+
+def gen_args(run_dir: Path, runs: int, outputs: int) -> Namespace:
+    return Namespace(run_dir=run_dir, runs=runs, outputs=outputs,
+                     output_size=1024 * 1024, log_size=16 * 1024, days=30,
+                     jobs=os.cpu_count() or 1, seed=0)
+
+
+@pytest.fixture(scope="session")
+def run_dir_app(request: SubRequest, tmp_path_factory: TempPathFactory) \
+        -> Tuple[Flask, int]:
+    """
+    An app on a run dir of `request.param` finished runs.
+    """
+    runs: int = request.param
+    run_dir: Path = tmp_path_factory.mktemp(f"runs-{runs}")
+    generate_run_dir(gen_args(run_dir, runs, 5))
+
+    return make_app(run_dir), runs
+
+
+@pytest.fixture(scope="session")
+def outputs_app(request: SubRequest, tmp_path_factory: TempPathFactory) \
+        -> Tuple[Flask, str, int]:
+    """
+    An app on a run dir with a single COMPLETE run of `request.param`
+    output files, and its manifest.
+    """
+    outputs: int = request.param
+    run_dir: Path = tmp_path_factory.mktemp(f"outputs-{outputs}")
+    args: Namespace = gen_args(run_dir, 1, 0)
+    index: int = 0
+    while True:
+        run_id: str = generate_run(args, index)
+        state_file: Path = run_dir.joinpath(
+            run_id[:2], run_id, RUN_DIR_STRUCTURE["state"])
+        if state_file.read_text() == "COMPLETE":
+            break
+        index += 1
+    outputs_dir: Path = run_dir.joinpath(
+        run_id[:2], run_id, RUN_DIR_STRUCTURE["outputs_dir"])
+    shutil.rmtree(outputs_dir)
+    outputs_dir.mkdir()
+    for i in range(outputs):
+        with outputs_dir.joinpath(f"output_{i}.txt").open(mode="wb") as f:
+            f.truncate(1024)
+    write_outputs_manifest(run_id, run_dir)
+
+    return make_app(run_dir), run_id, outputs
+
+
+@pytest.fixture(scope="session")
+def empty_app(tmp_path_factory: TempPathFactory) -> Flask:
+    """
+    An app on an empty run dir, for the functions that do not depend on it.
+    """
+    return make_app(tmp_path_factory.mktemp("empty"))
+
+
+@pytest.fixture
+def measure(benchmark: Any) -> Callable[..., Any]:
+    """
+    Benchmark `func` and record its median time against `size`, in the
+    benchmark group of the function. With `setup`, which returns the args
+    and kwargs of each call, every round calls `func` once on fresh
+    arguments (e.g. the streams consumed by the call).
+    """
+    def _measure(func: Callable[..., Any], size: int, size_name: str,
+                 *args: Any, setup: Optional[Callable[[], Any]] = None,
+                 **kwargs: Any) -> Any:
+        group: str = func.__name__
+        benchmark.group = f"{group} by {size_name}"
+        benchmark.extra_info[size_name] = size
+        result: Any
+        if setup is None:
+            result = benchmark(func, *args, **kwargs)
+        else:
+            result = benchmark.pedantic(func, setup=setup, rounds=100)
+        if benchmark.stats is not None:
+            MEASUREMENTS[(group, size_name)].append(
+                (size, benchmark.stats.stats.median))
+
+        return result
+
+    return _measure
+
+
+def fit_slope(points: List[Tuple[int, float]]) -> float:
+    """
+    The exponent of the growth of the time with the size. The time of the
+    smallest size is taken as the constant part of the function (e.g. the
+    opening of a file or of the index), and the least squares slope of
+    log(time - time0) against log(size - size0) is returned, so that the
+    constant does not mask the growth at the sizes measured.
+    """
+    size_0, time_0 = points[0]
+    if points[-1][1] < time_0 * 1.25:
+        return 0.0
+    excess: List[Tuple[float, float]] = [
+        (math.log(size - size_0), math.log(median - time_0))
+        for size, median in points[1:] if median > time_0]
+    if len(excess) < 2:
+        size_1, time_1 = points[-1]
+        return math.log(time_1 / time_0) / math.log(size_1 / size_0)
+    x_mean: float = sum(x for x, _ in excess) / len(excess)
+    y_mean: float = sum(y for _, y in excess) / len(excess)
+    var: float = sum((x - x_mean) ** 2 for x, _ in excess)
+    if var == 0:
+        return 0.0
+
+    return sum((x - x_mean) * (y - y_mean) for x, y in excess) / var
+
+
+def complexity_class(slope: float, size_name: str) -> str:
+    if slope < 0.25:
+        return "O(1)"
+    elif slope < 0.75:
+        return f"sublinear in {size_name}"
+    elif slope < 1.25:
+        return f"O({size_name})"
+
+    return f"superlinear in {size_name}"
+
+
+def pytest_terminal_summary(terminalreporter: TerminalReporter,
+                            config: Config) -> None:
+    if len(MEASUREMENTS) == 0:
+        return
+    terminalreporter.section("complexity")
+    for (group, size_name), points in sorted(MEASUREMENTS.items()):
+        points = sorted(dict(points).items())
+        if len(points) < 2:
+            continue
+        slope: float = fit_slope(points)
+        times: str = ", ".join(f"{size}: {median * 1e6:.1f} us"
+                               for size, median in points)
+        terminalreporter.write_line(
+            f"{group:<26} slope {slope:5.2f} " +
+            f"{complexity_class(slope, size_name):<24} ({times})")
@@ -1,22 +1,37 @@
 #!/usr/bin/env python3
 # coding: utf-8
 import argparse
-import json
 import os
 import sys
 from argparse import ArgumentParser, Namespace
 from pathlib import Path
 from traceback import format_exc
-from typing import Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Union
 
 from flask import Flask, Response, current_app, jsonify
-from jsonschema import validate
 from werkzeug.exceptions import HTTPException
 
-from genpei.const import (DEFAULT_HOST, DEFAULT_PORT, DEFAULT_RUN_DIR,
-                          DEFAULT_SERVICE_INFO, SERVICE_INFO_SCHEMA)
+from genpei.compress import compress_response
+from genpei.const import (DEFAULT_BACKFILL_TIMEOUT, DEFAULT_BACKLOG,
+                          DEFAULT_CONTENT_ADDRESSED_STORE,
+                          DEFAULT_CPU_AFFINITY, DEFAULT_ENGINE, DEFAULT_HOST,
+                          DEFAULT_JSON_BACKEND, DEFAULT_KEEP_ALIVE,
+                          DEFAULT_MAX_CONCURRENT_RUNS,
+                          DEFAULT_MAX_CONTENT_LENGTH, DEFAULT_MAX_FILE_SIZE,
+                          DEFAULT_PORT, DEFAULT_RUN_DIR, DEFAULT_SERVICE_INFO,
+                          DEFAULT_THREADS, DEFAULT_TRACE_SAMPLE_RATE,
+                          DEFAULT_WORKERS, ENGINES, JSON_BACKENDS)
 from genpei.controller import app_bp
+from genpei.events import EventHub
+from genpei.json_backend import GenpeiJSONProvider, set_json_backend
+from genpei.metrics import Metrics, observe_request, start_request_timer
+from genpei.registry import index_exists
+from genpei.scheduler import Scheduler
+from genpei.server import run_server
+from genpei.trace import finish_trace, set_tracing, start_trace
 from genpei.type import ErrorResponse
+from genpei.upload import GenpeiRequest
+from genpei.util import load_service_info, reindex
 
 
 def parse_args(sys_args: List[str]) -> Namespace:
@@ -60,14 +75,143 @@ def parse_args(sys_args: List[str]) -> Namespace:
         "workflow_type_versions and system_state_counts are overwritten in " +
         "the application."
     )
+    parser.add_argument(
+        "--workers",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Number of pre-forked worker processes. When it is 1 or more, " +
+        "the app is served by gunicorn instead of the development server " +
+        f"of Flask. (default: {DEFAULT_WORKERS})"
+    )
+    parser.add_argument(
+        "--threads",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Number of threads handling requests in each worker. " +
+        f"(default: {DEFAULT_THREADS})"
+    )
+    parser.add_argument(
+        "--keep-alive",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Seconds to wait for the next request on a keep-alive " +
+        f"connection. (default: {DEFAULT_KEEP_ALIVE})"
+    )
+    parser.add_argument(
+        "--backlog",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Maximum number of pending connections. " +
+        f"(default: {DEFAULT_BACKLOG})"
+    )
+    parser.add_argument(
+        "--json-backend",
+        nargs=1,
+        type=str,
+        choices=JSON_BACKENDS,
+        metavar="",
+        help="JSON backend of the responses and the files in the run dir. " +
+        "auto selects orjson when it is installed, and the stdlib json " +
+        f"otherwise. {JSON_BACKENDS} (default: {DEFAULT_JSON_BACKEND})"
+    )
+    parser.add_argument(
+        "--max-content-length",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Maximum size in bytes of a request body, e.g. all the " +
+        "workflow_attachment of a POST /runs. 0 means no limit. " +
+        f"(default: {DEFAULT_MAX_CONTENT_LENGTH})"
+    )
+    parser.add_argument(
+        "--max-file-size",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Maximum size in bytes of each workflow_attachment. " +
+        f"0 means no limit. (default: {DEFAULT_MAX_FILE_SIZE})"
+    )
+    parser.add_argument(
+        "--max-concurrent-runs",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Maximum number of runs executed at the same time. The other " +
+        "runs wait in QUEUED. 0 means no limit. (default: the number of CPUs)"
+    )
+    parser.add_argument(
+        "--backfill-timeout",
+        nargs=1,
+        type=int,
+        metavar="",
+        help="Seconds the smaller runs may start ahead of a QUEUED run " +
+        "waiting for the cores and memory it requested. After that, the " +
+        "run is started first. 0 disables the backfilling. " +
+        f"(default: {DEFAULT_BACKFILL_TIMEOUT})"
+    )
+    parser.add_argument(
+        "--cpu-affinity",
+        action="store_true",
+        help="Pin each run to as many CPUs as it requested cores."
+    )
+    parser.add_argument(
+        "--engine",
+        nargs=1,
+        type=str,
+        choices=ENGINES,
+        metavar="",
+        help="Workflow engine executing the runs. stub runs nothing, to " +
+        "measure the overhead of Genpei itself; its duration, outputs and " +
+        "failure rate are given by the workflow_engine_parameters " +
+        "`--stub-duration`, `--stub-outputs`, `--stub-output-size` and " +
+        f"`--stub-failure-rate`. {ENGINES} (default: {DEFAULT_ENGINE})"
+    )
+    parser.add_argument(
+        "--content-addressed-store",
+        action="store_true",
+        help="Deduplicate workflow_attachment by hardlinking them to a " +
+        "content addressed store in the run dir."
+    )
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="Trace the requests sending the `X-Genpei-Trace` header, " +
+        "reporting the time spent reading the run dir, serializing JSON, " +
+        "etc. in the `Server-Timing` header of the response."
+    )
+    parser.add_argument(
+        "--trace-sample-rate",
+        nargs=1,
+        type=float,
+        metavar="",
+        help="Fraction of the requests traced regardless of the header. " +
+        f"(default: {DEFAULT_TRACE_SAMPLE_RATE})"
+    )
+    parser.add_argument(
+        "--profile-dir",
+        nargs=1,
+        type=str,
+        metavar="",
+        help="Dump the cProfile of each traced request as a pstats file " +
+        "in this dir."
+    )
+    parser.add_argument(
+        "--reindex",
+        action="store_true",
+        help="Rebuild the run index from the run dir at startup."
+    )
 
     args: Namespace = parser.parse_args(sys_args)
 
     return args
 
 
-def handle_default_params(args: Namespace) -> Dict[str, Union[str, int, Path]]:
-    params: Dict[str, Union[str, int, Path]] = {
+def handle_default_params(args: Namespace) -> Dict[str, Any]:
+    params: Dict[str, Any] = {
         "host": handle_default_host(args.host),
         "port": handle_default_port(args.port),
         "debug": handle_default_debug(args.debug),
@@ -77,6 +221,43 @@ def handle_default_params(args: Namespace) -> Dict[str, Union[str, int, Path]]:
         "service_info": handle_default_path(args.service_info,
                                             "GENPEI_SERVICE_INFO",
                                             DEFAULT_SERVICE_INFO),
+        "workers": handle_default_int(args.workers,
+                                      "GENPEI_WORKERS",
+                                      DEFAULT_WORKERS),
+        "threads": handle_default_int(args.threads,
+                                      "GENPEI_THREADS",
+                                      DEFAULT_THREADS),
+        "keep_alive": handle_default_int(args.keep_alive,
+                                         "GENPEI_KEEP_ALIVE",
+                                         DEFAULT_KEEP_ALIVE),
+        "backlog": handle_default_int(args.backlog,
+                                      "GENPEI_BACKLOG",
+                                      DEFAULT_BACKLOG),
+        "json_backend": handle_default_json_backend(args.json_backend),
+        "max_content_length": handle_default_int(args.max_content_length,
+                                                 "GENPEI_MAX_CONTENT_LENGTH",
+                                                 DEFAULT_MAX_CONTENT_LENGTH),
+        "max_file_size": handle_default_int(args.max_file_size,
+                                            "GENPEI_MAX_FILE_SIZE",
+                                            DEFAULT_MAX_FILE_SIZE),
+        "max_concurrent_runs": handle_default_int(args.max_concurrent_runs,
+                                                  "GENPEI_MAX_CONCURRENT_RUNS",
+                                                  DEFAULT_MAX_CONCURRENT_RUNS),
+        "backfill_timeout": handle_default_int(args.backfill_timeout,
+                                               "GENPEI_BACKFILL_TIMEOUT",
+                                               DEFAULT_BACKFILL_TIMEOUT),
+        "cpu_affinity": handle_default_bool(args.cpu_affinity,
+                                            "GENPEI_CPU_AFFINITY"),
+        "engine": handle_default_engine(args.engine),
+        "content_addressed_store": handle_default_bool(
+            args.content_addressed_store,
+            "GENPEI_CONTENT_ADDRESSED_STORE"),
+        "trace": handle_default_bool(args.trace, "GENPEI_TRACE"),
+        "trace_sample_rate": handle_default_float(args.trace_sample_rate,
+                                                  "GENPEI_TRACE_SAMPLE_RATE",
+                                                  DEFAULT_TRACE_SAMPLE_RATE),
+        "profile_dir": handle_default_profile_dir(args.profile_dir),
+        "reindex": handle_default_reindex(args.reindex),
     }
 
     return params
@@ -103,6 +284,47 @@ def handle_default_debug(debug: bool) -> bool:
     return debug
 
 
+def handle_default_int(input_arg: Optional[List[int]], env_var: str,
+                       default_val: int) -> int:
+    if input_arg is None:
+        return int(os.environ.get(env_var, default_val))
+
+    return int(input_arg[0])
+
+
+def handle_default_float(input_arg: Optional[List[float]], env_var: str,
+                         default_val: float) -> float:
+    if input_arg is None:
+        return float(os.environ.get(env_var, default_val))
+
+    return float(input_arg[0])
+
+
+def handle_default_json_backend(json_backend: Optional[List[str]]) -> str:
+    if json_backend is None:
+        return os.environ.get("GENPEI_JSON_BACKEND", DEFAULT_JSON_BACKEND)
+
+    return json_backend[0]
+
+
+def handle_default_engine(engine: Optional[List[str]]) -> str:
+    if engine is None:
+        return os.environ.get("GENPEI_ENGINE", DEFAULT_ENGINE)
+
+    return engine[0]
+
+
+def handle_default_reindex(reindex: bool) -> bool:
+    return handle_default_bool(reindex, "GENPEI_REINDEX")
+
+
+def handle_default_bool(input_arg: bool, env_var: str) -> bool:
+    if input_arg is False:
+        return str2bool(os.environ.get(env_var, False))
+
+    return input_arg
+
+
 def handle_default_path(input_arg: Optional[List[str]], env_var: str,
                         default_val: Path) -> Path:
     handled_path: Path
@@ -116,6 +338,14 @@ def handle_default_path(input_arg: Optional[List[str]], env_var: str,
     return handled_path
 
 
+def handle_default_profile_dir(profile_dir: Optional[List[str]]) \
+        -> Optional[Path]:
+    if profile_dir is None and "GENPEI_PROFILE_DIR" not in os.environ:
+        return None
+
+    return handle_default_path(profile_dir, "GENPEI_PROFILE_DIR", Path.cwd())
+
+
 def str2bool(val: Union[str, bool]) -> bool:
     if isinstance(val, bool):
         return val
@@ -123,9 +353,7 @@ def str2bool(val: Union[str, bool]) -> bool:
 
 
 def validate_service_info(service_info: Path) -> None:
-    with service_info.open(mode="r") as f_d, \
-            SERVICE_INFO_SCHEMA.open(mode="r") as f_s:
-        validate(json.load(f_d), json.load(f_s))
+    load_service_info(service_info)
 
 
 def fix_errorhandler(app: Flask) -> Flask:
@@ -133,6 +361,7 @@ def fix_errorhandler(app: Flask) -> Flask:
     @app.errorhandler(401)
     @app.errorhandler(403)
     @app.errorhandler(404)
+    @app.errorhandler(413)
     @app.errorhandler(500)
     def error_handler(error: HTTPException) -> Response:
         res_body: ErrorResponse = {
@@ -161,24 +390,70 @@ def fix_errorhandler(app: Flask) -> Flask:
     return app
 
 
-def create_app(params: Dict[str, Union[str, int, Path]]) -> Flask:
+def create_app(params: Dict[str, Any]) -> Flask:
     app = Flask(__name__)
+    app.request_class = GenpeiRequest
+    app.json = GenpeiJSONProvider(app)
     app.register_blueprint(app_bp)
+    app.before_request(start_request_timer)
+    app.before_request(start_trace)
+    app.after_request(observe_request)
+    app.after_request(finish_trace)
+    app.after_request(compress_response)
     fix_errorhandler(app)
     app.config["RUN_DIR"] = params["run_dir"]
     app.config["SERVICE_INFO"] = params["service_info"]
+    app.config["MAX_CONTENT_LENGTH"] = \
+        params.get("max_content_length", DEFAULT_MAX_CONTENT_LENGTH) or None
+    app.config["MAX_FILE_SIZE"] = \
+        params.get("max_file_size", DEFAULT_MAX_FILE_SIZE)
+    app.config["CONTENT_ADDRESSED_STORE"] = \
+        params.get("content_addressed_store",
+                   DEFAULT_CONTENT_ADDRESSED_STORE)
+    app.config["JSON_BACKEND"] = set_json_backend(
+        str(params.get("json_backend", DEFAULT_JSON_BACKEND)))
+    app.config["TRACE"] = params.get("trace", False)
+    app.config["TRACE_SAMPLE_RATE"] = \
+        params.get("trace_sample_rate", DEFAULT_TRACE_SAMPLE_RATE)
+    app.config["PROFILE_DIR"] = params.get("profile_dir")
+    set_tracing(bool(app.config["TRACE"]) or
+                app.config["TRACE_SAMPLE_RATE"] > 0)
     validate_service_info(app.config["SERVICE_INFO"])
+    if params.get("reindex") or not index_exists(app.config["RUN_DIR"]):
+        reindex(app.config["RUN_DIR"])
+    app.extensions["genpei_event_hub"] = EventHub(app.config["RUN_DIR"])
+    # A shard for each thread of the workers, one for the scheduler and one
+    # shared by the other threads
+    metrics: Metrics = Metrics(
+        sorted({rule.endpoint for rule in app.url_map.iter_rules()}),
+        int(params.get("workers", DEFAULT_WORKERS)) *
+        int(params.get("threads", DEFAULT_THREADS)) + 2)
+    app.extensions["genpei_metrics"] = metrics
+    scheduler: Scheduler = Scheduler(
+        app.config["RUN_DIR"], app.config["SERVICE_INFO"],
+        int(params.get("max_concurrent_runs", DEFAULT_MAX_CONCURRENT_RUNS)),
+        str(params.get("engine", DEFAULT_ENGINE)), metrics,
+        int(params.get("backfill_timeout", DEFAULT_BACKFILL_TIMEOUT)),
+        bool(params.get("cpu_affinity", DEFAULT_CPU_AFFINITY)))
+    app.extensions["genpei_scheduler"] = scheduler
+    # Served by gunicorn, the scheduler is started in a process of its own
+    # by run_server, not in the master the workers are forked from.
+    if int(params.get("workers", DEFAULT_WORKERS)) == 0:
+        scheduler.start()
 
     return app
 
 
 def main() -> None:
     args: Namespace = parse_args(sys.argv[1:])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.run(host=params["host"],  # type: ignore
-            port=params["port"],  # type: ignore
-            debug=params["debug"])  # type: ignore
+    if params["workers"] > 0:
+        run_server(app, params)
+    else:
+        app.run(host=params["host"],
+                port=params["port"],
+                debug=params["debug"])
 
 
 if __name__ == "__main__":
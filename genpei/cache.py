@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import hashlib
+import os
+from typing import Any, List, Optional
+
+from flask import Response, request
+
+from genpei.const import RUN_CACHE_MAX_AGE, TERMINAL_STATES
+from genpei.metrics import count_fs_operations
+from genpei.registry import get_latest_event_seq, get_latest_seq
+from genpei.util import get_path, get_state
+
+# The outputs manifest is left out as it is fixed by the outputs dir once
+# the run reaches a terminal state, and may be written lazily at the first
+# read of an old run.
+RUN_LOG_FILES: List[str] = ["run_request", "state", "cmd", "start_time",
+                            "end_time", "exit_code"]
+
+
+def get_run_etag(run_id: str, query: str = "") -> str:
+    """
+    Derived from the mtime and size of the files a RunLog is built from, so
+    it costs a few stats instead of reading the files and walking the
+    outputs dir.
+    """
+    etag: Any = hashlib.sha1(query.encode())
+    count_fs_operations(len(RUN_LOG_FILES))
+    for file_type in RUN_LOG_FILES:
+        try:
+            stat: os.stat_result = get_path(run_id, file_type).stat()
+            etag.update(
+                f"{file_type}:{stat.st_mtime_ns}:{stat.st_size};".encode())
+        except FileNotFoundError:
+            etag.update(f"{file_type}:-;".encode())
+
+    return str(etag.hexdigest())
+
+
+def get_outputs_etag(run_id: str, query: str) -> Optional[str]:
+    """
+    The outputs of a run in progress are listed by walking the outputs dir,
+    which is not covered by the ETag, so they are not cached.
+    """
+    if get_state(run_id) not in TERMINAL_STATES:
+        return None
+
+    return get_run_etag(run_id, query)
+
+
+def get_run_list_etag(query: str) -> str:
+    """
+    Changes when a run is registered or any run changes its state.
+    """
+    return hashlib.sha1(
+        f"{get_latest_seq()}:{get_latest_event_seq()}:{query}".encode())\
+        .hexdigest()
+
+
+def is_not_modified(etag: str) -> bool:
+    return request.if_none_match.contains_weak(etag)
+
+
+def set_cache_headers(response: Response, etag: str,
+                      run_id: Optional[str] = None) -> None:
+    """
+    A finished run does not change any more, so a cache in front of genpei
+    may keep it for RUN_CACHE_MAX_AGE seconds. Anything else has to be
+    revalidated with the ETag.
+    """
+    response.set_etag(etag)
+    if run_id is not None and get_state(run_id) in TERMINAL_STATES:
+        response.cache_control.public = True
+        response.cache_control.max_age = RUN_CACHE_MAX_AGE
+    else:
+        response.cache_control.no_cache = True
+
+
+def not_modified(etag: str, run_id: Optional[str] = None) -> Response:
+    response: Response = Response(status=304)
+    set_cache_headers(response, etag, run_id)
+
+    return response
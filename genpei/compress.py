@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import zlib
+from typing import Any, Iterable, Iterator, List, Optional, Union
+
+from flask import Response, request
+
+from genpei.const import COMPRESS_MIN_SIZE, GZIP_LEVEL, ZSTD_LEVEL
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None  # type: ignore
+
+UNCOMPRESSED_MIMETYPES: List[str] = ["text/event-stream"]
+
+
+def get_encodings() -> List[str]:
+    """
+    The content codings genpei can produce, in order of preference.
+    zstd is available only when `zstandard` is installed.
+    """
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def get_compressor(encoding: str) -> Any:
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compressobj()
+
+    return zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+
+def compress_chunks(chunks: Union[Iterable[str], Iterable[bytes]],
+                    encoding: str) -> Iterator[bytes]:
+    """
+    Compress the chunks of a response body, encoding the str ones in UTF-8
+    as werkzeug does, and close `chunks` (e.g. the file of `send_file`).
+    """
+    compressor: Any = get_compressor(encoding)
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            compressed: bytes = compressor.compress(chunk)
+            if len(compressed) != 0:
+                yield compressed
+        yield compressor.flush()
+    finally:
+        close: Any = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+
+
+def compress_response(response: Response) -> Response:
+    """
+    Compress the response with the coding negotiated through
+    Accept-Encoding, unless it is smaller than COMPRESS_MIN_SIZE. Streamed
+    responses, e.g. the logs read from disk, are compressed chunk by chunk
+    so that the whole body is never held in memory. Range requests and
+    event streams are left as they are.
+    """
+    if response.status_code != 200 or \
+            "Content-Encoding" in response.headers or \
+            response.mimetype in UNCOMPRESSED_MIMETYPES or \
+            request.method == "HEAD" or "Range" in request.headers:
+        return response
+    response.vary.add("Accept-Encoding")
+    encoding: Optional[str] = \
+        request.accept_encodings.best_match(get_encodings())
+    if encoding is None:
+        return response
+    streamed: bool = response.is_streamed or response.direct_passthrough
+    if streamed:
+        if response.content_length is not None and \
+                response.content_length < COMPRESS_MIN_SIZE:
+            return response
+        response.response = compress_chunks(response.response, encoding)
+        response.headers.pop("Content-Length", None)
+    else:
+        data: bytes = response.get_data()
+        if len(data) < COMPRESS_MIN_SIZE:
+            return response
+        response.set_data(b"".join(compress_chunks([data], encoding)))
+    response.content_encoding = encoding
+    # The compressed body is another representation of the same resource
+    etag, weak = response.get_etag()
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+    response.headers.pop("Accept-Ranges", None)
+
+    return response
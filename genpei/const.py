@@ -1,7 +1,10 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, List
+
+from genpei.type import State
 
 SRC_DIR: Path = Path(__file__).parent.resolve()
 
@@ -10,10 +13,69 @@ DEFAULT_SERVICE_INFO: Path = \
 DEFAULT_RUN_DIR = Path.cwd().joinpath("run").resolve()
 DEFAULT_HOST: str = "127.0.0.1"
 DEFAULT_PORT: int = 8080
+DEFAULT_MAX_CONTENT_LENGTH: int = 0
+DEFAULT_MAX_FILE_SIZE: int = 0
+DEFAULT_CONTENT_ADDRESSED_STORE: bool = False
+DEFAULT_MAX_CONCURRENT_RUNS: int = os.cpu_count() or 1
+DEFAULT_WORKERS: int = 0
+DEFAULT_THREADS: int = 8
+DEFAULT_KEEP_ALIVE: int = 2
+DEFAULT_BACKLOG: int = 2048
+DEFAULT_JSON_BACKEND: str = "auto"
+DEFAULT_TRACE_SAMPLE_RATE: float = 0.0
+DEFAULT_ENGINE: str = "cwltool"
+DEFAULT_BACKFILL_TIMEOUT: int = 600
+DEFAULT_CPU_AFFINITY: bool = False
+DEFAULT_RUN_CORES: int = 1
+DEFAULT_RUN_RAM: int = 256
+DEFAULT_OWNER: str = "anonymous"
+DEFAULT_PRIORITY: int = 0
+DEFAULT_OWNER_WEIGHT: float = 1.0
 GET_STATUS_CODE: int = 200
 POST_STATUS_CODE: int = 200
 DATE_FORMAT: str = "%Y-%m-%dT%H:%M:%S"
 CANCEL_TIMEOUT: int = 10
+PID_START_TIME_TOLERANCE: float = 5.0
+INDEX_FILE: str = "index.db"
+INDEX_TIMEOUT: int = 30
+STREAM_CHUNK_SIZE: int = 64 * 1024
+LOG_MIMETYPE: str = "text/plain; charset=utf-8"
+BLOB_DIR: str = "blobs"
+BLOB_MODE: int = 0o444
+SCHEDULER_INTERVAL: float = 1.0
+SCHEDULER_LOCK_FILE: str = "scheduler.lock"
+WAIT_TIME_WINDOW: int = 100
+BACKFILL_DEPTH: int = 100
+EVENT_RETENTION: int = 10000
+EVENT_POLL_INTERVAL: float = 0.2
+EVENT_HEARTBEAT_INTERVAL: float = 15.0
+MAX_STATUS_WAIT: int = 60
+RUN_CACHE_MAX_AGE: int = 24 * 60 * 60
+COMPRESS_MIN_SIZE: int = 1024
+GZIP_LEVEL: int = 6
+ZSTD_LEVEL: int = 3
+ENGINES: List[str] = ["cwltool", "stub"]
+STUB_DURATION: float = 0.0
+STUB_OUTPUTS: int = 1
+STUB_OUTPUT_SIZE: int = 1024
+STUB_FAILURE_RATE: float = 0.0
+JSON_BACKENDS: List[str] = ["auto", "orjson", "json"]
+TRACE_HEADER: str = "X-Genpei-Trace"
+OWNER_HEADER: str = "X-Genpei-Owner"
+PRIORITY_HEADER: str = "X-Genpei-Priority"
+METRICS_MIMETYPE: str = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS: List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                                2.5, 5.0, 10.0]
+FS_OPERATION_BUCKETS: List[float] = [0, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                                     1000]
+SPAWN_BUCKETS: List[float] = [0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5,
+                              5.0, 10.0]
+RUN_BUCKETS: List[float] = [1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 600.0, 1800.0,
+                            3600.0, 3 * 3600.0, 6 * 3600.0, 12 * 3600.0,
+                            24 * 3600.0]
+CANCEL_BUCKETS: List[float] = [0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0,
+                               30.0, 60.0]
+EXECUTOR_PRELOAD: List[str] = ["cwltool.main", "genpei.app"]
 
 SERVICE_INFO_SCHEMA: Path = \
     SRC_DIR.joinpath("service-info.schema.json").resolve()
@@ -32,4 +94,19 @@ RUN_DIR_STRUCTURE: Dict[str, str] = {
     "pid": "run.pid",
     "cmd": "cmd.txt",
     "sys_error": "sys_error.log",
+    "outputs": "outputs.json",
+    "attachments": "attachments.json",
 }
+
+TERMINAL_STATES: List[State] = [
+    State.COMPLETE,
+    State.EXECUTOR_ERROR,
+    State.SYSTEM_ERROR,
+    State.CANCELED,
+]
+
+ACTIVE_STATES: List[State] = [
+    State.INITIALIZING,
+    State.RUNNING,
+    State.CANCELING,
+]
@@ -1,18 +1,30 @@
 #!/usr/bin/env python3
 # coding: utf-8
-import json
-from typing import cast
+import shutil
+from pathlib import Path
+from typing import Optional, cast
 
-from flask import Blueprint, Response, request
+from flask import Blueprint, Response, abort, current_app, request
 from flask.json import jsonify
 
+from genpei.cache import (get_outputs_etag, get_run_etag, get_run_list_etag,
+                          is_not_modified, not_modified, set_cache_headers)
 from genpei.const import GET_STATUS_CODE, POST_STATUS_CODE
-from genpei.run import (cancel_run, fork_run, get_run_log, prepare_exe_dir,
-                        validate_run_id, validate_run_request,
+from genpei.events import get_event_stream, get_run_status
+from genpei.json_backend import dumps
+from genpei.metrics import get_metrics_response
+from genpei.registry import set_run_owner, set_run_resources
+from genpei.run import (cancel_run, cancel_runs, get_log_response,
+                        get_output_list, get_run_list, get_run_log,
+                        prepare_exe_dir, validate_run_id, validate_run_owner,
+                        validate_run_request, validate_run_resources,
                         validate_wf_type)
-from genpei.type import (RunId, RunListResponse, RunLog, RunRequest, RunStatus,
-                         ServiceInfo, State)
-from genpei.util import (generate_run_id, get_all_run_ids, get_state,
+from genpei.scheduler import get_queue_info, wake_scheduler
+from genpei.type import (Blob, OutputListResponse, QueueInfo, Resources, RunId,
+                         RunIdList, RunListResponse, RunLog, RunRequest,
+                         RunStatus, ServiceInfo, State)
+from genpei.upload import get_blob
+from genpei.util import (generate_run_id, get_path, get_run_dir,
                          read_service_info, write_file)
 
 app_bp = Blueprint("genpei", __name__)
@@ -41,18 +53,18 @@ def get_runs() -> Response:
     the list reflect the workflow list at the moment that the first page is
     requested. To monitor a specific workflow run, use GetRunStatus or
     GetRunLog.
+
+    In addition to `page_size` and `page_token`, the runs can be filtered by
+    `state` (repeatable or comma separated), `submitted_after` and
+    `submitted_before` ("%Y-%m-%dT%H:%M:%S").
     """
-    res_body: RunListResponse = {
-        "runs": [],
-        "next_page_token": ""
-    }
-    for run_id in get_all_run_ids():
-        res_body["runs"].append({
-            "run_id": run_id,
-            "state": get_state(run_id).name  # type: ignore
-        })
+    etag: str = get_run_list_etag(request.query_string.decode())
+    if is_not_modified(etag):
+        return not_modified(etag)
+    res_body: RunListResponse = get_run_list(request.args)
     response: Response = jsonify(res_body)
     response.status_code = GET_STATUS_CODE
+    set_cache_headers(response, etag)
 
     return response
 
@@ -63,16 +75,31 @@ def post_runs() -> Response:
     This endpoint creates a new workflow run and returns a `RunId` to monitor
     its progress.
     """
-    run_request: RunRequest = cast(RunRequest, dict(request.form))
-    validate_run_request(run_request)
-    validate_wf_type(run_request["workflow_type"],
-                     run_request["workflow_type_version"])
     run_id: str = generate_run_id()
-    write_file(run_id, "run_request", json.dumps(run_request, indent=2))
+    request.upload_dir = get_path(run_id, "exe_dir")  # type: ignore
+    try:
+        run_request: RunRequest = cast(RunRequest, dict(request.form))
+        validate_run_request(run_request)
+        validate_wf_type(run_request["workflow_type"],
+                         run_request["workflow_type_version"])
+        resources: Resources = validate_run_resources(run_request)
+        owner, priority = validate_run_owner(run_request, request.headers)
+        prepare_exe_dir(run_id, request.files,
+                        request.form.get("workflow_attachment_sha256"))
+    except Exception:
+        run_dir: Path = get_run_dir(run_id)
+        shutil.rmtree(run_dir, ignore_errors=True)
+        try:
+            run_dir.parent.rmdir()
+        except OSError:
+            pass  # The prefix dir holds other runs
+        raise
+    write_file(run_id, "run_request", dumps(run_request, indent=2))
+    set_run_resources(run_id, resources)
+    set_run_owner(run_id, owner, priority)
     write_file(run_id, "wf_params", run_request["workflow_params"])
-    prepare_exe_dir(run_id, request.files)
     write_file(run_id, "state", State.QUEUED.name)
-    fork_run(run_id, run_request)
+    wake_scheduler()
     response: Response = jsonify({
         "run_id": run_id
     })
@@ -81,6 +108,28 @@ def post_runs() -> Response:
     return response
 
 
+@app_bp.route("/queue", methods=["GET"])
+def get_queue() -> Response:
+    """
+    The depth of the run queue and the time the runs wait in it before they
+    are dispatched, to size the concurrency limit of the node.
+    """
+    res_body: QueueInfo = get_queue_info()
+    response: Response = jsonify(res_body)
+    response.status_code = GET_STATUS_CODE
+
+    return response
+
+
+@app_bp.route("/metrics", methods=["GET"])
+def get_metrics() -> Response:
+    """
+    The metrics of the API, the scheduler and the runs in the Prometheus
+    text format.
+    """
+    return get_metrics_response()
+
+
 @app_bp.route("/runs/<run_id>", methods=["GET"])
 def get_runs_id(run_id: str) -> Response:
     """
@@ -92,9 +141,50 @@ def get_runs_id(run_id: str) -> Response:
     the State section).
     """
     validate_run_id(run_id)
+    etag: str = get_run_etag(run_id)
+    if is_not_modified(etag):
+        return not_modified(etag, run_id)
     res_body: RunLog = get_run_log(run_id)
     response: Response = jsonify(res_body)
     response.status_code = GET_STATUS_CODE
+    set_cache_headers(response, etag, run_id)
+
+    return response
+
+
+@app_bp.route("/runs/<run_id>/outputs", methods=["GET"])
+def get_runs_id_outputs(run_id: str) -> Response:
+    """
+    This endpoint pages through the output files of a given workflow run
+    with their size and mtime, using `page_size` and `page_token`. The
+    listing of a finished run is served from the manifest recorded when it
+    finished.
+    """
+    validate_run_id(run_id)
+    etag: Optional[str] = \
+        get_outputs_etag(run_id, request.query_string.decode())
+    if etag is not None and is_not_modified(etag):
+        return not_modified(etag, run_id)
+    res_body: OutputListResponse = get_output_list(run_id, request.args)
+    response: Response = jsonify(res_body)
+    response.status_code = GET_STATUS_CODE
+    if etag is not None:
+        set_cache_headers(response, etag, run_id)
+
+    return response
+
+
+@app_bp.route("/runs/cancel", methods=["POST"])
+def post_runs_cancel() -> Response:
+    """
+    Cancel several runs at once, given by `run_id` and/or by `state`.
+    Returns the runs whose cancel was accepted.
+    """
+    res_body: RunIdList = cancel_runs(request.values)
+    if len(res_body["run_ids"]) != 0:
+        wake_scheduler()
+    response: Response = jsonify(res_body)
+    response.status_code = POST_STATUS_CODE
 
     return response
 
@@ -105,7 +195,8 @@ def post_runs_id_cancel(run_id: str) -> Response:
     Cancel a running workflow.
     """
     validate_run_id(run_id)
-    cancel_run(run_id)
+    if cancel_run(run_id):
+        wake_scheduler()
     res_body: RunId = {"run_id": run_id}
     response: Response = jsonify(res_body)
     response.status_code = POST_STATUS_CODE
@@ -119,13 +210,62 @@ def get_runs_id_status(run_id: str) -> Response:
     This provides an abbreviated (and likely fast depending on implementation)
     status of the running workflow, returning a simple result with the overall
     state of the workflow run (e.g. RUNNING, see the State section).
+    With `wait`, this waits for the state to change from `since`.
     """
     validate_run_id(run_id)
-    res_body: RunStatus = {
-        "run_id": run_id,
-        "state": get_state(run_id).name  # type: ignore
-    }
+    res_body: RunStatus = get_run_status(run_id, request.args)
     response: Response = jsonify(res_body)
     response.status_code = GET_STATUS_CODE
 
     return response
+
+
+@app_bp.route("/events", methods=["GET"])
+def get_events() -> Response:
+    """
+    The state transitions of the runs as server-sent events.
+    """
+    return get_event_stream(request.args,
+                            request.headers.get("Last-Event-ID"))
+
+
+@app_bp.route("/runs/<run_id>/stdout", methods=["GET"])
+def get_runs_id_stdout(run_id: str) -> Response:
+    """
+    Stream the standard output log of the workflow run from disk. Supports
+    HTTP Range requests, `offset` to skip the bytes already read and `tail`
+    to get only the last bytes.
+    """
+    validate_run_id(run_id)
+
+    return get_log_response(run_id, "stdout", request.args)
+
+
+@app_bp.route("/runs/<run_id>/stderr", methods=["GET"])
+def get_runs_id_stderr(run_id: str) -> Response:
+    """
+    Stream the standard error log of the workflow run from disk. Supports
+    HTTP Range requests, `offset` to skip the bytes already read and `tail`
+    to get only the last bytes.
+    """
+    validate_run_id(run_id)
+
+    return get_log_response(run_id, "stderr", request.args)
+
+
+@app_bp.route("/blobs/<sha256>", methods=["GET"])
+def get_blobs(sha256: str) -> Response:
+    """
+    Check whether a file is already in the content addressed store, so that
+    the client can pass its sha256 in `workflow_attachment_sha256` instead of
+    uploading it. HEAD is also accepted.
+    """
+    blob: Optional[Blob] = None
+    if current_app.config["CONTENT_ADDRESSED_STORE"]:
+        blob = get_blob(sha256)
+    if blob is None:
+        abort(404, f"The blob {sha256} you requested does not exist.")
+    response: Response = jsonify(blob)
+    response.status_code = GET_STATUS_CODE
+
+    return response
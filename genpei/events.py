@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+from typing import Deque, Iterator, List, Optional
+
+from flask import Response, abort, current_app
+from werkzeug.datastructures import MultiDict
+
+from genpei.const import (EVENT_HEARTBEAT_INTERVAL, EVENT_POLL_INTERVAL,
+                          EVENT_RETENTION, MAX_STATUS_WAIT)
+from genpei.json_backend import dumps
+from genpei.registry import (get_latest_event_seq, get_state_and_event_seq,
+                             list_events)
+from genpei.run import parse_non_negative_int
+from genpei.type import RunStatus, State, StateEvent
+from genpei.util import get_state
+
+EVENT_STREAM_MIMETYPE: str = "text/event-stream"
+
+
+class EventHub:
+    """
+    Deliver the state transitions recorded in the index to the requests
+    waiting for them. One thread per process polls the index, only while
+    some request is waiting, so the transitions made by the scheduler and
+    by the other workers are delivered as well, and thousands of waiting
+    clients cost a single query per poll.
+    """
+
+    def __init__(self, run_base_dir: Path) -> None:
+        self.run_base_dir: Path = run_base_dir
+        self.cond: threading.Condition = threading.Condition()
+        self.events: Deque[StateEvent] = deque(maxlen=EVENT_RETENTION)
+        self.latest_seq: int = 0
+        self.listeners: int = 0
+        self.pid: Optional[int] = None
+        self.start_lock: threading.Lock = threading.Lock()
+
+    def ensure_running(self) -> None:
+        """
+        The thread is started in each process on first use, as it does not
+        survive the fork of the workers.
+        """
+        with self.start_lock:
+            if self.pid != os.getpid():
+                self.start()
+
+    def start(self) -> None:
+        self.pid = os.getpid()
+        self.cond = threading.Condition()
+        self.events.clear()
+        self.latest_seq = get_latest_event_seq(self.run_base_dir)
+        self.listeners = 0
+        thread: threading.Thread = \
+            threading.Thread(target=self.poll_forever, daemon=True,
+                             name="genpei-event-hub")
+        thread.start()
+
+    def poll_forever(self) -> None:
+        while True:
+            with self.cond:
+                while self.listeners == 0:
+                    self.cond.wait()
+            try:
+                events: List[StateEvent] = \
+                    [{"seq": seq, "run_id": run_id, "state": state,
+                      "time": event_time}
+                     for seq, run_id, state, event_time
+                     in list_events(self.latest_seq, self.run_base_dir)]
+            except Exception:
+                events = []
+            if len(events) != 0:
+                with self.cond:
+                    self.events.extend(events)
+                    self.latest_seq = events[-1]["seq"]
+                    self.cond.notify_all()
+            time.sleep(EVENT_POLL_INTERVAL)
+
+    def wait(self, after_seq: int, timeout: float) -> List[StateEvent]:
+        """
+        Return the events after `after_seq`, waiting up to `timeout` seconds
+        for one to come if there is none yet.
+        """
+        self.ensure_running()
+        deadline: float = time.monotonic() + timeout
+        with self.cond:
+            self.listeners += 1
+            self.cond.notify_all()
+            try:
+                while self.latest_seq <= after_seq:
+                    remaining: float = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return []
+                    self.cond.wait(remaining)
+                if len(self.events) == 0 or \
+                        self.events[0]["seq"] > after_seq + 1:
+                    # Older than the buffer, e.g. a client resuming a stream
+                    return [{"seq": seq, "run_id": run_id, "state": state,
+                             "time": event_time}
+                            for seq, run_id, state, event_time
+                            in list_events(after_seq, self.run_base_dir)]
+                return [event for event in self.events
+                        if event["seq"] > after_seq]
+            finally:
+                self.listeners -= 1
+
+
+def get_event_hub() -> EventHub:
+    hub: EventHub = current_app.extensions["genpei_event_hub"]
+
+    return hub
+
+
+def get_run_status(run_id: str, args: "MultiDict[str, str]") -> RunStatus:
+    """
+    With `wait`, block up to `wait` seconds (at most MAX_STATUS_WAIT) until
+    the state of the run differs from `since`, the current state by default.
+    """
+    wait: Optional[int] = parse_non_negative_int(args.get("wait"), "wait")
+    # The state is read from the index with the seq of the last event it
+    # reflects, as transition_state writes the index before `state.txt`
+    indexed_state, after_seq = get_state_and_event_seq(run_id)
+    state: State = indexed_state or get_state(run_id)
+    if wait is not None:
+        since: State = parse_since(args.get("since"), state)
+        hub: EventHub = get_event_hub()
+        deadline: float = time.monotonic() + min(wait, MAX_STATUS_WAIT)
+        while state == since:
+            remaining: float = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            for event in hub.wait(after_seq, remaining):
+                after_seq = event["seq"]
+                if event["run_id"] == run_id:
+                    state = State[event["state"]]
+    run_status: RunStatus = {
+        "run_id": run_id,
+        "state": state.name  # type: ignore
+    }
+
+    return run_status
+
+
+def parse_since(since: Optional[str], default: State) -> State:
+    if since is None or since == "":
+        return default
+    if since not in State.__members__:
+        abort(400,
+              f"{since}, the since specified in the request, is not " +
+              f"included in {list(State.__members__)}, the available " +
+              "states.")
+
+    return State[since]
+
+
+def get_event_stream(args: "MultiDict[str, str]",
+                     last_event_id: Optional[str]) -> Response:
+    """
+    Stream the state transitions of all the runs, or of the given
+    `run_id`, as server-sent events. A client reconnecting with
+    Last-Event-ID receives the transitions it missed, as long as they are
+    among the latest EVENT_RETENTION.
+    """
+    run_ids: List[str] = \
+        [run_id for arg in args.getlist("run_id")
+         for run_id in arg.split(",") if run_id != ""]
+    after_seq: int
+    if last_event_id is not None and last_event_id.isdecimal():
+        after_seq = int(last_event_id)
+    else:
+        after_seq = get_latest_event_seq()
+    hub: EventHub = get_event_hub()
+
+    def generate() -> Iterator[str]:
+        nonlocal after_seq
+        # Servers send the headers with the first chunk of the body
+        yield ": connected\n\n"
+        while True:
+            events: List[StateEvent] = \
+                hub.wait(after_seq, EVENT_HEARTBEAT_INTERVAL)
+            if len(events) == 0:
+                yield ": keep-alive\n\n"
+                continue
+            for event in events:
+                after_seq = event["seq"]
+                if len(run_ids) != 0 and event["run_id"] not in run_ids:
+                    continue
+                yield f"id: {event['seq']}\nevent: state\n" + \
+                    f"data: {dumps(event)}\n\n"
+
+    response: Response = Response(generate(),
+                                  mimetype=EVENT_STREAM_MIMETYPE)
+    response.headers["Cache-Control"] = "no-cache"
+    response.headers["X-Accel-Buffering"] = "no"
+
+    return response
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import heapq
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from werkzeug.datastructures import Headers
+
+from genpei.const import (DEFAULT_OWNER, DEFAULT_OWNER_WEIGHT,
+                          DEFAULT_PRIORITY, OWNER_HEADER, PRIORITY_HEADER)
+from genpei.json_backend import loads
+from genpei.type import QueuedRun, RunRequest
+
+
+def parse_run_owner(run_request: RunRequest,
+                    headers: Optional[Headers] = None) \
+        -> Tuple[str, int]:
+    """
+    The owner and the priority of a run are given by the `X-Genpei-Owner`
+    and `X-Genpei-Priority` headers of its submission, e.g. set by an
+    authenticating proxy, or else by the `owner` and `priority` of its tags.
+    Raises ValueError unless the priority is an integer.
+    """
+    tags: Any = {}
+    try:
+        tags = loads(run_request.get("tags") or "{}")
+    except ValueError:
+        pass
+    if not isinstance(tags, dict):
+        tags = {}
+    headers = headers or Headers()
+    owner: Any = headers.get(OWNER_HEADER) or tags.get("owner") or \
+        DEFAULT_OWNER
+    priority: Any = headers.get(PRIORITY_HEADER, tags.get("priority"))
+    if priority is None:
+        return str(owner), DEFAULT_PRIORITY
+    try:
+        if isinstance(priority, bool):
+            raise ValueError
+        return str(owner), int(priority)
+    except (TypeError, ValueError):
+        raise ValueError("The priority of the run must be an integer, but " +
+                         f"got {priority}.")
+
+
+def order_queued_runs(queued_runs: List[QueuedRun],
+                      committed_cores: Dict[str, int],
+                      weights: Dict[str, float],
+                      last_turns: Optional[Dict[str, int]] = None) \
+        -> List[QueuedRun]:
+    """
+    Order the QUEUED runs by weighted fair share across their owners. The
+    next run is taken from the owner whose cores, of the active runs and of
+    the runs ordered before, are the fewest for its weight. A tie goes to
+    the owner served least recently by `last_turns` (the turn each owner
+    was last dispatched at), then to the older run, so that the owners take
+    turns on a node running one run at a time. The runs of an owner keep
+    their order, from the highest priority. So an owner with few runs is
+    not starved by one submitting thousands, and starts its next run as
+    soon as the node has room.
+    """
+    turns: Dict[str, int] = dict(last_turns or {})
+    turn: int = max(turns.values(), default=0)
+    queues: Dict[str, Deque[QueuedRun]] = {}
+    for queued_run in queued_runs:
+        queues.setdefault(queued_run["owner"], deque()).append(queued_run)
+    shares: Dict[str, float] = {
+        owner: float(committed_cores.get(owner, 0)) for owner in queues}
+
+    def key(owner: str) -> Tuple[float, int, int, str]:
+        return (shares[owner] / get_weight(owner, weights),
+                turns.get(owner, 0), queues[owner][0]["seq"], owner)
+
+    heap: List[Tuple[float, int, int, str]] = [key(owner) for owner in queues]
+    heapq.heapify(heap)
+    ordered: List[QueuedRun] = []
+    while len(heap) != 0:
+        owner: str = heapq.heappop(heap)[-1]
+        run: QueuedRun = queues[owner].popleft()
+        ordered.append(run)
+        shares[owner] += run["resources"]["cores"]
+        turn += 1
+        turns[owner] = turn
+        if len(queues[owner]) != 0:
+            heapq.heappush(heap, key(owner))
+
+    return ordered
+
+
+def get_weight(owner: str, weights: Dict[str, float]) -> float:
+    return float(weights.get(owner, DEFAULT_OWNER_WEIGHT))
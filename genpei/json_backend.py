@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import json
+from typing import Any, Optional, Union
+
+from flask import Response, current_app
+from flask.json.provider import DefaultJSONProvider
+
+from genpei.trace import traced
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore
+
+_json_backend: str = "json"
+
+
+def set_json_backend(json_backend: str) -> str:
+    """
+    Select the JSON backend used for the responses and the files genpei
+    writes. `auto` selects orjson when it is installed, and the stdlib json
+    otherwise. Returns the backend selected.
+    """
+    global _json_backend
+    if json_backend == "auto":
+        json_backend = "orjson" if orjson is not None else "json"
+    if json_backend == "orjson" and orjson is None:
+        raise Exception("The JSON backend orjson is not installed. " +
+                        "Please install it by `pip install genpei[orjson]`.")
+    if json_backend not in ["orjson", "json"]:
+        raise Exception(f"The JSON backend {json_backend} is not supported.")
+    _json_backend = json_backend
+
+    return _json_backend
+
+
+def get_json_backend() -> str:
+    return _json_backend
+
+
+def dumps_bytes(obj: Any, indent: Optional[int] = None,
+                sort_keys: bool = False) -> bytes:
+    """
+    orjson writes the same text as the stdlib json for the values genpei
+    serializes, except that non-ASCII characters are written as UTF-8
+    instead of being escaped. Its indentation is fixed to 2 spaces.
+    """
+    if _json_backend == "orjson":
+        option: int = orjson.OPT_NON_STR_KEYS
+        if indent is not None:
+            option |= orjson.OPT_INDENT_2
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return orjson.dumps(obj, default=DefaultJSONProvider.default,
+                            option=option)
+
+    return dumps(obj, indent, sort_keys).encode()
+
+
+def dumps(obj: Any, indent: Optional[int] = None,
+          sort_keys: bool = False) -> str:
+    if _json_backend == "orjson":
+        return dumps_bytes(obj, indent, sort_keys).decode()
+
+    return json.dumps(obj, indent=indent, sort_keys=sort_keys,
+                      separators=(",", ": ") if indent is not None
+                      else (",", ":"),
+                      default=DefaultJSONProvider.default)
+
+
+def loads(s: Any) -> Any:
+    if _json_backend == "orjson":
+        return orjson.loads(s)
+
+    return json.loads(s)
+
+
+class GenpeiJSONProvider(DefaultJSONProvider):
+    """
+    The JSON provider of Flask through the JSON backend of genpei. The keys
+    are sorted and the separators are compact as with the default provider,
+    so the responses do not change with the backend.
+    """
+
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if _json_backend == "orjson" and \
+                set(kwargs) <= {"indent", "sort_keys", "separators"}:
+            return dumps(obj, kwargs.get("indent"),
+                         kwargs.get("sort_keys", self.sort_keys))
+
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s: Any, **kwargs: Any) -> Any:
+        if _json_backend == "orjson" and len(kwargs) == 0:
+            return loads(s)
+
+        return super().loads(s, **kwargs)
+
+    @traced
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        obj: Any = self._prepare_response_obj(args, kwargs)
+        indent: Optional[int] = None
+        if self.compact is False or \
+                (self.compact is None and self._app.debug):
+            indent = 2
+        body: Union[str, bytes]
+        if _json_backend == "orjson":
+            body = dumps_bytes(obj, indent, self.sort_keys) + b"\n"
+        elif indent is not None:
+            body = f"{self.dumps(obj, indent=indent)}\n"
+        else:
+            body = f"{self.dumps(obj, separators=(',', ':'))}\n"
+
+        return current_app.response_class(body, mimetype=self.mimetype)
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import mmap
+import multiprocessing as mp
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import nullcontext
+from typing import Any, Dict, List, Optional
+
+from flask import Response, current_app, g, has_request_context, request
+
+from genpei.const import (ACTIVE_STATES, CANCEL_BUCKETS, FS_OPERATION_BUCKETS,
+                          LATENCY_BUCKETS, METRICS_MIMETYPE, RUN_BUCKETS,
+                          SPAWN_BUCKETS)
+from genpei.registry import count_states, sum_active_resources
+from genpei.type import Resources, State
+
+
+class Histogram:
+    """
+    A histogram with one series per value of its label. The observations
+    are counted per bucket, and the buckets are made cumulative when they
+    are exposed.
+    """
+
+    def __init__(self, name: str, doc: str, buckets: List[float],
+                 label: Optional[str] = None,
+                 label_values: Optional[List[str]] = None) -> None:
+        self.name: str = name
+        self.doc: str = doc
+        self.buckets: List[float] = buckets
+        self.label: Optional[str] = label
+        self.label_values: List[str] = label_values or [""]
+        self.series: Dict[str, int] = \
+            {label_value: i for i, label_value in enumerate(self.label_values)}
+        # The buckets, the +Inf bucket and the sum
+        self.series_size: int = len(buckets) + 2
+        self.offset: int = 0
+
+    def size(self) -> int:
+        return len(self.label_values) * self.series_size
+
+    def slot(self, label_value: str = "") -> int:
+        return self.offset + \
+            self.series.get(label_value, len(self.label_values) - 1) * \
+            self.series_size
+
+
+class Metrics:
+    """
+    The metrics of the process and of the workers forked from it. The
+    values are kept in a shared memory created before the workers are
+    forked, in one shard per thread, so that a thread only updates its own
+    shard without a lock and a scrape served by any worker sums up all the
+    threads of all the processes. The gauges of the runs are read from the
+    state counts of the index at scrape time, without looking at the run
+    dir.
+    """
+
+    def __init__(self, endpoints: List[str], shards: int) -> None:
+        endpoints = [*endpoints, "other"]
+        self.request_duration: Histogram = Histogram(
+            "genpei_http_request_duration_seconds",
+            "Time to handle a request until its response is returned.",
+            LATENCY_BUCKETS, "endpoint", endpoints)
+        self.request_fs_operations: Histogram = Histogram(
+            "genpei_http_request_fs_operations",
+            "Run dir files read, written or stat per request.",
+            FS_OPERATION_BUCKETS, "endpoint", endpoints)
+        self.run_spawn: Histogram = Histogram(
+            "genpei_run_spawn_seconds",
+            "Time from the dispatch of a run to the start of its process.",
+            SPAWN_BUCKETS)
+        self.run_wall_time: Histogram = Histogram(
+            "genpei_run_wall_time_seconds",
+            "Time from the start of the process of a run to its exit.",
+            RUN_BUCKETS)
+        self.run_cancel: Histogram = Histogram(
+            "genpei_run_cancel_seconds",
+            "Time from the SIGTERM to a canceled run to its exit.",
+            CANCEL_BUCKETS)
+        self.histograms: List[Histogram] = [
+            self.request_duration, self.request_fs_operations,
+            self.run_spawn, self.run_wall_time, self.run_cancel]
+        self.shard_size: int = 0
+        for histogram in self.histograms:
+            histogram.offset = self.shard_size
+            self.shard_size += histogram.size()
+        self.shards: int = max(shards, 1)
+        self.buffer: mmap.mmap = \
+            mmap.mmap(-1, 8 * self.shard_size * self.shards)
+        self.values: "memoryview[float]" = memoryview(self.buffer).cast("d")
+        self.owners: mmap.mmap = mmap.mmap(-1, 8 * self.shards)
+        self.owner_pids: memoryview = memoryview(self.owners).cast("q")
+        self.claim_lock: Any = mp.Lock()
+        self.pid: Optional[int] = None
+        # The threads of this process owning a shard
+        self.threads: Dict[int, threading.Thread] = {}
+        self.local: threading.local = threading.local()
+        self.shared_lock: threading.Lock = threading.Lock()
+
+    def claim_shard(self) -> None:
+        """
+        Take for the calling thread the shard of a thread or a process that
+        has exited, e.g. of a restarted worker, so its counts are carried
+        on. When all the other shards are in use, the last one is shared by
+        the threads left, under a lock.
+        """
+        pid: int = os.getpid()
+        thread: threading.Thread = threading.current_thread()
+        with self.claim_lock:
+            if self.pid != pid:
+                # The threads of the parent are not forked along
+                self.pid = pid
+                self.threads = {}
+                self.shared_lock = threading.Lock()
+            shard: int = self.shards - 1
+            for i in range(self.shards - 1):
+                owner: int = self.owner_pids[i]
+                if owner == pid:
+                    if i not in self.threads or \
+                            not self.threads[i].is_alive():
+                        shard = i
+                        break
+                elif owner == 0 or not is_process_alive(owner):
+                    shard = i
+                    break
+            self.owner_pids[shard] = pid
+            if shard != self.shards - 1:
+                self.threads[shard] = thread
+        self.local.shard_offset = shard * self.shard_size
+        self.local.shared = shard == self.shards - 1
+        self.local.pid = pid
+
+    def observe(self, histogram: Histogram, value: float,
+                label_value: str = "") -> None:
+        if getattr(self.local, "pid", None) != os.getpid():
+            self.claim_shard()
+        slot: int = self.local.shard_offset + histogram.slot(label_value)
+        bucket: int = bisect_left(histogram.buckets, value)
+        with self.shared_lock if self.local.shared else nullcontext():
+            self.values[slot + bucket] += 1
+            self.values[slot + histogram.series_size - 1] += value
+
+    def collect(self, histogram: Histogram) -> List[float]:
+        values: List[float] = [0.0] * histogram.size()
+        for shard in range(self.shards):
+            offset: int = shard * self.shard_size + histogram.offset
+            for i in range(histogram.size()):
+                values[i] += self.values[offset + i]
+
+        return values
+
+    def expose(self, max_concurrent_runs: int, budget: Resources) -> str:
+        lines: List[str] = []
+        for histogram in self.histograms:
+            lines.extend(expose_histogram(histogram, self.collect(histogram)))
+        state_counts: Dict[str, int] = count_states()
+        committed: Resources = sum_active_resources()
+        lines.append("# HELP genpei_runs Runs in each state.")
+        lines.append("# TYPE genpei_runs gauge")
+        for state in State:
+            lines.append(f'genpei_runs{{state="{state.name}"}} ' +
+                         f"{state_counts.get(state.name, 0)}")
+        gauges: Dict[str, int] = {
+            "genpei_queued_runs": state_counts.get(State.QUEUED.name, 0),
+            "genpei_active_runs": sum(state_counts.get(state.name, 0)
+                                      for state in ACTIVE_STATES),
+            "genpei_max_concurrent_runs": max_concurrent_runs,
+            "genpei_budget_cores": budget["cores"],
+            "genpei_budget_ram_bytes": budget["ram"] * 1024 * 1024,
+            "genpei_committed_cores": committed["cores"],
+            "genpei_committed_ram_bytes": committed["ram"] * 1024 * 1024,
+        }
+        docs: Dict[str, str] = {
+            "genpei_queued_runs": "Runs waiting in the queue.",
+            "genpei_active_runs": "Runs being initialized, run or canceled.",
+            "genpei_max_concurrent_runs":
+                "Maximum number of active runs, 0 means no limit.",
+            "genpei_budget_cores": "Cores budgeted for the runs.",
+            "genpei_budget_ram_bytes": "Memory budgeted for the runs.",
+            "genpei_committed_cores": "Cores requested by the active runs.",
+            "genpei_committed_ram_bytes":
+                "Memory requested by the active runs.",
+        }
+        for name, value in gauges.items():
+            lines.append(f"# HELP {name} {docs[name]}")
+            lines.append(f"# TYPE {name} gauge")
+            lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def expose_histogram(histogram: Histogram, values: List[float]) -> List[str]:
+    lines: List[str] = [f"# HELP {histogram.name} {histogram.doc}",
+                        f"# TYPE {histogram.name} histogram"]
+    for label_value, i in histogram.series.items():
+        offset: int = i * histogram.series_size
+        labels: str = "" if histogram.label is None \
+            else f'{histogram.label}="{label_value}",'
+        count: float = 0.0
+        for bucket, le in enumerate([*histogram.buckets, "+Inf"]):
+            count += values[offset + bucket]
+            lines.append(f'{histogram.name}_bucket{{{labels}le="{le}"}} ' +
+                         f"{int(count)}")
+        labels = labels.rstrip(",")
+        labels = f"{{{labels}}}" if labels != "" else ""
+        lines.append(f"{histogram.name}_sum{labels} " +
+                     f"{values[offset + histogram.series_size - 1]}")
+        lines.append(f"{histogram.name}_count{labels} {int(count)}")
+
+    return lines
+
+
+def is_process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+
+    return True
+
+
+def count_fs_operations(count: int = 1) -> None:
+    """
+    Count the files of the run dir read, written or stat by the request
+    being handled, if any.
+    """
+    if has_request_context():
+        g.genpei_fs_operations = g.get("genpei_fs_operations", 0) + count
+
+
+def start_request_timer() -> None:
+    g.genpei_request_start = time.perf_counter()
+
+
+def observe_request(response: Response) -> Response:
+    start: Optional[float] = g.get("genpei_request_start")
+    if start is None:
+        return response
+    metrics: Metrics = current_app.extensions["genpei_metrics"]
+    endpoint: str = request.endpoint or "other"
+    metrics.observe(metrics.request_duration,
+                    time.perf_counter() - start, endpoint)
+    metrics.observe(metrics.request_fs_operations,
+                    g.get("genpei_fs_operations", 0), endpoint)
+
+    return response
+
+
+def get_metrics_response() -> Response:
+    metrics: Metrics = current_app.extensions["genpei_metrics"]
+    scheduler: Any = current_app.extensions["genpei_scheduler"]
+    response: Response = \
+        Response(metrics.expose(scheduler.max_concurrent_runs,
+                                scheduler.get_budget()),
+                 mimetype=METRICS_MIMETYPE)
+    response.headers["Cache-Control"] = "no-cache"
+
+    return response
@@ -0,0 +1,481 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import sqlite3
+from contextlib import contextmanager
+from datetime import datetime
+from itertools import groupby, islice
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+from flask import current_app
+
+from genpei.const import (ACTIVE_STATES, DATE_FORMAT, DEFAULT_OWNER,
+                          DEFAULT_PRIORITY, DEFAULT_RUN_CORES, DEFAULT_RUN_RAM,
+                          EVENT_RETENTION, INDEX_FILE, INDEX_TIMEOUT)
+from genpei.trace import traced
+from genpei.type import QueuedRun, Resources, State
+
+INDEX_SCHEMA: str = """
+CREATE TABLE IF NOT EXISTS runs (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_id TEXT NOT NULL UNIQUE,
+    state TEXT NOT NULL,
+    submitted_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_state ON runs (state);
+CREATE TABLE IF NOT EXISTS state_counts (
+    state TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS runs_insert_count AFTER INSERT ON runs
+BEGIN
+    INSERT OR IGNORE INTO state_counts (state, count) VALUES (NEW.state, 0);
+    UPDATE state_counts SET count = count + 1 WHERE state = NEW.state;
+END;
+CREATE TRIGGER IF NOT EXISTS runs_update_count AFTER UPDATE OF state ON runs
+WHEN OLD.state <> NEW.state
+BEGIN
+    UPDATE state_counts SET count = count - 1 WHERE state = OLD.state;
+    INSERT OR IGNORE INTO state_counts (state, count) VALUES (NEW.state, 0);
+    UPDATE state_counts SET count = count + 1 WHERE state = NEW.state;
+END;
+CREATE TRIGGER IF NOT EXISTS runs_delete_count AFTER DELETE ON runs
+BEGIN
+    UPDATE state_counts SET count = count - 1 WHERE state = OLD.state;
+END;
+"""
+
+RECOUNT_STATES: str = """
+DELETE FROM state_counts;
+INSERT INTO state_counts (state, count)
+    SELECT state, COUNT(*) FROM runs GROUP BY state;
+"""
+
+INDEX_MIGRATIONS: List[List[str]] = [
+    [
+        "ALTER TABLE runs ADD COLUMN dispatched_at TEXT",
+        "CREATE INDEX runs_dispatched_at ON runs (dispatched_at)",
+    ],
+    [
+        """
+        CREATE TABLE events (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            state TEXT NOT NULL,
+            time TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TRIGGER runs_update_event AFTER UPDATE OF state ON runs
+        WHEN OLD.state <> NEW.state
+        BEGIN
+            INSERT INTO events (run_id, state, time) VALUES
+                (NEW.run_id, NEW.state,
+                 strftime('%Y-%m-%dT%H:%M:%S', 'now', 'localtime'));
+        END
+        """,
+        f"""
+        CREATE TRIGGER events_prune AFTER INSERT ON events
+        BEGIN
+            DELETE FROM events WHERE seq <= NEW.seq - {EVENT_RETENTION};
+        END
+        """,
+    ],
+    [
+        "ALTER TABLE runs ADD COLUMN cores INTEGER NOT NULL " +
+        f"DEFAULT {DEFAULT_RUN_CORES}",
+        "ALTER TABLE runs ADD COLUMN ram INTEGER NOT NULL " +
+        f"DEFAULT {DEFAULT_RUN_RAM}",
+    ],
+    [
+        "ALTER TABLE runs ADD COLUMN owner TEXT NOT NULL " +
+        f"DEFAULT '{DEFAULT_OWNER}'",
+        "ALTER TABLE runs ADD COLUMN priority INTEGER NOT NULL " +
+        f"DEFAULT {DEFAULT_PRIORITY}",
+        "CREATE INDEX runs_queue ON runs (state, owner, priority DESC, seq)",
+    ],
+    [
+        """
+        CREATE TABLE owner_turns (
+            owner TEXT PRIMARY KEY,
+            turn INTEGER NOT NULL
+        )
+        """,
+    ],
+]
+
+_initialized_indexes: Set[Path] = set()
+
+
+def get_index_path(run_base_dir: Optional[Path] = None) -> Path:
+    if run_base_dir is None:
+        run_base_dir = current_app.config["RUN_DIR"]
+
+    return run_base_dir.joinpath(INDEX_FILE)
+
+
+@contextmanager
+def connect_index(run_base_dir: Optional[Path] = None) \
+        -> Iterator[sqlite3.Connection]:
+    """
+    Open the run index in `run_base_dir` as a single transaction. The schema
+    is created on the first connection of each process, or when the index
+    file has been removed.
+    """
+    index_path: Path = get_index_path(run_base_dir)
+    initialize: bool = index_path not in _initialized_indexes or \
+        not index_path.exists()
+    if initialize:
+        index_path.parent.mkdir(parents=True, exist_ok=True)
+    conn: sqlite3.Connection = \
+        sqlite3.connect(str(index_path), timeout=INDEX_TIMEOUT)
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        if initialize:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(INDEX_SCHEMA)
+            migrate_index(conn)
+            if conn.execute("SELECT 1 FROM state_counts").fetchone() is None:
+                conn.executescript(RECOUNT_STATES)
+            _initialized_indexes.add(index_path)
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def migrate_index(conn: sqlite3.Connection) -> None:
+    """
+    Apply the migrations newer than the `user_version` of the index.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version: int = conn.execute("PRAGMA user_version").fetchone()[0]
+        for migration in INDEX_MIGRATIONS[version:]:
+            for statement in migration:
+                conn.execute(statement)
+        conn.execute(f"PRAGMA user_version = {len(INDEX_MIGRATIONS)}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def index_exists(run_base_dir: Optional[Path] = None) -> bool:
+    return get_index_path(run_base_dir).exists()
+
+
+def register_run(run_id: str, run_base_dir: Optional[Path] = None) -> None:
+    with connect_index(run_base_dir) as conn:
+        conn.execute("INSERT OR IGNORE INTO runs " +
+                     "(run_id, state, submitted_at) VALUES (?, ?, ?)",
+                     (run_id, State.UNKNOWN.name,
+                      datetime.now().strftime(DATE_FORMAT)))
+
+
+def update_state(run_id: str, state: State,
+                 run_base_dir: Optional[Path] = None) -> None:
+    with connect_index(run_base_dir) as conn:
+        cursor: sqlite3.Cursor = \
+            conn.execute("UPDATE runs SET state = ? WHERE run_id = ?",
+                         (state.name, run_id))
+        if cursor.rowcount == 0:
+            conn.execute("INSERT INTO runs (run_id, state, submitted_at) " +
+                         "VALUES (?, ?, ?)",
+                         (run_id, state.name,
+                          datetime.now().strftime(DATE_FORMAT)))
+
+
+def compare_and_set_state(run_id: str, from_states: List[State],
+                          to_state: State,
+                          run_base_dir: Optional[Path] = None) -> bool:
+    """
+    Change the state of a run only if it is currently in `from_states`.
+    """
+    with connect_index(run_base_dir) as conn:
+        cursor: sqlite3.Cursor = \
+            conn.execute("UPDATE runs SET state = ? WHERE run_id = ? AND " +
+                         f"state IN ({', '.join('?' * len(from_states))})",
+                         (to_state.name, run_id,
+                          *[state.name for state in from_states]))
+
+    return cursor.rowcount == 1
+
+
+def set_run_resources(run_id: str, resources: Resources,
+                      run_base_dir: Optional[Path] = None) -> None:
+    with connect_index(run_base_dir) as conn:
+        conn.execute("UPDATE runs SET cores = ?, ram = ? WHERE run_id = ?",
+                     (resources["cores"], resources["ram"], run_id))
+
+
+def set_run_owner(run_id: str, owner: str, priority: int,
+                  run_base_dir: Optional[Path] = None) -> None:
+    with connect_index(run_base_dir) as conn:
+        conn.execute("UPDATE runs SET owner = ?, priority = ? " +
+                     "WHERE run_id = ?", (owner, priority, run_id))
+
+
+def run_exists(run_id: str, run_base_dir: Optional[Path] = None) -> bool:
+    with connect_index(run_base_dir) as conn:
+        row: Optional[Tuple[int]] = \
+            conn.execute("SELECT 1 FROM runs WHERE run_id = ?",
+                         (run_id,)).fetchone()
+
+    return row is not None
+
+
+def list_run_ids(run_base_dir: Optional[Path] = None) -> List[str]:
+    with connect_index(run_base_dir) as conn:
+        run_ids: List[str] = \
+            [row[0] for row in
+             conn.execute("SELECT run_id FROM runs ORDER BY seq")]
+
+    return run_ids
+
+
+def get_latest_seq(run_base_dir: Optional[Path] = None) -> int:
+    with connect_index(run_base_dir) as conn:
+        row: Tuple[Optional[int]] = \
+            conn.execute("SELECT MAX(seq) FROM runs").fetchone()
+
+    return row[0] or 0
+
+
+@traced
+def list_runs(snapshot: int, after_seq: int, limit: Optional[int],
+              states: List[str], submitted_after: Optional[str],
+              submitted_before: Optional[str],
+              run_base_dir: Optional[Path] = None) \
+        -> List[Tuple[int, str, str]]:
+    """
+    Return (seq, run_id, state) of the runs registered up to `snapshot`,
+    in submission order, starting after `after_seq`.
+    """
+    query: str = "SELECT seq, run_id, state FROM runs " + \
+        "WHERE seq > ? AND seq <= ?"
+    query_args: List[Union[str, int]] = [after_seq, snapshot]
+    if len(states) != 0:
+        query += f" AND state IN ({', '.join('?' * len(states))})"
+        query_args.extend(states)
+    if submitted_after is not None:
+        query += " AND submitted_at > ?"
+        query_args.append(submitted_after)
+    if submitted_before is not None:
+        query += " AND submitted_at < ?"
+        query_args.append(submitted_before)
+    query += " ORDER BY seq"
+    if limit is not None:
+        query += " LIMIT ?"
+        query_args.append(limit)
+    with connect_index(run_base_dir) as conn:
+        runs: List[Tuple[int, str, str]] = \
+            conn.execute(query, query_args).fetchall()
+
+    return runs
+
+
+def list_queued_runs(limit: Optional[int],
+                     run_base_dir: Optional[Path] = None) -> List[QueuedRun]:
+    """
+    Return the QUEUED runs of each owner, up to `limit` per owner, from the
+    highest priority and in submission order. The runs of each owner are
+    counted while scanning them in that order, instead of by a window
+    function, which the SQLite before 3.25 does not support.
+    """
+    runs: List[QueuedRun] = []
+    with connect_index(run_base_dir) as conn:
+        for owner, rows in groupby(
+                conn.execute("SELECT run_id, owner, priority, seq, cores, " +
+                             "ram FROM runs WHERE state = ? " +
+                             "ORDER BY owner, priority DESC, seq",
+                             [State.QUEUED.name]),
+                key=lambda row: str(row[1])):
+            for run_id, _, priority, seq, cores, ram in islice(rows, limit):
+                runs.append({"run_id": run_id, "owner": owner,
+                             "priority": priority, "seq": seq,
+                             "resources": {"cores": cores, "ram": ram}})
+
+    return runs
+
+
+def count_active_runs_by_owner(run_base_dir: Optional[Path] = None) \
+        -> Dict[str, Tuple[int, int]]:
+    """
+    Return the number of the active runs and the cores they requested, of
+    each owner with active runs.
+    """
+    with connect_index(run_base_dir) as conn:
+        counts: Dict[str, Tuple[int, int]] = \
+            {owner: (num, cores) for owner, num, cores in
+             conn.execute("SELECT owner, COUNT(*), SUM(cores) FROM runs " +
+                          "WHERE state IN " +
+                          f"({', '.join('?' * len(ACTIVE_STATES))}) " +
+                          "GROUP BY owner",
+                          [state.name for state in ACTIVE_STATES])}
+
+    return counts
+
+
+def record_owner_turn(owner: str,
+                      run_base_dir: Optional[Path] = None) -> None:
+    """
+    Record that a run of `owner` has been dispatched, as the latest turn.
+    """
+    with connect_index(run_base_dir) as conn:
+        conn.execute("INSERT OR REPLACE INTO owner_turns (owner, turn) " +
+                     "SELECT ?, COALESCE(MAX(turn), 0) + 1 FROM owner_turns",
+                     (owner,))
+
+
+def get_owner_turns(run_base_dir: Optional[Path] = None) -> Dict[str, int]:
+    """
+    Return the turn each owner was last dispatched at.
+    """
+    with connect_index(run_base_dir) as conn:
+        turns: Dict[str, int] = dict(
+            conn.execute("SELECT owner, turn FROM owner_turns").fetchall())
+
+    return turns
+
+
+def sum_active_resources(run_base_dir: Optional[Path] = None) -> Resources:
+    """
+    The resources requested by the runs in ACTIVE_STATES.
+    """
+    with connect_index(run_base_dir) as conn:
+        row: Tuple[int, int] = \
+            conn.execute("SELECT COALESCE(SUM(cores), 0), " +
+                         "COALESCE(SUM(ram), 0) FROM runs WHERE state IN " +
+                         f"({', '.join('?' * len(ACTIVE_STATES))})",
+                         [state.name for state in ACTIVE_STATES]).fetchone()
+
+    return {"cores": row[0], "ram": row[1]}
+
+
+def list_run_ids_in_states(states: List[State],
+                           run_base_dir: Optional[Path] = None) -> List[str]:
+    with connect_index(run_base_dir) as conn:
+        run_ids: List[str] = \
+            [row[0] for row in
+             conn.execute("SELECT run_id FROM runs WHERE state IN " +
+                          f"({', '.join('?' * len(states))}) ORDER BY seq",
+                          [state.name for state in states])]
+
+    return run_ids
+
+
+def claim_run(run_id: str, run_base_dir: Optional[Path] = None) -> bool:
+    """
+    Move a QUEUED run to INITIALIZING and record when it was dispatched.
+    Returns False if the run is no longer QUEUED, e.g. it was canceled.
+    """
+    with connect_index(run_base_dir) as conn:
+        cursor: sqlite3.Cursor = \
+            conn.execute("UPDATE runs SET state = ?, dispatched_at = ? " +
+                         "WHERE run_id = ? AND state = ?",
+                         (State.INITIALIZING.name,
+                          datetime.now().strftime(DATE_FORMAT),
+                          run_id, State.QUEUED.name))
+
+    return cursor.rowcount == 1
+
+
+def get_oldest_queued_submitted_at(run_base_dir: Optional[Path] = None) \
+        -> Optional[str]:
+    with connect_index(run_base_dir) as conn:
+        row: Optional[Tuple[str]] = \
+            conn.execute("SELECT submitted_at FROM runs WHERE state = ? " +
+                         "ORDER BY seq LIMIT 1",
+                         (State.QUEUED.name,)).fetchone()
+
+    return None if row is None else row[0]
+
+
+def list_recent_dispatches(limit: int,
+                           run_base_dir: Optional[Path] = None) \
+        -> List[Tuple[str, str]]:
+    """
+    Return (submitted_at, dispatched_at) of the runs dispatched last.
+    """
+    with connect_index(run_base_dir) as conn:
+        dispatches: List[Tuple[str, str]] = \
+            conn.execute("SELECT submitted_at, dispatched_at FROM runs " +
+                         "WHERE dispatched_at IS NOT NULL " +
+                         "ORDER BY dispatched_at DESC LIMIT ?",
+                         (limit,)).fetchall()
+
+    return dispatches
+
+
+def get_latest_event_seq(run_base_dir: Optional[Path] = None) -> int:
+    with connect_index(run_base_dir) as conn:
+        row: Tuple[Optional[int]] = \
+            conn.execute("SELECT MAX(seq) FROM events").fetchone()
+
+    return row[0] or 0
+
+
+def get_state_and_event_seq(run_id: str,
+                            run_base_dir: Optional[Path] = None) \
+        -> Tuple[Optional[State], int]:
+    """
+    Return the state of a run in the index (None if it is not indexed) and
+    the latest event seq, read in the same transaction so that the state
+    is the one after that event.
+    """
+    with connect_index(run_base_dir) as conn:
+        row: Tuple[Optional[str], Optional[int]] = \
+            conn.execute("SELECT (SELECT state FROM runs WHERE run_id = ?), " +
+                         "(SELECT MAX(seq) FROM events)",
+                         (run_id,)).fetchone()
+
+    return (None if row[0] is None else State[row[0]]), row[1] or 0
+
+
+def list_events(after_seq: int, run_base_dir: Optional[Path] = None) \
+        -> List[Tuple[int, str, str, str]]:
+    """
+    Return (seq, run_id, state, time) of the state transitions after
+    `after_seq`. Only the latest EVENT_RETENTION transitions are kept.
+    """
+    with connect_index(run_base_dir) as conn:
+        events: List[Tuple[int, str, str, str]] = \
+            conn.execute("SELECT seq, run_id, state, time FROM events " +
+                         "WHERE seq > ? ORDER BY seq",
+                         (after_seq,)).fetchall()
+
+    return events
+
+
+def count_states(run_base_dir: Optional[Path] = None) -> Dict[str, int]:
+    """
+    The counters are maintained by triggers on each state transition, so
+    this does not depend on the number of runs.
+    """
+    with connect_index(run_base_dir) as conn:
+        count: Dict[str, int] = \
+            {state: num for state, num in
+             conn.execute("SELECT state, count FROM state_counts " +
+                          "WHERE count > 0")}
+
+    return count
+
+
+def rebuild_index(runs: List[Tuple[str, State, str, Resources, str, int]],
+                  run_base_dir: Optional[Path] = None) -> None:
+    """
+    Replace the whole index with `runs`, a list of
+    (run_id, state, submitted_at, resources, owner, priority) in submission
+    order.
+    """
+    with connect_index(run_base_dir) as conn:
+        conn.execute("DELETE FROM runs")
+        conn.executemany("INSERT INTO runs (run_id, state, submitted_at, " +
+                         "cores, ram, owner, priority) " +
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         [(run_id, state.name, submitted_at,
+                           resources["cores"], resources["ram"], owner,
+                           priority)
+                          for run_id, state, submitted_at, resources, owner,
+                          priority in runs])
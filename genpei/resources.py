@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+from typing import Any, List, Set
+
+from genpei.const import DEFAULT_RUN_CORES, DEFAULT_RUN_RAM
+from genpei.json_backend import loads
+from genpei.type import ResourceKey, Resources, RunRequest
+
+RESOURCE_KEYS: List[ResourceKey] = ["cores", "ram"]
+RESOURCE_ENGINE_PARAMS: List[str] = ["--cores", "--ram"]
+
+
+def get_host_cpus() -> Set[int]:
+    """
+    The CPUs the process may run on, which are fewer than those of the host
+    in a container limited by cpuset.
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return os.sched_getaffinity(0)
+
+    return set(range(os.cpu_count() or 1))
+
+
+def get_host_resources() -> Resources:
+    resources: Resources = {
+        "cores": len(get_host_cpus()),
+        "ram": os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") //
+        (1024 * 1024),
+    }
+
+    return resources
+
+
+def parse_run_resources(run_request: RunRequest) -> Resources:
+    """
+    The resources of a run are requested by `--cores` and `--ram` (in MiB)
+    in its workflow_engine_parameters, or else by the `cores` and `ram` of
+    its tags. Raises ValueError unless they are positive integers.
+    """
+    resources: Resources = {"cores": DEFAULT_RUN_CORES,
+                            "ram": DEFAULT_RUN_RAM}
+    for field, prefix in [("tags", ""), ("workflow_engine_parameters", "--")]:
+        try:
+            obj: Any = loads(run_request.get(field) or "{}")
+        except ValueError:
+            continue  # Left to the engine, as before the resources
+        if not isinstance(obj, dict):
+            continue
+        for key in RESOURCE_KEYS:
+            val: Any = obj.get(prefix + key)
+            if val is None:
+                continue
+            try:
+                num: int = int(val)
+            except (TypeError, ValueError):
+                num = 0
+            if isinstance(val, bool) or num <= 0:
+                raise ValueError(f"{prefix}{key} of {field} must be a " +
+                                 f"positive integer, but got {val}.")
+            resources[key] = num
+
+    return resources
+
+
+def apply_run_resources(wf_engine_params: List[str],
+                        resources: Resources) -> List[str]:
+    """
+    Replace `--cores` and `--ram`, which only the scheduler reads, with the
+    options of cwltool keeping the run within its cores: a run of several
+    cores executes its steps in parallel, at most as many at a time as its
+    cores.
+    """
+    params: List[str] = []
+    i: int = 0
+    while i < len(wf_engine_params):
+        if wf_engine_params[i] in RESOURCE_ENGINE_PARAMS:
+            i += 2
+            continue
+        params.append(wf_engine_params[i])
+        i += 1
+    if resources["cores"] > 1:
+        if "--parallel" not in params:
+            params.append("--parallel")
+        if "--parallel-max" not in params:
+            params.append("--parallel-max")
+            params.append(str(resources["cores"]))
+
+    return params
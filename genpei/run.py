@@ -1,27 +1,45 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import json
 import multiprocessing as mp
 import os
-import signal
-import time
+import sys
+from base64 import urlsafe_b64decode, urlsafe_b64encode
 from datetime import datetime
-from multiprocessing.context import BaseContext
+from multiprocessing import forkserver
+from multiprocessing.context import ForkServerContext
 from multiprocessing.process import BaseProcess
 from pathlib import Path
 from traceback import print_exc
-from typing import Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, cast
 
 from cwltool.main import run as cwltool
-from flask import abort
+from flask import Response, abort, send_file, url_for
 from flask.globals import current_app
-from werkzeug.datastructures import FileStorage
+from werkzeug.datastructures import FileStorage, Headers, MultiDict
 from werkzeug.utils import secure_filename
 
-from genpei.const import CANCEL_TIMEOUT, DATE_FORMAT
-from genpei.type import Log, RunLog, RunRequest, ServiceInfo, State
-from genpei.util import (flatten_wf_engine_params, get_all_run_ids,
-                         get_outputs, get_path, get_state, read_file,
-                         read_service_info, write_file)
+from genpei.const import (DATE_FORMAT, DEFAULT_ENGINE, EXECUTOR_PRELOAD,
+                          LOG_MIMETYPE, OWNER_HEADER, PID_START_TIME_TOLERANCE,
+                          PRIORITY_HEADER)
+from genpei.fairshare import parse_run_owner
+from genpei.json_backend import dumps, loads
+from genpei.metrics import count_fs_operations
+from genpei.registry import get_latest_seq, list_runs, run_exists
+from genpei.resources import (RESOURCE_KEYS, apply_run_resources,
+                              parse_run_resources)
+from genpei.stub import run_stub
+from genpei.trace import traced
+from genpei.type import (Attachment, Log, OutputFile, OutputListResponse,
+                         Resources, RunIdList, RunListPageToken,
+                         RunListResponse, RunLog, RunRequest, ServiceInfo,
+                         State)
+from genpei.upload import AttachmentWriter, hash_file, link_blob, store_blob
+from genpei.util import (flatten_wf_engine_params, get_outputs,
+                         get_outputs_manifest, get_path, get_state,
+                         load_service_info, read_file, stream_file,
+                         transition_state, walk_outputs, write_file,
+                         write_outputs_manifest)
 
 
 def validate_run_request(run_request: RunRequest) -> None:
@@ -36,7 +54,7 @@ def validate_run_request(run_request: RunRequest) -> None:
 
 
 def validate_wf_type(wf_type: str, wf_type_version: str) -> None:
-    service_info: ServiceInfo = read_service_info()
+    service_info: ServiceInfo = load_service_info()
     wf_type_versions = service_info["workflow_type_versions"]
 
     available_wf_types: List[str] = \
@@ -56,79 +74,281 @@ def validate_wf_type(wf_type: str, wf_type_version: str) -> None:
               "the available workflow_type_versions.")
 
 
+def validate_run_resources(run_request: RunRequest) -> Resources:
+    try:
+        resources: Resources = parse_run_resources(run_request)
+    except ValueError as e:
+        abort(400, str(e))
+    budget: Resources = load_service_info()["resources"]
+    for key in RESOURCE_KEYS:
+        if resources[key] > budget[key]:
+            abort(400,
+                  f"The run requests {resources[key]} {key}, more than " +
+                  f"the {budget[key]} {key} of this service.")
+
+    return resources
+
+
+def validate_run_owner(run_request: RunRequest,
+                       headers: Headers) -> Tuple[str, int]:
+    """
+    The owner and the priority given by the headers are recorded in the tags
+    of `run_request`, so that the run dir alone keeps them for `reindex`.
+    """
+    try:
+        owner, priority = parse_run_owner(run_request, headers)
+    except ValueError as e:
+        abort(400, str(e))
+    if OWNER_HEADER in headers or PRIORITY_HEADER in headers:
+        try:
+            tags: Any = loads(run_request.get("tags") or "{}")
+        except ValueError:
+            tags = None
+        if isinstance(tags, dict):
+            tags.update({"owner": owner, "priority": priority})
+            run_request["tags"] = dumps(tags)
+
+    return owner, priority
+
+
+@traced
 def prepare_exe_dir(run_id: str,
-                    request_files: Dict[str, FileStorage]) -> None:
+                    request_files: "MultiDict[str, FileStorage]",
+                    attachment_sha256: Optional[str] = None) -> None:
+    """
+    The attachments streamed into the exe dir by `GenpeiRequest` are already
+    in place, and the time to upload them is traced as the form parsing of
+    the request. Any other file part is saved here. The sha256 and size of each
+    attachment are recorded in `attachments.json`.
+
+    With the content addressed store enabled, the attachments are hardlinked
+    to their blobs, and `attachment_sha256` (a JSON object of file name to
+    sha256) links the files already in the store without uploading them.
+    """
     exe_dir: Path = get_path(run_id, "exe_dir")
     exe_dir.mkdir(parents=True, exist_ok=True)
-    for file in request_files.values():
-        if file.filename != "":
+    attachments: List[Attachment] = []
+    for _, file in request_files.items(multi=True):
+        if isinstance(file.stream, AttachmentWriter):
+            file.stream.close()
+            attachments.append(file.stream.to_attachment())
+        elif file.filename is not None and file.filename != "":
             file_name: str = secure_filename(file.filename)
+            if file_name == "":
+                abort(400,
+                      f"{file.filename}, the name of an attached file, is " +
+                      "not a valid file name.")
             file_path: Path = exe_dir.joinpath(file_name).resolve()
+            if file_path.exists():
+                abort(400,
+                      f"{file.filename}, the name of an attached file, is " +
+                      "given more than once.")
             file_path.parent.mkdir(parents=True, exist_ok=True)
-            file.save(file_path)  # type: ignore
+            file.save(file_path)
+            attachments.append(hash_file(file_path))
+    if current_app.config["CONTENT_ADDRESSED_STORE"]:
+        for attachment in attachments:
+            store_blob(exe_dir.joinpath(attachment["name"]),
+                       attachment["sha256"])
+        for file_name, sha256 in \
+                parse_attachment_sha256(attachment_sha256).items():
+            attachments.append(link_blob(sha256, exe_dir.joinpath(file_name)))
+    elif attachment_sha256 is not None:
+        abort(400,
+              "workflow_attachment_sha256 is not available because the " +
+              "content addressed store is disabled.")
+    write_file(run_id, "attachments", dumps(attachments, indent=2))
+
+
+def parse_attachment_sha256(attachment_sha256: Optional[str]) \
+        -> Dict[str, str]:
+    """
+    Return the secured file names and the sha256 of `attachment_sha256`.
+    """
+    if attachment_sha256 is None:
+        return {}
+    try:
+        parsed: Dict[str, str] = json.loads(attachment_sha256)
+        if not isinstance(parsed, dict) or \
+                not all(isinstance(val, str) for val in parsed.values()):
+            raise ValueError
+    except ValueError:
+        abort(400,
+              "workflow_attachment_sha256 must be a JSON object of file " +
+              "name to sha256.")
+    secured: Dict[str, str] = {}
+    for file_name, sha256 in parsed.items():
+        if secure_filename(file_name) == "":
+            abort(400,
+                  f"{file_name}, a file name of workflow_attachment_sha256, " +
+                  "is not a valid file name.")
+        secured[secure_filename(file_name)] = sha256
+
+    return secured
+
+
+def get_executor() -> ForkServerContext:
+    """
+    The runs are started from a forkserver which has imported cwltool in
+    advance, so each run is a fork of a warm process instead of a fresh
+    interpreter importing cwltool and schema-salad.
+    """
+    ctx: ForkServerContext = mp.get_context("forkserver")
+    ctx.set_forkserver_preload(EXECUTOR_PRELOAD)
+
+    return ctx
+
 
+def start_executor() -> None:
+    get_executor()
+    forkserver.ensure_running()
 
-def fork_run(run_id: str, run_request: RunRequest) -> None:
-    run_base_dir: Path = current_app.config["RUN_DIR"]
-    ctx: BaseContext = mp.get_context("spawn")
+
+def prepare_run(run_id: str, run_request: RunRequest, run_base_dir: Path,
+                service_info_path: Path, engine: str = DEFAULT_ENGINE) \
+        -> List[str]:
+    wf_engine_params: List[str] = apply_run_resources(
+        flatten_wf_engine_params(run_request["workflow_engine_parameters"],
+                                 service_info_path),
+        parse_run_resources(run_request))
+    if "--outdir" not in wf_engine_params:
+        wf_engine_params.append("--outdir")
+        wf_engine_params.append(
+            str(get_path(run_id, "outputs_dir", run_base_dir)))
+    wf_url: str = run_request["workflow_url"]
+    wf_params_file: Path = get_path(run_id, "wf_params", run_base_dir)
+    all_args: List[str] = [*wf_engine_params, wf_url, str(wf_params_file)]
+    write_file(run_id, "cmd", " ".join([engine, *all_args]), run_base_dir)
+
+    return all_args
+
+
+def start_run(run_id: str, all_args: List[str], run_base_dir: Path,
+              engine: str = DEFAULT_ENGINE,
+              cpus: Optional[List[int]] = None) -> Optional[BaseProcess]:
+    """
+    Returns None if the run has been canceled while initializing. With
+    `cpus`, the run and the processes it starts are pinned to these CPUs.
+    """
+    if not transition_state(run_id, [State.INITIALIZING], State.RUNNING,
+                            run_base_dir):
+        transition_state(run_id, [State.CANCELING], State.CANCELED,
+                         run_base_dir)
+        return None
+    ctx: ForkServerContext = get_executor()
     process: BaseProcess = \
-        ctx.Process(target=forked_process,
-                    args=(run_id, run_request, run_base_dir,
-                          current_app.config["SERVICE_INFO"]))
+        ctx.Process(target=run_engine,
+                    args=(run_id, all_args, run_base_dir, engine, cpus))
+    write_file(run_id, "start_time", datetime.now().strftime(DATE_FORMAT),
+               run_base_dir)
     process.start()  # Non blocking
+    pid: Optional[int] = process.pid
+    if pid is not None:
+        write_file(run_id, "pid", str(pid), run_base_dir)
 
+    return process
 
-def forked_process(run_id: str, run_request: RunRequest,
-                   run_base_dir: Path, service_info_path: Path) -> None:
-    try:
-        write_file(run_id, "state", State.INITIALIZING.name, run_base_dir)
-        wf_engine_params: List[str] = \
-            flatten_wf_engine_params(run_request["workflow_engine_parameters"],
-                                     service_info_path)
-        if "--outdir" not in wf_engine_params:
-            wf_engine_params.append("--outdir")
-            wf_engine_params.append(
-                str(get_path(run_id, "outputs_dir", run_base_dir)))
-        wf_url: str = run_request["workflow_url"]
-        wf_params_file: Path = get_path(run_id, "wf_params", run_base_dir)
-        all_args: List[str] = [*wf_engine_params, wf_url, str(wf_params_file)]
-        write_file(run_id, "cmd",
-                   " ".join(["cwltool", *all_args]), run_base_dir)
-        os.chdir(get_path(run_id, "exe_dir", run_base_dir))
-        ctx: BaseContext = mp.get_context("spawn")
-        process: BaseProcess = \
-            ctx.Process(target=run_cwltool,
-                        args=(run_id, all_args, run_base_dir))
-        write_file(run_id, "state", State.RUNNING.name, run_base_dir)
-        write_file(run_id, "start_time", datetime.now().strftime(DATE_FORMAT),
-                   run_base_dir)
-        process.start()
-        pid: Optional[int] = process.pid
-        if pid is not None:
-            write_file(run_id, "pid", str(pid), run_base_dir)
-        process.join()  # blocking
-        write_file(run_id, "end_time", datetime.now().strftime(DATE_FORMAT),
+
+def finish_run(run_id: str, process: BaseProcess,
+               run_base_dir: Path) -> None:
+    """
+    Record the result of a run whose process has exited.
+    """
+    process.join()
+    write_file(run_id, "end_time", datetime.now().strftime(DATE_FORMAT),
+               run_base_dir)
+    exit_code: Optional[int] = process.exitcode
+    process.close()
+    if exit_code is not None:
+        write_file(run_id, "exit_code", str(exit_code), run_base_dir)
+    write_outputs_manifest(run_id, run_base_dir)
+    state: State = State.COMPLETE if exit_code == 0 else State.EXECUTOR_ERROR
+    if not transition_state(run_id, [State.RUNNING], state, run_base_dir):
+        transition_state(run_id, [State.CANCELING], State.CANCELED,
+                         run_base_dir)
+
+
+def finish_lost_run(run_id: str, run_base_dir: Path) -> None:
+    """
+    Record the end of a run whose process exited while no scheduler was
+    supervising it, so its exit status is unknown.
+    """
+    write_file(run_id, "end_time", datetime.now().strftime(DATE_FORMAT),
+               run_base_dir)
+    write_outputs_manifest(run_id, run_base_dir)
+    if transition_state(run_id, [State.CANCELING], State.CANCELED,
+                        run_base_dir):
+        return
+    if transition_state(run_id, [State.RUNNING], State.SYSTEM_ERROR,
+                        run_base_dir):
+        write_file(run_id, "sys_error",
+                   "The process of the run exited while Genpei was not " +
+                   "supervising it, so its exit status is unknown.",
                    run_base_dir)
-        exit_code: Optional[int] = process.exitcode
-        if exit_code is not None:
-            write_file(run_id, "exit_code", str(exit_code), run_base_dir)
-        if exit_code == 0:
-            write_file(run_id, "state", State.COMPLETE.name, run_base_dir)
-        else:
-            write_file(run_id, "state",
-                       State.EXECUTOR_ERROR.name, run_base_dir)
-    except Exception:
-        write_file(run_id, "state", State.SYSTEM_ERROR.name, run_base_dir)
-        print_exc(file=get_path(run_id, "sys_error",
-                                run_base_dir).open(mode="w"))
 
 
-def run_cwltool(run_id: str, all_args: List[str], run_base_dir: Path) -> None:
-    cwltool(all_args,
-            stdout=get_path(run_id, "stdout",
-                            run_base_dir).open(mode="w", buffering=1),
-            stderr=get_path(run_id, "stderr",
-                            run_base_dir).open(mode="w", buffering=1))
+def is_run_alive(run_id: str, run_base_dir: Path) -> bool:
+    """
+    Whether the process in run.pid is alive and is still the one of the run.
+    Its start time in /proc is compared with start_time.txt, so that a pid
+    reused by another process after a reboot is not taken for the run.
+    """
+    pid_str: Optional[str] = read_file(run_id, "pid", run_base_dir)
+    if pid_str is None or not pid_str.strip().isdecimal():
+        return False
+    pid: int = int(pid_str)
+    if not Path("/proc/self/stat").exists():
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+    try:
+        with open(f"/proc/{pid}/stat", mode="r") as f:
+            # The fields after the command name, which may contain spaces
+            stat: List[str] = f.read().rsplit(")", 1)[1].split()
+    except (FileNotFoundError, ProcessLookupError):
+        return False
+    if stat[0] in ["Z", "X"]:
+        return False
+    start_time: Optional[str] = read_file(run_id, "start_time", run_base_dir)
+    if start_time is None:
+        return True
+    with open("/proc/stat", mode="r") as f:
+        boot_time: int = [int(line.split()[1]) for line in f
+                          if line.startswith("btime ")][0]
+    started_at: float = \
+        boot_time + int(stat[19]) / os.sysconf("SC_CLK_TCK")
+
+    return abs(started_at - datetime.strptime(start_time, DATE_FORMAT)
+               .timestamp()) < PID_START_TIME_TOLERANCE
+
+
+def fail_run(run_id: str, run_base_dir: Path) -> None:
+    write_file(run_id, "state", State.SYSTEM_ERROR.name, run_base_dir)
+    with get_path(run_id, "sys_error", run_base_dir).open(mode="w") as f:
+        print_exc(file=f)
+
+
+def run_engine(run_id: str, all_args: List[str], run_base_dir: Path,
+               engine: str, cpus: Optional[List[int]] = None) -> None:
+    # Lead a process group of its own, so that a cancel reaches the tools
+    # started by cwltool as well.
+    os.setsid()
+    if cpus is not None:
+        os.sched_setaffinity(0, cpus)
+    os.chdir(get_path(run_id, "exe_dir", run_base_dir))
+    main: Callable[..., int] = run_stub if engine == "stub" else cwltool
+    exit_code: int = \
+        main(all_args,
+             stdout=get_path(run_id, "stdout",
+                             run_base_dir).open(mode="w", buffering=1),
+             stderr=get_path(run_id, "stderr",
+                             run_base_dir).open(mode="w", buffering=1))
+    # The exit code of the engine becomes that of the process
+    sys.exit(exit_code)
 
 
 def get_run_log(run_id: str) -> RunLog:
@@ -144,6 +364,27 @@ def get_run_log(run_id: str) -> RunLog:
     return run_log
 
 
+def get_output_list(run_id: str,
+                    args: "MultiDict[str, str]") -> OutputListResponse:
+    """
+    Page through the outputs manifest of a finished run. For a run still in
+    progress, the output directory is walked at each call.
+    """
+    page_size: Optional[int] = parse_page_size(args.get("page_size"))
+    offset: int = \
+        parse_non_negative_int(args.get("page_token"), "page_token") or 0
+    manifest: Optional[List[OutputFile]] = get_outputs_manifest(run_id)
+    if manifest is None:
+        manifest = walk_outputs(run_id)
+    end: int = len(manifest) if page_size is None else offset + page_size
+    output_list: OutputListResponse = {
+        "outputs": manifest[offset:end],
+        "next_page_token": str(end) if end < len(manifest) else ""
+    }
+
+    return output_list
+
+
 def get_log(run_id: str) -> Log:
     exit_code: Optional[Union[str, int]] = read_file(run_id, "exit_code")
     if exit_code is not None:
@@ -157,35 +398,214 @@ def get_log(run_id: str) -> Log:
         "cmd": read_file(run_id, "cmd"),
         "start_time": read_file(run_id, "start_time"),
         "end_time": read_file(run_id, "end_time"),
-        "stdout": read_file(run_id, "stdout"),
-        "stderr": read_file(run_id, "stderr"),
+        "stdout": url_for("genpei.get_runs_id_stdout", run_id=run_id,
+                          _external=True),
+        "stderr": url_for("genpei.get_runs_id_stderr", run_id=run_id,
+                          _external=True),
         "exit_code": exit_code  # type: ignore
     }
 
     return log
 
 
+def get_run_list(args: "MultiDict[str, str]") -> RunListResponse:
+    """
+    The listing is pinned to the runs registered when the first page was
+    requested, and the filters of the first page are carried over by the
+    page token. The state of each run is the current one.
+    """
+    page_size: Optional[int] = parse_page_size(args.get("page_size"))
+    page_token: RunListPageToken
+    if args.get("page_token", "") != "":
+        page_token = decode_page_token(args["page_token"])
+    else:
+        page_token = {
+            "snapshot": get_latest_seq(),
+            "after_seq": 0,
+            "states": parse_states(args.getlist("state")),
+            "submitted_after": parse_submitted_time(
+                args.get("submitted_after"), "submitted_after"),
+            "submitted_before": parse_submitted_time(
+                args.get("submitted_before"), "submitted_before"),
+        }
+    runs: List[Tuple[int, str, str]] = \
+        list_runs(page_token["snapshot"], page_token["after_seq"],
+                  None if page_size is None else page_size + 1,
+                  page_token["states"], page_token["submitted_after"],
+                  page_token["submitted_before"])
+    next_page_token: str = ""
+    if page_size is not None and len(runs) > page_size:
+        runs = runs[:page_size]
+        page_token["after_seq"] = runs[-1][0]
+        next_page_token = encode_page_token(page_token)
+    run_list: RunListResponse = {
+        "runs": [{"run_id": run_id, "state": state}  # type: ignore
+                 for _, run_id, state in runs],
+        "next_page_token": next_page_token
+    }
+
+    return run_list
+
+
+def parse_page_size(page_size: Optional[str]) -> Optional[int]:
+    if page_size is None or page_size == "":
+        return None
+    try:
+        parsed_page_size: int = int(page_size)
+    except ValueError:
+        parsed_page_size = 0
+    if parsed_page_size <= 0:
+        abort(400,
+              f"{page_size}, the page_size specified in the request, " +
+              "is not a positive integer.")
+
+    return parsed_page_size
+
+
+def parse_states(states: List[str]) -> List[str]:
+    parsed_states: List[str] = \
+        [state for arg in states for state in arg.split(",") if state != ""]
+    for state in parsed_states:
+        if state not in State.__members__:
+            abort(400,
+                  f"{state}, the state specified in the request, is not " +
+                  f"included in {list(State.__members__)}, the available " +
+                  "states.")
+
+    return parsed_states
+
+
+def parse_submitted_time(submitted_time: Optional[str],
+                         field: str) -> Optional[str]:
+    if submitted_time is None or submitted_time == "":
+        return None
+    try:
+        return datetime.strptime(submitted_time, DATE_FORMAT)\
+            .strftime(DATE_FORMAT)
+    except ValueError:
+        abort(400,
+              f"{submitted_time}, the {field} specified in the request, " +
+              f"does not match the format {DATE_FORMAT}.")
+
+
+def encode_page_token(page_token: RunListPageToken) -> str:
+    return urlsafe_b64encode(json.dumps(page_token).encode()).decode()
+
+
+def decode_page_token(page_token: str) -> RunListPageToken:
+    """
+    The page token comes back from the client, so the type of each value is
+    checked as well before it is passed on to the query of the index.
+    """
+    try:
+        decoded: Any = json.loads(urlsafe_b64decode(page_token.encode()))
+        if not isinstance(decoded, dict) or \
+                set(decoded.keys()) != set(RunListPageToken.__annotations__):
+            raise ValueError
+        for key in ["snapshot", "after_seq"]:
+            if isinstance(decoded[key], bool) or \
+                    not isinstance(decoded[key], int):
+                raise ValueError
+        if not isinstance(decoded["states"], list) or \
+                not all(isinstance(state, str) and state in State.__members__
+                        for state in decoded["states"]):
+            raise ValueError
+        for key in ["submitted_after", "submitted_before"]:
+            if decoded[key] is not None:
+                datetime.strptime(decoded[key], DATE_FORMAT)
+    except Exception:
+        abort(400,
+              f"{page_token}, the page_token specified in the request, " +
+              "is invalid.")
+
+    return cast(RunListPageToken, decoded)
+
+
+def get_log_response(run_id: str, file_type: str,
+                     args: "MultiDict[str, str]") -> Response:
+    """
+    Serve `stdout` or `stderr` of a run from disk. Without parameters, the
+    whole file is sent with HTTP Range support. `offset` skips the bytes
+    already read, and `tail` limits the response to the last bytes.
+    """
+    file: Path = get_path(run_id, file_type)
+    count_fs_operations()
+    if not file.exists():
+        return Response("", mimetype=LOG_MIMETYPE)
+    offset: Optional[int] = parse_non_negative_int(args.get("offset"),
+                                                   "offset")
+    tail: Optional[int] = parse_non_negative_int(args.get("tail"), "tail")
+    if offset is None and tail is None:
+        return send_file(file, mimetype=LOG_MIMETYPE, conditional=True)
+    size: int = file.stat().st_size
+    start: int = min(offset or 0, size)
+    if tail is not None:
+        start = max(start, size - tail)
+    response: Response = Response(stream_file(file, start, size),
+                                  mimetype=LOG_MIMETYPE)
+    response.content_length = size - start
+
+    return response
+
+
+def parse_non_negative_int(val: Optional[str], field: str) -> Optional[int]:
+    if val is None or val == "":
+        return None
+    try:
+        parsed_val: int = int(val)
+    except ValueError:
+        parsed_val = -1
+    if parsed_val < 0:
+        abort(400,
+              f"{val}, the {field} specified in the request, " +
+              "is not a non-negative integer.")
+
+    return parsed_val
+
+
 def validate_run_id(run_id: str) -> None:
-    all_run_ids: List[str] = get_all_run_ids()
-    if run_id not in all_run_ids:
+    if not run_exists(run_id):
         abort(404,
               f"The run_id {run_id} you requested does not exist, " +
               "please check with GET /runs.")
 
 
-def cancel_run(run_id: str) -> None:
-    state: State = get_state(run_id)
-    if state == State.RUNNING:
-        write_file(run_id, "state", State.CANCELING.name)
-        try:
-            pid: int = int(read_file(run_id, "pid"))
-            os.kill(pid, signal.SIGTERM)
-            count: int = 0
-            while count < CANCEL_TIMEOUT:
-                time.sleep(1)
-                count += 1
-                if get_state(run_id) != State.CANCELING:
-                    write_file(run_id, "state", State.CANCELED.name)
-                    break
-        except Exception:
-            write_file(run_id, "state", State.UNKNOWN.name)
+def cancel_run(run_id: str) -> bool:
+    """
+    A QUEUED run is canceled at once. A dispatched run becomes CANCELING
+    and the scheduler signals its process group and records CANCELED when
+    it has exited, so this does not wait for the run.
+    Returns False if the run is not in a cancelable state.
+    """
+    if transition_state(run_id, [State.QUEUED], State.CANCELED):
+        return True
+
+    return transition_state(run_id, [State.INITIALIZING, State.RUNNING],
+                            State.CANCELING)
+
+
+def cancel_runs(args: "MultiDict[str, str]") -> RunIdList:
+    run_ids: List[str] = \
+        [run_id for arg in args.getlist("run_id")
+         for run_id in arg.split(",") if run_id != ""]
+    states: List[str] = parse_states(args.getlist("state"))
+    if len(run_ids) == 0 and len(states) == 0:
+        abort(400,
+              "Please specify the runs to cancel with run_id or state.")
+    for run_id in run_ids:
+        validate_run_id(run_id)
+    if len(states) != 0:
+        run_ids.extend(run_id for _, run_id, _ in
+                       list_runs(get_latest_seq(), 0, None, states, None,
+                                 None))
+    canceled_run_ids: List[str] = \
+        [run_id for run_id in dict.fromkeys(run_ids) if cancel_run(run_id)]
+
+    return {"run_ids": canceled_run_ids}
+
+
+def kill_process_group(pid: int, sig: int) -> None:
+    try:
+        os.killpg(pid, sig)
+    except ProcessLookupError:
+        pass  # The whole group has already exited
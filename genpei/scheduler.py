@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import fcntl
+import logging
+import os
+import signal
+import threading
+import time
+from datetime import datetime, timedelta
+from multiprocessing.connection import wait
+from multiprocessing.process import BaseProcess
+from pathlib import Path
+from traceback import format_exc
+from typing import IO, Dict, List, Optional, Sequence, Set, Tuple
+
+from flask import current_app
+
+from genpei.const import (ACTIVE_STATES, BACKFILL_DEPTH, CANCEL_TIMEOUT,
+                          DATE_FORMAT, DEFAULT_BACKFILL_TIMEOUT,
+                          DEFAULT_CPU_AFFINITY, DEFAULT_ENGINE,
+                          SCHEDULER_INTERVAL, SCHEDULER_LOCK_FILE,
+                          WAIT_TIME_WINDOW)
+from genpei.fairshare import get_weight, order_queued_runs
+from genpei.metrics import Metrics
+from genpei.registry import (claim_run, count_active_runs_by_owner,
+                             count_states, get_oldest_queued_submitted_at,
+                             get_owner_turns, list_queued_runs,
+                             list_recent_dispatches, list_run_ids_in_states,
+                             record_owner_turn, sum_active_resources)
+from genpei.resources import RESOURCE_KEYS, get_host_cpus
+from genpei.run import (fail_run, finish_lost_run, finish_run, is_run_alive,
+                        kill_process_group, prepare_run, start_executor,
+                        start_run)
+from genpei.type import (OwnerQueueInfo, QueuedRun, QueueInfo, ResourceKey,
+                         Resources, RunRequest, State)
+from genpei.util import (load_service_info, read_file, transition_state,
+                         write_file)
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """
+    The supervisor of the runs. It dispatches the QUEUED runs while fewer
+    than `max_concurrent_runs` runs are active (0 means no limit) and the
+    cores and memory they request fit in the `resources` of the
+    service-info, and reaps the cwltool processes it started as they exit.
+
+    The runs are taken by weighted fair share across their owners, by the
+    `owner_weights` of the service-info, and by priority then in FIFO
+    order within an owner (see `order_queued_runs`).
+
+    A run that does not fit waits at the head of the queue while the
+    smaller runs behind it are backfilled into the resources left, for at
+    most `backfill_timeout` seconds (0 disables the backfilling). After
+    that nothing starts ahead of it, so it starts as soon as the active
+    runs have freed enough resources. With `cpu_affinity`, each run is
+    pinned to as many CPUs as it requested cores, not shared with the
+    other runs.
+
+    A single thread waits on the sentinels of all the processes, so an
+    active run costs only its cwltool process.
+
+    Served by gunicorn, the scheduler runs in a process of its own, forked
+    from the master before the workers (see `start_process`), so that the
+    master forks the workers with no thread running.
+
+    Only the scheduler holding the lock file of the run dir dispatches, so
+    several app instances sharing a run dir do not start the same runs or
+    exceed the limit. The others keep trying to take the lock over. On
+    taking the lock, the runs left by the previous holder are reconciled.
+    """
+
+    def __init__(self, run_base_dir: Path, service_info_path: Path,
+                 max_concurrent_runs: int, engine: str = DEFAULT_ENGINE,
+                 metrics: Optional[Metrics] = None,
+                 backfill_timeout: int = DEFAULT_BACKFILL_TIMEOUT,
+                 cpu_affinity: bool = DEFAULT_CPU_AFFINITY) -> None:
+        self.run_base_dir: Path = run_base_dir
+        self.service_info_path: Path = service_info_path
+        self.max_concurrent_runs: int = max_concurrent_runs
+        self.engine: str = engine
+        self.metrics: Metrics = metrics or Metrics([], 1)
+        self.backfill_timeout: int = backfill_timeout
+        self.cpu_affinity: bool = cpu_affinity
+        # The run waiting at the head of the queue, and since when
+        self.blocked_head: Optional[Tuple[str, float]] = None
+        self.cpus: Dict[str, List[int]] = {}
+        self.processes: Dict[str, BaseProcess] = {}
+        self.start_times: Dict[str, float] = {}
+        self.orphans: Dict[str, int] = {}
+        self.cancel_deadlines: Dict[str, float] = {}
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        self.lock_file: Optional[IO[str]] = None
+        self.thread: Optional[threading.Thread] = None
+        self.stopping: threading.Event = threading.Event()
+        self.master_pid: Optional[int] = None
+        self.scheduler_pid: Optional[int] = None
+
+    def start(self) -> None:
+        start_executor()
+        self.acquire_lock()
+        self.thread = \
+            threading.Thread(target=self.run_forever, daemon=True,
+                             name="genpei-scheduler")
+        self.thread.start()
+
+    def start_process(self) -> None:
+        """
+        Run the scheduler, and the forkserver of the runs, in a child
+        process which is not forked again. The workers forked afterwards
+        wake it up through the pipe inherited from the master.
+        """
+        self.master_pid = os.getpid()
+        pid: int = os.fork()
+        if pid == 0:
+            try:
+                self.serve()
+            except Exception:
+                logger.error(format_exc())
+            finally:
+                os._exit(0)
+        self.scheduler_pid = pid
+
+    def serve(self) -> None:
+        self.start()
+        if self.thread is not None:
+            self.thread.join()
+
+    def stop_process(self) -> None:
+        """
+        Stop the scheduler process from the master, not from the workers
+        forked from it. The runs are left running, to be reconciled by the
+        next scheduler of the run dir.
+        """
+        if self.scheduler_pid is None or self.master_pid != os.getpid():
+            return
+        try:
+            os.kill(self.scheduler_pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
+        os.waitpid(self.scheduler_pid, 0)
+        self.scheduler_pid = None
+
+    def stop(self) -> None:
+        """
+        Stop dispatching, kill the runs started by this scheduler and
+        release the lock file, e.g. when the app of a test is torn down.
+        The runs are left in their states, to be reconciled by the next
+        scheduler of the run dir.
+        """
+        self.stopping.set()
+        self.wake()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        for process in self.processes.values():
+            if process.pid is not None:
+                kill_process_group(process.pid, signal.SIGKILL)
+            process.join()
+        self.processes.clear()
+        self.cpus.clear()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def wake(self) -> None:
+        try:
+            os.write(self.wakeup_w, b"\0")
+        except BlockingIOError:
+            pass  # The scheduler has already been woken up
+
+    def run_forever(self) -> None:
+        while not self.stopping.is_set():
+            try:
+                if self.acquire_lock():
+                    self.reap_orphans()
+                    self.cancel()
+                    self.dispatch()
+            except Exception:
+                logger.error(format_exc())
+            self.wait_events()
+
+    def wait_events(self) -> None:
+        sentinels: Dict[int, str] = \
+            {process.sentinel: run_id
+             for run_id, process in self.processes.items()}
+        ready: Sequence[object] = \
+            wait([self.wakeup_r, *sentinels], SCHEDULER_INTERVAL)
+        for fd in ready:
+            if fd == self.wakeup_r:
+                self.drain_wakeup()
+            else:
+                self.reap(sentinels[fd])  # type: ignore
+
+    def drain_wakeup(self) -> None:
+        try:
+            while os.read(self.wakeup_r, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def acquire_lock(self) -> bool:
+        if self.lock_file is not None:
+            return True
+        self.run_base_dir.mkdir(parents=True, exist_ok=True)
+        lock_file: IO[str] = \
+            self.run_base_dir.joinpath(SCHEDULER_LOCK_FILE).open(mode="a")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        self.reconcile()
+
+        return True
+
+    def reconcile(self) -> None:
+        """
+        Take over the runs left non-terminal by the previous scheduler of
+        the run dir, e.g. when the container has restarted. A run that was
+        not started yet goes back to the queue, a run whose process has
+        gone is finished as lost, and a run whose process is still alive
+        is watched until it exits. Only the non-terminal runs are looked
+        up, through the index, so this does not depend on the number of
+        runs in the run dir.
+        """
+        for run_id in list_run_ids_in_states([State.INITIALIZING],
+                                             self.run_base_dir):
+            transition_state(run_id, [State.INITIALIZING], State.QUEUED,
+                             self.run_base_dir)
+        for run_id in list_run_ids_in_states([State.RUNNING,
+                                              State.CANCELING],
+                                             self.run_base_dir):
+            if is_run_alive(run_id, self.run_base_dir):
+                self.orphans[run_id] = \
+                    int(read_file(run_id, "pid", self.run_base_dir))
+            else:
+                finish_lost_run(run_id, self.run_base_dir)
+
+    def reap_orphans(self) -> None:
+        for run_id in list(self.orphans):
+            if is_run_alive(run_id, self.run_base_dir):
+                continue
+            pid: int = self.orphans.pop(run_id)
+            if self.pop_cancel_deadline(run_id):
+                kill_process_group(pid, signal.SIGKILL)
+            finish_lost_run(run_id, self.run_base_dir)
+
+    def dispatch(self) -> None:
+        state_counts: Dict[str, int] = count_states(self.run_base_dir)
+        if state_counts.get(State.QUEUED.name, 0) == 0:
+            self.blocked_head = None
+            return
+        limit: Optional[int] = None
+        if self.max_concurrent_runs > 0:
+            limit = self.max_concurrent_runs - \
+                count_active_runs(state_counts)
+            if limit <= 0:
+                return
+        budget: Resources = self.get_budget()
+        committed: Resources = sum_active_resources(self.run_base_dir)
+        free: Dict[ResourceKey, int] = \
+            {key: budget[key] - committed[key] for key in RESOURCE_KEYS}
+        head: Optional[str] = None
+        # The runs behind the head are looked up to BACKFILL_DEPTH deep
+        for queued_run in self.order_queued_runs(
+                None if limit is None else limit + BACKFILL_DEPTH):
+            run_id: str = queued_run["run_id"]
+            resources: Resources = queued_run["resources"]
+            if limit is not None and limit <= 0:
+                break
+            if any(resources[key] > budget[key] for key in free):
+                self.reject(run_id, resources, budget)
+                continue
+            if any(resources[key] > free[key] for key in free):
+                if head is None:
+                    head = run_id
+                    if not self.may_backfill(run_id):
+                        break
+                continue
+            if not claim_run(run_id, self.run_base_dir):
+                continue
+            self.launch(run_id, resources)
+            record_owner_turn(queued_run["owner"], self.run_base_dir)
+            for key in free:
+                free[key] -= resources[key]
+            if limit is not None:
+                limit -= 1
+        if head is None:
+            self.blocked_head = None
+
+    def get_budget(self) -> Resources:
+        return load_service_info(self.service_info_path)["resources"]
+
+    def order_queued_runs(self, limit: Optional[int]) -> List[QueuedRun]:
+        """
+        The QUEUED runs, up to `limit` of each owner, in the order they are
+        dispatched. The turns of the owners are kept in the index, so that
+        `GET /queue` served by any worker sees the order of this scheduler.
+        """
+        committed_cores: Dict[str, int] = \
+            {owner: cores for owner, (_, cores)
+             in count_active_runs_by_owner(self.run_base_dir).items()}
+
+        return order_queued_runs(
+            list_queued_runs(limit, self.run_base_dir), committed_cores,
+            self.get_owner_weights(), get_owner_turns(self.run_base_dir))
+
+    def get_owner_weights(self) -> Dict[str, float]:
+        return load_service_info(self.service_info_path)["owner_weights"]
+
+    def may_backfill(self, head: str) -> bool:
+        """
+        Whether the runs behind `head`, which does not fit in the resources
+        left, may still start ahead of it.
+        """
+        now: float = time.monotonic()
+        if self.blocked_head is None or self.blocked_head[0] != head:
+            self.blocked_head = (head, now)
+
+        return now - self.blocked_head[1] < self.backfill_timeout
+
+    def reject(self, run_id: str, resources: Resources,
+               budget: Resources) -> None:
+        """
+        Fail a run requesting more than the whole budget, which can have
+        been lowered since the run was accepted, as it would never start.
+        """
+        if not claim_run(run_id, self.run_base_dir):
+            return
+        write_file(run_id, "sys_error",
+                   f"The run requests {resources['cores']} cores and " +
+                   f"{resources['ram']} MiB of memory, more than the " +
+                   f"{budget['cores']} cores and {budget['ram']} MiB of " +
+                   "this service.", self.run_base_dir)
+        transition_state(run_id, [State.INITIALIZING], State.SYSTEM_ERROR,
+                         self.run_base_dir)
+
+    def pick_cpus(self, cores: int) -> Optional[List[int]]:
+        """
+        The CPUs not pinned to another run, or None when fewer than `cores`
+        are left, e.g. when the budget has more cores than the host.
+        """
+        pinned: Set[int] = \
+            {cpu for cpus in self.cpus.values() for cpu in cpus}
+        free_cpus: List[int] = sorted(get_host_cpus() - pinned)
+        if len(free_cpus) < cores:
+            return None
+
+        return free_cpus[:cores]
+
+    def cancel(self) -> None:
+        """
+        Send SIGTERM to the process group of each CANCELING run, and SIGKILL
+        once the grace period of CANCEL_TIMEOUT seconds has passed. The run
+        becomes CANCELED when its process is reaped.
+        """
+        now: float = time.monotonic()
+        for run_id in list_run_ids_in_states([State.CANCELING],
+                                             self.run_base_dir):
+            pid: Optional[int] = self.orphans.get(run_id)
+            if run_id in self.processes:
+                pid = self.processes[run_id].pid
+            if pid is None:
+                continue
+            deadline: Optional[float] = self.cancel_deadlines.get(run_id)
+            if deadline is None:
+                self.cancel_deadlines[run_id] = now + CANCEL_TIMEOUT
+                kill_process_group(pid, signal.SIGTERM)
+            elif now > deadline:
+                kill_process_group(pid, signal.SIGKILL)
+
+    def launch(self, run_id: str, resources: Resources) -> None:
+        launched_at: float = time.monotonic()
+        cpus: Optional[List[int]] = None
+        if self.cpu_affinity:
+            cpus = self.pick_cpus(resources["cores"])
+        try:
+            write_file(run_id, "state", State.INITIALIZING.name,
+                       self.run_base_dir)
+            run_request: RunRequest = \
+                read_file(run_id, "run_request", self.run_base_dir)
+            all_args: List[str] = prepare_run(run_id, run_request,
+                                              self.run_base_dir,
+                                              self.service_info_path,
+                                              self.engine)
+            process: Optional[BaseProcess] = \
+                start_run(run_id, all_args, self.run_base_dir, self.engine,
+                          cpus)
+            if process is not None:
+                self.processes[run_id] = process
+                if cpus is not None:
+                    self.cpus[run_id] = cpus
+                self.start_times[run_id] = time.monotonic()
+                self.metrics.observe(self.metrics.run_spawn,
+                                     self.start_times[run_id] - launched_at)
+        except Exception:
+            fail_run(run_id, self.run_base_dir)
+
+    def reap(self, run_id: str) -> None:
+        process: BaseProcess = self.processes.pop(run_id)
+        self.cpus.pop(run_id, None)
+        self.metrics.observe(self.metrics.run_wall_time,
+                             time.monotonic() - self.start_times.pop(run_id))
+        if self.pop_cancel_deadline(run_id) and process.pid is not None:
+            # The tools started by cwltool may outlive it
+            kill_process_group(process.pid, signal.SIGKILL)
+        try:
+            finish_run(run_id, process, self.run_base_dir)
+        except Exception:
+            fail_run(run_id, self.run_base_dir)
+
+    def pop_cancel_deadline(self, run_id: str) -> bool:
+        deadline: Optional[float] = self.cancel_deadlines.pop(run_id, None)
+        if deadline is None:
+            return False
+        self.metrics.observe(self.metrics.run_cancel,
+                             time.monotonic() - (deadline - CANCEL_TIMEOUT))
+
+        return True
+
+
+def count_active_runs(state_counts: Dict[str, int]) -> int:
+    return sum(state_counts.get(state.name, 0) for state in ACTIVE_STATES)
+
+
+def wake_scheduler() -> None:
+    current_app.extensions["genpei_scheduler"].wake()
+
+
+def get_queue_info() -> QueueInfo:
+    scheduler: Scheduler = current_app.extensions["genpei_scheduler"]
+    state_counts: Dict[str, int] = count_states()
+    now: datetime = datetime.now()
+    oldest_submitted_at: Optional[str] = get_oldest_queued_submitted_at()
+    oldest_queued_wait_time: float = 0.0
+    if oldest_submitted_at is not None:
+        oldest_queued_wait_time = \
+            (now - datetime.strptime(oldest_submitted_at, DATE_FORMAT))\
+            .total_seconds()
+    dispatches: List[Tuple[str, str]] = \
+        list_recent_dispatches(WAIT_TIME_WINDOW)
+    wait_times: List[float] = \
+        [(datetime.strptime(dispatched_at, DATE_FORMAT) -
+          datetime.strptime(submitted_at, DATE_FORMAT)).total_seconds()
+         for submitted_at, dispatched_at in dispatches]
+    queue_info: QueueInfo = {
+        "max_concurrent_runs": scheduler.max_concurrent_runs,
+        "active_runs": count_active_runs(state_counts),
+        "queued_runs": state_counts.get(State.QUEUED.name, 0),
+        "oldest_queued_wait_time": oldest_queued_wait_time,
+        "mean_wait_time":
+            sum(wait_times) / len(wait_times) if len(wait_times) != 0
+            else 0.0,
+        "max_wait_time": max(wait_times, default=0.0),
+        "resources": scheduler.get_budget(),
+        "committed_resources": sum_active_resources(),
+        "owners": get_owner_queue_info(scheduler, now, dispatches),
+    }
+
+    return queue_info
+
+
+def get_owner_queue_info(scheduler: Scheduler, now: datetime,
+                         dispatches: List[Tuple[str, str]]) \
+        -> List[OwnerQueueInfo]:
+    """
+    The share of each owner, and when its next run is expected to start: as
+    many runs as are ordered before it, at the rate the `dispatches` were
+    started at.
+    """
+    active: Dict[str, Tuple[int, int]] = count_active_runs_by_owner()
+    weights: Dict[str, float] = scheduler.get_owner_weights()
+    queued_runs: List[QueuedRun] = scheduler.order_queued_runs(None)
+    queued: Dict[str, int] = {}
+    next_positions: Dict[str, int] = {}
+    for position, queued_run in enumerate(queued_runs):
+        queued[queued_run["owner"]] = queued.get(queued_run["owner"], 0) + 1
+        next_positions.setdefault(queued_run["owner"], position)
+    dispatch_rate: Optional[float] = None
+    if len(dispatches) > 1:
+        span: float = \
+            (datetime.strptime(dispatches[0][1], DATE_FORMAT) -
+             datetime.strptime(dispatches[-1][1], DATE_FORMAT))\
+            .total_seconds()
+        if span > 0:
+            dispatch_rate = (len(dispatches) - 1) / span
+    owners: List[OwnerQueueInfo] = []
+    for owner in sorted({*active, *queued}, key=lambda owner: (
+            next_positions.get(owner, len(queued_runs)), owner)):
+        next_position: Optional[int] = next_positions.get(owner)
+        estimated_start_time: Optional[str] = None
+        if next_position is not None and dispatch_rate is not None:
+            estimated_start_time = \
+                (now + timedelta(seconds=next_position / dispatch_rate))\
+                .strftime(DATE_FORMAT)
+        owners.append({
+            "owner": owner,
+            "weight": get_weight(owner, weights),
+            "active_runs": active.get(owner, (0, 0))[0],
+            "queued_runs": queued.get(owner, 0),
+            "committed_cores": active.get(owner, (0, 0))[1],
+            "next_position": next_position,
+            "estimated_start_time": estimated_start_time,
+        })
+
+    return owners
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from typing import Any, Dict
+
+from flask import Flask
+from gunicorn.app.base import BaseApplication
+
+from genpei.scheduler import Scheduler
+
+
+class GenpeiServer(BaseApplication):  # type: ignore
+    """
+    Serve the app with pre-forked gunicorn workers. The app is created once
+    in the master process before the workers are forked. The runs are
+    dispatched and supervised by the scheduler process alone, started by
+    `run_server` before the workers are forked.
+    """
+
+    def __init__(self, app: Flask, options: Dict[str, Any]) -> None:
+        self.application: Flask = app
+        self.options: Dict[str, Any] = options
+        super().__init__()
+
+    def load_config(self) -> None:
+        for key, val in self.options.items():
+            self.cfg.set(key, val)
+
+    def load(self) -> Flask:
+        return self.application
+
+
+def get_server_options(params: Dict[str, Any]) \
+        -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "bind": f"{params['host']}:{params['port']}",
+        "workers": params["workers"],
+        "threads": params["threads"],
+        # Unlike the sync worker, the threaded worker does not kill the
+        # requests streaming a log for longer than the worker timeout.
+        "worker_class": "gthread",
+        "keepalive": params["keep_alive"],
+        "backlog": params["backlog"],
+        "preload_app": True,
+        "loglevel": "debug" if params["debug"] else "info",
+    }
+
+    return options
+
+
+def run_server(app: Flask, params: Dict[str, Any]) -> None:
+    scheduler: Scheduler = app.extensions["genpei_scheduler"]
+    scheduler.start_process()
+    try:
+        GenpeiServer(app, get_server_options(params)).run()
+    finally:
+        scheduler.stop_process()
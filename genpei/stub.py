@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import argparse
+import json
+import random
+import time
+from argparse import ArgumentParser, Namespace
+from pathlib import Path
+from typing import IO, Any, Dict, List
+
+from genpei.const import (STUB_DURATION, STUB_FAILURE_RATE, STUB_OUTPUT_SIZE,
+                          STUB_OUTPUTS)
+
+
+def parse_stub_args(args: List[str]) -> Namespace:
+    parser: ArgumentParser = argparse.ArgumentParser(prog="stub",
+                                                     add_help=False)
+    parser.add_argument("--outdir", type=Path, default=Path.cwd())
+    parser.add_argument("--stub-duration", type=float, default=STUB_DURATION)
+    parser.add_argument("--stub-outputs", type=int, default=STUB_OUTPUTS)
+    parser.add_argument("--stub-output-size", type=int,
+                        default=STUB_OUTPUT_SIZE)
+    parser.add_argument("--stub-failure-rate", type=float,
+                        default=STUB_FAILURE_RATE)
+    # The workflow and its parameters come last, as for cwltool
+    parsed: Namespace
+    parsed, _ = parser.parse_known_args(args[:-2])
+    parsed.workflow = args[-2]
+    parsed.job_order = args[-1]
+
+    return parsed
+
+
+def run_stub(args: List[str], stdout: IO[str], stderr: IO[str]) -> int:
+    """
+    A workflow engine that runs nothing, to measure genpei itself. It takes
+    the arguments of cwltool and ignores the ones it does not know. It
+    waits `--stub-duration` seconds, fails at `--stub-failure-rate`, and
+    otherwise writes `--stub-outputs` files of `--stub-output-size` bytes
+    to `--outdir` and reports them on stdout as cwltool does.
+    """
+    parsed: Namespace = parse_stub_args(args)
+    stderr.write(f"INFO [stub] {parsed.workflow} {parsed.job_order}\n")
+    time.sleep(parsed.stub_duration)
+    if random.random() < parsed.stub_failure_rate:
+        stderr.write("ERROR [stub] The run failed at the failure rate " +
+                     f"{parsed.stub_failure_rate}.\n")
+        stderr.write("WARNING Final process status is permanentFail\n")
+        return 1
+    outdir: Path = parsed.outdir.resolve()
+    outdir.mkdir(parents=True, exist_ok=True)
+    outputs: Dict[str, Any] = {}
+    chunk: bytes = b"\0" * min(parsed.stub_output_size, 1024 * 1024)
+    for i in range(parsed.stub_outputs):
+        output_file: Path = outdir.joinpath(f"output_{i}.txt")
+        with output_file.open(mode="wb") as f:
+            remaining: int = parsed.stub_output_size
+            while remaining > 0:
+                remaining -= f.write(chunk[:remaining])
+        outputs[f"output_{i}"] = {
+            "location": output_file.as_uri(),
+            "basename": output_file.name,
+            "class": "File",
+            "size": parsed.stub_output_size,
+            "path": str(output_file),
+        }
+    stdout.write(json.dumps(outputs, indent=4) + "\n")
+    stderr.write("INFO Final process status is success\n")
+
+    return 0
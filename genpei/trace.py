@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import cProfile
+import functools
+import random
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, TypeVar, cast
+from uuid import uuid4
+
+from flask import Response, current_app, g, has_request_context, request
+
+from genpei.const import TRACE_HEADER
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+_tracing: bool = False
+
+
+def set_tracing(tracing: bool) -> None:
+    """
+    Tracing is off unless it is enabled for the app, and `traced` functions
+    are then called through with a single check.
+    """
+    global _tracing
+    _tracing = tracing
+
+
+def traced(func: F) -> F:
+    """
+    Record the time spent in `func` as a span of the request being traced.
+    The spans of the same function are summed up.
+    """
+    name: str = func.__qualname__
+
+    @functools.wraps(func)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        if not _tracing or not has_request_context() or \
+                "genpei_spans" not in g:
+            return func(*args, **kwargs)
+        start: float = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            span: List[float] = g.genpei_spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += time.perf_counter() - start
+
+    return cast(F, wrapper)
+
+
+def should_trace() -> bool:
+    if TRACE_HEADER in request.headers and current_app.config["TRACE"]:
+        return True
+    sample_rate: float = current_app.config["TRACE_SAMPLE_RATE"]
+
+    return sample_rate > 0 and random.random() < sample_rate
+
+
+def start_trace() -> None:
+    if not _tracing or not should_trace():
+        return
+    g.genpei_spans = {}
+    g.genpei_trace_start = time.perf_counter()
+    if current_app.config["PROFILE_DIR"] is not None:
+        profile: cProfile.Profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another request of the process is being profiled
+            return
+        g.genpei_profile = profile
+
+
+def finish_trace(response: Response) -> Response:
+    """
+    Report the spans in the `Server-Timing` header, and dump the profile of
+    the request, if any, as a pstats file in the profile dir.
+    """
+    spans: Optional[Dict[str, List[float]]] = g.get("genpei_spans")
+    if spans is None:
+        return response
+    profile: Optional[cProfile.Profile] = g.pop("genpei_profile", None)
+    if profile is not None:
+        profile.disable()
+        profile_dir: Path = current_app.config["PROFILE_DIR"]
+        profile_dir.mkdir(parents=True, exist_ok=True)
+        profile_file: str = \
+            f"{datetime.now().strftime('%Y%m%d%H%M%S')}-" + \
+            f"{request.endpoint or 'other'}-{uuid4().hex[:8]}.pstats"
+        profile.dump_stats(str(profile_dir.joinpath(profile_file)))
+        response.headers[f"{TRACE_HEADER}-Profile"] = profile_file
+    timings: List[str] = \
+        [f'{name};dur={duration * 1000:.3f};desc="{count} calls"'
+         for name, (count, duration) in spans.items()]
+    total: float = time.perf_counter() - g.genpei_trace_start
+    timings.append(f"total;dur={total * 1000:.3f}")
+    response.headers["Server-Timing"] = ", ".join(timings)
+
+    return response
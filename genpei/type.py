@@ -2,12 +2,12 @@
 # coding: utf-8
 from enum import Enum, auto
 from sys import version_info
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 if version_info.minor < 8:
-    from typing_extensions import TypedDict
+    from typing_extensions import Literal, TypedDict
 else:
-    from typing import TypedDict  # type: ignore
+    from typing import Literal, TypedDict  # type: ignore
 
 
 class DefaultWorkflowEngineParameter(TypedDict):
@@ -119,6 +119,24 @@ class WorkflowTypeVersion(TypedDict):
     workflow_type_version: List[str]
 
 
+class Resources(TypedDict):
+    """
+    An amount of cores and memory, requested by a run or budgeted for the
+    runs of the node.
+
+    cores:
+        The number of CPU cores
+    ram:
+        The memory in mebibytes, as `ramMin` of the ResourceRequirement of
+        CWL
+    """
+    cores: int
+    ram: int
+
+
+ResourceKey = Literal["cores", "ram"]
+
+
 class ServiceInfo(TypedDict):
     """
     A message containing useful information about the running service,
@@ -159,6 +177,12 @@ class ServiceInfo(TypedDict):
     tags:
         A key-value map of arbitrary, extended metadata outside the scope of
         the above but useful to report back
+    resources:
+        The cores and memory of the node shared by the runs. The detected
+        ones of the host unless set in `service-info.json`.
+    owner_weights:
+        The weight of each owner in the fair share of the node. The owners
+        not listed weigh 1.
     """
     workflow_type_versions: Dict[str, WorkflowTypeVersion]
     supported_wes_versions: List[str]
@@ -169,6 +193,8 @@ class ServiceInfo(TypedDict):
     auth_instructions_url: str
     contact_info_url: str
     tags: Dict[str, str]
+    resources: Resources
+    owner_weights: Dict[str, float]
 
 
 class RunStatus(TypedDict):
@@ -197,6 +223,30 @@ class RunListResponse(TypedDict):
     next_page_token: str
 
 
+class RunListPageToken(TypedDict):
+    """
+    The content of `next_page_token` returned by genpei. The filters of the
+    first request are carried over to the following pages.
+
+    snapshot:
+        The latest run index sequence at the moment that the first page was
+        requested. Runs submitted after that are not listed.
+    after_seq:
+        The run index sequence of the last run in the previous page
+    states:
+        The states to filter the runs by
+    submitted_after:
+        Only list the runs submitted after this time
+    submitted_before:
+        Only list the runs submitted before this time
+    """
+    snapshot: int
+    after_seq: int
+    states: List[str]
+    submitted_after: Optional[str]
+    submitted_before: Optional[str]
+
+
 class RunRequest(TypedDict):
     """
     To execute a workflow, send a run request including all the details needed
@@ -267,6 +317,158 @@ class RunLog(TypedDict):
     outputs: Dict[Any, Any]
 
 
+class OutputFile(TypedDict):
+    """
+    An entry of the outputs manifest of a workflow run.
+
+    name:
+        The path relative to the output directory
+    path:
+        The absolute path of the file
+    size:
+        The size of the file in bytes
+    mtime:
+        The modification time of the file, in "%Y-%m-%dT%H:%M:%S"
+    """
+    name: str
+    path: str
+    size: int
+    mtime: str
+
+
+class OutputListResponse(TypedDict):
+    """
+    outputs:
+        A page of the output files of the workflow run, sorted by name.
+    next_page_token:
+        A token which may be supplied as `page_token` to get the next page of
+        results. An empty string indicates there are no more items to return.
+    """
+    outputs: List[OutputFile]
+    next_page_token: str
+
+
+class Attachment(TypedDict):
+    """
+    A file attached to a run request through `workflow_attachment`.
+
+    name:
+        The file name in the exe dir of the run
+    sha256:
+        The hex digest of the sha256 of the file
+    size:
+        The size of the file in bytes
+    """
+    name: str
+    sha256: str
+    size: int
+
+
+class Blob(TypedDict):
+    """
+    A file in the content addressed store of uploaded attachments.
+
+    sha256:
+        The hex digest of the sha256 of the file
+    size:
+        The size of the file in bytes
+    """
+    sha256: str
+    size: int
+
+
+class QueuedRun(TypedDict):
+    """
+    A QUEUED run as the scheduler orders it.
+
+    run_id:
+        workflow run ID
+    owner:
+        The owner sharing the node with the others
+    priority:
+        The runs of an owner are started from the highest priority
+    seq:
+        The submission order of the run
+    resources:
+        The cores and memory requested by the run
+    """
+    run_id: str
+    owner: str
+    priority: int
+    seq: int
+    resources: Resources
+
+
+class OwnerQueueInfo(TypedDict):
+    """
+    The share of the node of an owner with active or queued runs.
+
+    owner:
+        The owner of the runs
+    weight:
+        The weight of the owner in the fair share
+    active_runs:
+        The number of runs of the owner in INITIALIZING, RUNNING or
+        CANCELING
+    queued_runs:
+        The number of runs of the owner waiting in QUEUED
+    committed_cores:
+        The cores requested by the active runs of the owner
+    next_position:
+        How many queued runs start before the next run of the owner, or
+        null without queued runs
+    estimated_start_time:
+        When the next run of the owner is expected to start
+        ("%Y-%m-%dT%H:%M:%S"), from the rate the runs were started at last,
+        or null without queued runs or such a rate
+    """
+    owner: str
+    weight: float
+    active_runs: int
+    queued_runs: int
+    committed_cores: int
+    next_position: Optional[int]
+    estimated_start_time: Optional[str]
+
+
+class QueueInfo(TypedDict):
+    """
+    The state of the run queue of genpei.
+
+    max_concurrent_runs:
+        The maximum number of runs executed at the same time. 0 means no
+        limit.
+    active_runs:
+        The number of runs in INITIALIZING, RUNNING or CANCELING
+    queued_runs:
+        The number of runs waiting in QUEUED
+    oldest_queued_wait_time:
+        How long the oldest QUEUED run has been waiting, in seconds
+    mean_wait_time:
+        The mean time between submission and dispatch of the runs dispatched
+        last, in seconds
+    max_wait_time:
+        The longest time between submission and dispatch of the runs
+        dispatched last, in seconds
+    resources:
+        The cores and memory budgeted for the runs
+    committed_resources:
+        The cores and memory requested by the active runs
+    owners:
+        The share of the node of each owner with active or queued runs, in
+        the order their next runs start
+    """
+    max_concurrent_runs: int
+    active_runs: int
+    queued_runs: int
+    oldest_queued_wait_time: float
+    mean_wait_time: float
+    max_wait_time: float
+    resources: Resources
+    committed_resources: Resources
+    owners: List[OwnerQueueInfo]
+
+
 class RunId(TypedDict):
     """
     workflow run ID
@@ -274,6 +476,29 @@ class RunId(TypedDict):
     run_id: str
 
 
+class RunIdList(TypedDict):
+    """
+    The IDs of the runs whose cancel was accepted
+    """
+    run_ids: List[str]
+
+
+class StateEvent(TypedDict):
+    """
+    A state transition of a run.
+
+    seq:
+        The sequence number of the transition, which increases across all
+        the runs. Used as the ID of the server-sent event.
+    time:
+        When the transition happened, in the format of DATE_FORMAT
+    """
+    seq: int
+    run_id: str
+    state: str
+    time: str
+
+
 class ErrorResponse(TypedDict):
     """
     An object that can optionally include information about the error.
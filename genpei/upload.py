@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import hashlib
+import os
+import re
+from pathlib import Path
+from traceback import format_exc
+from typing import IO, Any, Optional, Pattern
+
+from flask import Request, abort, current_app
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import default_stream_factory
+from werkzeug.utils import secure_filename
+
+from genpei.const import BLOB_DIR, BLOB_MODE, STREAM_CHUNK_SIZE
+from genpei.trace import traced
+from genpei.type import Attachment, Blob
+
+SHA256_PATTERN: Pattern[str] = re.compile("[0-9a-f]{64}")
+
+
+class AttachmentWriter:
+    """
+    The container of a multipart file part, written straight into the exe dir
+    of a run chunk by chunk as the request body is parsed. The sha256 and the
+    size are computed on the way through, and `max_size` is enforced while
+    streaming.
+    """
+
+    def __init__(self, path: Path, max_size: Optional[int]) -> None:
+        self.path: Path = path
+        self.max_size: Optional[int] = max_size
+        self.size: int = 0
+        self.hash: Any = hashlib.sha256()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file: IO[bytes] = self.path.open(mode="wb+")
+
+    def write(self, data: bytes) -> int:
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.file.close()
+            self.path.unlink()
+            raise RequestEntityTooLarge(
+                f"{self.path.name} exceeds the maximum file size of " +
+                f"{self.max_size} bytes.")
+        self.hash.update(data)
+
+        return self.file.write(data)
+
+    def read(self, size: int = -1) -> bytes:
+        return self.file.read(size)
+
+    def readline(self, size: int = -1) -> bytes:
+        return self.file.readline(size)
+
+    def seek(self, offset: int, whence: int = 0) -> int:
+        return self.file.seek(offset, whence)
+
+    def tell(self) -> int:
+        return self.file.tell()
+
+    def close(self) -> None:
+        self.file.close()
+
+    @property
+    def closed(self) -> bool:
+        return self.file.closed
+
+    def to_attachment(self) -> Attachment:
+        return {
+            "name": self.path.name,
+            "sha256": self.hash.hexdigest(),
+            "size": self.size
+        }
+
+
+class GenpeiRequest(Request):
+    """
+    When `upload_dir` is set before the form is parsed, the file parts of the
+    multipart body are streamed into it instead of being spooled. Two file
+    parts of the same name are rejected, instead of one overwriting the
+    other.
+    """
+    upload_dir: Optional[Path] = None
+
+    @traced
+    def _load_form_data(self) -> None:
+        """
+        Traced on its own, as the attachments are streamed into the exe dir
+        while the form is parsed, before `prepare_exe_dir` is called.
+        """
+        super()._load_form_data()
+
+    def _get_file_stream(self, total_content_length: Optional[int],
+                         content_type: Optional[str],
+                         filename: Optional[str] = None,
+                         content_length: Optional[int] = None) -> IO[bytes]:
+        file_name: str = secure_filename(filename or "")
+        if self.upload_dir is None or file_name == "":
+            return default_stream_factory(
+                total_content_length=total_content_length,
+                content_type=content_type,
+                filename=filename,
+                content_length=content_length)
+        file_path: Path = self.upload_dir.joinpath(file_name).resolve()
+        if file_path.exists():
+            abort(400,
+                  f"{filename}, the name of an attached file, is given " +
+                  "more than once.")
+        max_file_size: int = current_app.config["MAX_FILE_SIZE"]
+
+        return AttachmentWriter(  # type: ignore
+            file_path, max_file_size if max_file_size > 0 else None)
+
+
+def hash_file(file: Path) -> Attachment:
+    file_hash: Any = hashlib.sha256()
+    size: int = 0
+    with file.open(mode="rb") as f:
+        for chunk in iter(lambda: f.read(STREAM_CHUNK_SIZE), b""):
+            file_hash.update(chunk)
+            size += len(chunk)
+
+    return {
+        "name": file.name,
+        "sha256": file_hash.hexdigest(),
+        "size": size
+    }
+
+
+def get_blob_path(sha256: str, run_base_dir: Optional[Path] = None) -> Path:
+    if run_base_dir is None:
+        run_base_dir = current_app.config["RUN_DIR"]
+
+    return run_base_dir.joinpath(BLOB_DIR, sha256[:2], sha256)
+
+
+def validate_sha256(sha256: str) -> None:
+    if SHA256_PATTERN.fullmatch(sha256) is None:
+        abort(400, f"{sha256} is not a hex digest of sha256.")
+
+
+def get_blob(sha256: str) -> Optional[Blob]:
+    blob_path: Path = get_blob_path(sha256)
+    if SHA256_PATTERN.fullmatch(sha256) is None or not blob_path.exists():
+        return None
+
+    return {
+        "sha256": sha256,
+        "size": blob_path.stat().st_size
+    }
+
+
+def store_blob(file: Path, sha256: str) -> None:
+    """
+    Deduplicate an attachment already written to the exe dir against the
+    content addressed store. The blob is made read-only so that a workflow
+    cannot modify the content shared with the other runs in place. When
+    hardlinks cannot be made (e.g. the store is on another device), the
+    attachment is left as it is.
+    """
+    blob_path: Path = get_blob_path(sha256)
+    blob_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        if blob_path.exists():
+            link_file(blob_path, file)
+        else:
+            os.chmod(file, BLOB_MODE)
+            os.link(file, blob_path)
+    except FileExistsError:
+        link_file(blob_path, file)
+    except OSError:
+        current_app.logger.debug(format_exc())
+
+
+def link_blob(sha256: str, file: Path) -> Attachment:
+    validate_sha256(sha256)
+    blob_path: Path = get_blob_path(sha256)
+    if not blob_path.exists():
+        abort(400,
+              f"{sha256}, the sha256 of {file.name} specified in " +
+              "workflow_attachment_sha256, is not in the store. Please " +
+              "attach the file itself.")
+    file.parent.mkdir(parents=True, exist_ok=True)
+    link_file(blob_path, file)
+
+    return {
+        "name": file.name,
+        "sha256": sha256,
+        "size": blob_path.stat().st_size
+    }
+
+
+def link_file(src: Path, dst: Path) -> None:
+    """
+    Replace `dst` with a hardlink to `src` atomically.
+    """
+    tmp: Path = dst.with_name(f".{dst.name}.{os.getpid()}.tmp")
+    os.link(src, tmp)
+    os.replace(tmp, dst)
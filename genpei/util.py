@@ -1,38 +1,98 @@
 #!/usr/bin/env python3
 # coding: utf-8
-import collections
 import json
 import os
 import shlex
+from datetime import datetime
 from pathlib import Path
 from traceback import format_exc
-from typing import Any, Dict, Iterable, List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, cast
 from uuid import uuid4
 
 from cwltool.update import ALLUPDATES
 from cwltool.utils import versionstring
-from flask import current_app
-
-from genpei.const import RUN_DIR_STRUCTURE
-from genpei.type import DefaultWorkflowEngineParameter, ServiceInfo, State
+from flask import current_app, has_app_context
+from jsonschema import validate
+
+from genpei.const import (DATE_FORMAT, DEFAULT_OWNER, DEFAULT_PRIORITY,
+                          DEFAULT_RUN_CORES, DEFAULT_RUN_RAM,
+                          RUN_DIR_STRUCTURE, SERVICE_INFO_SCHEMA,
+                          STREAM_CHUNK_SIZE, TERMINAL_STATES)
+from genpei.fairshare import parse_run_owner
+from genpei.json_backend import dumps, loads
+from genpei.metrics import count_fs_operations
+from genpei.registry import (compare_and_set_state, count_states, list_run_ids,
+                             rebuild_index, register_run, update_state)
+from genpei.resources import get_host_resources, parse_run_resources
+from genpei.trace import traced
+from genpei.type import (DefaultWorkflowEngineParameter, OutputFile, Resources,
+                         RunRequest, ServiceInfo, State)
 
 CWLTOOL_VERSION: str = versionstring().split(" ")[1]
 CWL_VERSIONS: List[str] = list(map(str, ALLUPDATES.keys()))
 
 
+_service_info_cache: Dict[Path, Tuple[Tuple[int, int], ServiceInfo]] = {}
+_service_info_schema: Dict[str, Any] = {}
+
+
 def read_service_info(service_info_path: Optional[Path] = None) -> ServiceInfo:
+    service_info: ServiceInfo = \
+        cast(ServiceInfo, dict(load_service_info(service_info_path)))
+    service_info["system_state_counts"] = count_system_state()  # type: ignore
+
+    return service_info
+
+
+def load_service_info(service_info_path: Optional[Path] = None) \
+        -> ServiceInfo:
+    """
+    Return the parsed and validated `service-info.json` shared in the
+    process. Do not modify the returned value. The file is re-read and
+    re-validated only when its mtime or size changes. If a changed file is
+    invalid, the previously loaded one is kept.
+    """
     if service_info_path is None:
         service_info_path = current_app.config["SERVICE_INFO"]
-    with service_info_path.open(mode="r") as f:
-        service_info: ServiceInfo = json.load(f)
+    stat: os.stat_result = service_info_path.stat()
+    file_version: Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+    cached: Optional[Tuple[Tuple[int, int], ServiceInfo]] = \
+        _service_info_cache.get(service_info_path)
+    if cached is not None and cached[0] == file_version:
+        return cached[1]
+    try:
+        with service_info_path.open(mode="r") as f:
+            service_info: ServiceInfo = json.load(f)
+        validate(service_info, load_service_info_schema())
+    except Exception:
+        if cached is None:
+            raise
+        if has_app_context():
+            current_app.logger.error(
+                f"Failed to reload {service_info_path}, " +
+                "the previous service-info is used.")
+            current_app.logger.debug(format_exc())
+        _service_info_cache[service_info_path] = (file_version, cached[1])
+        return cached[1]
     service_info["workflow_engine_versions"]["cwltool"] = CWLTOOL_VERSION
     service_info["workflow_type_versions"]["CWL"]["workflow_type_version"] = \
         CWL_VERSIONS
-    service_info["system_state_counts"] = count_system_state()  # type: ignore
+    service_info["resources"] = {
+        **get_host_resources(), **service_info.get("resources", {})}
+    service_info.setdefault("owner_weights", {})
+    _service_info_cache[service_info_path] = (file_version, service_info)
 
     return service_info
 
 
+def load_service_info_schema() -> Dict[str, Any]:
+    if len(_service_info_schema) == 0:
+        with SERVICE_INFO_SCHEMA.open(mode="r") as f:
+            _service_info_schema.update(json.load(f))
+
+    return _service_info_schema
+
+
 def generate_run_id() -> str:
     return str(uuid4())
 
@@ -55,8 +115,30 @@ def write_file(run_id: str, file_type: str, content: str,
                run_base_dir: Optional[Path] = None) -> None:
     file: Path = get_path(run_id, file_type, run_base_dir)
     file.parent.mkdir(parents=True, exist_ok=True)
+    count_fs_operations()
     with file.open(mode="w") as f:
         f.write(content)
+    if file_type == "run_request":
+        register_run(run_id, run_base_dir)
+    elif file_type == "state":
+        update_state(run_id, State[content], run_base_dir)
+
+
+def transition_state(run_id: str, from_states: List[State], to_state: State,
+                     run_base_dir: Optional[Path] = None) -> bool:
+    """
+    Change the state only if the run is in one of `from_states`. The index
+    arbitrates, so e.g. a cancel and the end of the run racing each other
+    do not overwrite the state of one another.
+    """
+    if not compare_and_set_state(run_id, from_states, to_state,
+                                 run_base_dir):
+        return False
+    count_fs_operations()
+    with get_path(run_id, "state", run_base_dir).open(mode="w") as f:
+        f.write(to_state.name)
+
+    return True
 
 
 def flatten_wf_engine_params(wf_engine_params: str,
@@ -77,19 +159,57 @@ def flatten_wf_engine_params(wf_engine_params: str,
     return params
 
 
+@traced
 def get_all_run_ids() -> List[str]:
-    run_base_dir: Path = current_app.config["RUN_DIR"]
-    run_requests: List[Path] = \
-        list(run_base_dir.glob(f"**/{RUN_DIR_STRUCTURE['run_request']}"))
-    run_ids: List[str] = \
-        [run_request.parent.name for run_request in run_requests]
+    return list_run_ids()
 
-    return run_ids
+
+def reindex(run_base_dir: Optional[Path] = None) -> None:
+    """
+    Rebuild the run index by walking `RUN_DIR_STRUCTURE` under the run dir.
+    The submission time of each run is taken from the mtime of its
+    `run_request.json`, and its resources, owner and priority from its
+    content.
+    """
+    if run_base_dir is None:
+        run_base_dir = current_app.config["RUN_DIR"]
+    run_requests: List[Path] = sorted(
+        run_base_dir.glob(f"*/*/{RUN_DIR_STRUCTURE['run_request']}"),
+        key=lambda run_request: run_request.stat().st_mtime)
+    runs: List[Tuple[str, State, str, Resources, str, int]] = []
+    for run_request in run_requests:
+        run_id: str = run_request.parent.name
+        submitted_at: str = datetime.fromtimestamp(
+            run_request.stat().st_mtime).strftime(DATE_FORMAT)
+        runs.append((run_id, get_state(run_id, run_base_dir), submitted_at,
+                     read_run_resources(run_request),
+                     *read_run_owner(run_request)))
+    rebuild_index(runs, run_base_dir)
+
+
+def read_run_resources(run_request_path: Path) -> Resources:
+    try:
+        with run_request_path.open(mode="r") as f:
+            run_request: RunRequest = loads(f.read())
+        return parse_run_resources(run_request)
+    except Exception:
+        return {"cores": DEFAULT_RUN_CORES, "ram": DEFAULT_RUN_RAM}
 
 
-def get_state(run_id: str) -> State:
+def read_run_owner(run_request_path: Path) -> Tuple[str, int]:
     try:
-        with get_path(run_id, "state").open(mode="r") as f:
+        with run_request_path.open(mode="r") as f:
+            run_request: RunRequest = loads(f.read())
+        return parse_run_owner(run_request)
+    except Exception:
+        return DEFAULT_OWNER, DEFAULT_PRIORITY
+
+
+@traced
+def get_state(run_id: str, run_base_dir: Optional[Path] = None) -> State:
+    count_fs_operations()
+    try:
+        with get_path(run_id, "state", run_base_dir).open(mode="r") as f:
             str_state: str = \
                 [line for line in f.read().splitlines() if line != ""][0]
         return State[str_state]
@@ -97,8 +217,11 @@ def get_state(run_id: str) -> State:
         return State.UNKNOWN
 
 
-def read_file(run_id: str, file_type: str) -> Any:
-    file: Path = get_path(run_id, file_type)
+@traced
+def read_file(run_id: str, file_type: str,
+              run_base_dir: Optional[Path] = None) -> Any:
+    file: Path = get_path(run_id, file_type, run_base_dir)
+    count_fs_operations()
     if file.exists() is False:
         return None
     with file.open(mode="r") as f:
@@ -107,22 +230,98 @@ def read_file(run_id: str, file_type: str) -> Any:
         elif file_type in ["stdout", "stderr"]:
             return f.read()
         elif file_type in ["run_request", "outputs", "task_logs"]:
-            return json.load(f)
+            return loads(f.read())
         else:
             return f.read()
 
 
+@traced
 def get_outputs(run_id: str) -> Dict[str, str]:
-    cmd: List[str] = shlex.split(read_file(run_id, "cmd"))
-    outdir_ind: int = cmd.index("--outdir") + 1
-    outdir_path: Path = Path(cmd[outdir_ind]).resolve()
+    """
+    The outputs of a run are listed from its manifest once the run reaches a
+    terminal state. In-progress runs have no outputs here, use
+    `walk_outputs` to list them.
+    """
+    manifest: Optional[List[OutputFile]] = get_outputs_manifest(run_id)
+    if manifest is None:
+        return {}
+    outputs: Dict[str, str] = \
+        {output_file["name"]: output_file["path"] for output_file in manifest}
+
+    return outputs
+
+
+def get_outputs_manifest(run_id: str) -> Optional[List[OutputFile]]:
+    """
+    Read the outputs manifest written when the run reached a terminal state.
+    For terminal runs without a manifest (e.g. the runs before manifests
+    existed), it is written at the first call. Returns None for runs still
+    in progress.
+    """
+    manifest: Optional[List[OutputFile]] = read_file(run_id, "outputs")
+    if manifest is None and get_state(run_id) in TERMINAL_STATES:
+        manifest = write_outputs_manifest(run_id)
+
+    return manifest
+
+
+def write_outputs_manifest(run_id: str,
+                           run_base_dir: Optional[Path] = None) \
+        -> List[OutputFile]:
+    manifest: List[OutputFile] = walk_outputs(run_id, run_base_dir)
+    write_file(run_id, "outputs", dumps(manifest), run_base_dir)
+
+    return manifest
+
+
+@traced
+def walk_outputs(run_id: str, run_base_dir: Optional[Path] = None) \
+        -> List[OutputFile]:
+    outdir_path: Optional[Path] = get_outdir(run_id, run_base_dir)
+    if outdir_path is None:
+        return []
     output_files: List[Path] = sorted(list(walk_all_files(outdir_path)))
-    outputs: Dict[str, str] = {}
+    count_fs_operations(len(output_files) + 1)
+    manifest: List[OutputFile] = []
     for output_file in output_files:
-        outputs[str(output_file.relative_to(outdir_path))] = \
-            str(output_file)
+        stat: os.stat_result = output_file.stat()
+        manifest.append({
+            "name": str(output_file.relative_to(outdir_path)),
+            "path": str(output_file),
+            "size": stat.st_size,
+            "mtime": datetime.fromtimestamp(stat.st_mtime)
+            .strftime(DATE_FORMAT),
+        })
+
+    return manifest
+
+
+def get_outdir(run_id: str, run_base_dir: Optional[Path] = None) \
+        -> Optional[Path]:
+    cmd_file: Path = get_path(run_id, "cmd", run_base_dir)
+    if not cmd_file.exists():
+        return None
+    with cmd_file.open(mode="r") as f:
+        cmd: List[str] = shlex.split(f.read())
+    outdir_ind: int = cmd.index("--outdir") + 1
 
-    return outputs
+    return Path(cmd[outdir_ind]).resolve()
+
+
+def stream_file(file: Path, start: int, end: int) -> Iterator[bytes]:
+    """
+    Yield the bytes of `file` in [start, end) in chunks of
+    `STREAM_CHUNK_SIZE`, without reading the whole file into memory.
+    """
+    with file.open(mode="rb") as f:
+        f.seek(start)
+        remaining: int = end - start
+        while remaining > 0:
+            chunk: bytes = f.read(min(STREAM_CHUNK_SIZE, remaining))
+            if len(chunk) == 0:
+                break
+            remaining -= len(chunk)
+            yield chunk
 
 
 def walk_all_files(dir: Path) -> Iterable[Path]:
@@ -132,26 +331,14 @@ def walk_all_files(dir: Path) -> Iterable[Path]:
 
 
 def count_system_state() -> Dict[str, int]:
-    run_ids: List[str] = get_all_run_ids()
-    count: Dict[str, int] = \
-        dict(collections.Counter(
-            [get_state(run_id).name for run_id in run_ids]))
-
-    return count
+    return count_states()
 
 
 def read_default_wf_engine_params(service_info_path: Optional[Path] = None) \
         -> List[str]:
-    default_wf_engine_params: List[DefaultWorkflowEngineParameter]
-    if service_info_path is None:
-        default_wf_engine_params = \
-            read_service_info(service_info_path)[
-                "default_workflow_engine_parameters"]
-    else:
-        with service_info_path.open(mode="r") as f:
-            service_info: ServiceInfo = json.load(f)
-        default_wf_engine_params = \
-            service_info["default_workflow_engine_parameters"]
+    default_wf_engine_params: List[DefaultWorkflowEngineParameter] = \
+        load_service_info(service_info_path)[
+            "default_workflow_engine_parameters"]
     params: List[str] = []
     for param in default_wf_engine_params:
         params.append(str(param.get("name", "")))
@@ -29,13 +29,19 @@ def main() -> None:
           author_email="suehiro619@gmail.com",
           url="https://github.com/suecharo/genpei",
           license="Apache2.0",
-          python_requires=">=3.6",
+          python_requires=">=3.7",
           platforms="any",
           include_package_data=True,
           zip_safe=False,
-          classifiers=["Programming Language :: Python"],
+          classifiers=["Programming Language :: Python",
+                       "Programming Language :: Python :: 3.7",
+                       "Programming Language :: Python :: 3.8"],
           packages=["genpei"],
           install_requires=read_requirements_txt(),
+          extras_require={
+              "orjson": ["orjson"],
+              "zstd": ["zstandard"],
+          },
           entry_points={
               "console_scripts": [
                   "genpei=genpei.app:main",
@@ -1,9 +1,26 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import json
 import os
+import subprocess
+from argparse import Namespace
+from pathlib import Path
+from time import sleep
+from typing import Any, Callable, Dict, Iterator, List, Optional
 
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import DEFAULT_SERVICE_INFO
+from genpei.scheduler import Scheduler
+from genpei.type import RunRequest
+
+from .test_reindex import RUN_PROCESSES
 
 
 @pytest.fixture
@@ -11,3 +28,105 @@ def delete_env_vars(monkeypatch: MonkeyPatch) -> None:
     for key in os.environ.keys():
         if key.startswith("GENPEI"):
             monkeypatch.delenv(key)
+
+
+@pytest.fixture(autouse=True)
+def stop_schedulers(monkeypatch: MonkeyPatch) -> Iterator[None]:
+    """
+    Stop the schedulers started by the apps of a test at its end, so that
+    their runs do not keep executing against the removed tmpdir.
+    """
+    schedulers: List[Scheduler] = []
+    start: Callable[[Scheduler], None] = Scheduler.start
+
+    def _start(scheduler: Scheduler) -> None:
+        schedulers.append(scheduler)
+        start(scheduler)
+
+    monkeypatch.setattr(Scheduler, "start", _start)
+    yield
+    for scheduler in schedulers:
+        scheduler.stop()
+
+
+@pytest.fixture(autouse=True)
+def run_processes() -> Iterator[None]:
+    """
+    Kill the processes started by `make_run_dir` for the runs of a test,
+    even when it fails.
+    """
+    yield
+    while len(RUN_PROCESSES) != 0:
+        process: "subprocess.Popen[bytes]" = RUN_PROCESSES.pop()
+        process.kill()
+        process.wait()
+
+
+@pytest.fixture
+def stub_client(delete_env_vars: None, tmpdir: LocalPath) \
+        -> Callable[..., FlaskClient]:
+    """
+    A factory of the clients of an app executing its runs by the stub
+    engine in `tmpdir`. `service_info` is merged into the default
+    `service-info.json`, and `args` are appended to the command line.
+    """
+    def _stub_client(args: List[str] = [],
+                     service_info: Dict[str, Any] = {}) -> FlaskClient:
+        service_info_path: Path = Path(tmpdir).joinpath("service-info.json")
+        service_info_path.write_text(json.dumps({
+            **json.loads(DEFAULT_SERVICE_INFO.read_text()), **service_info}))
+        parsed_args: Namespace = parse_args(
+            ["--run-dir", str(tmpdir),
+             "--service-info", str(service_info_path),
+             "--engine", "stub", *args])
+        app: Flask = create_app(handle_default_params(parsed_args))
+        app.testing = True
+
+        return app.test_client()
+
+    return _stub_client
+
+
+@pytest.fixture
+def post_stub_run() -> Callable[..., Response]:
+    """
+    Post a run of the stub engine with `wf_engine_params`, e.g.
+    `{"--stub-duration": "0.5"}`.
+    """
+    def _post_stub_run(client: FlaskClient,
+                       wf_engine_params: Dict[str, str] = {},
+                       tags: Dict[str, Any] = {},
+                       headers: Optional[Dict[str, str]] = None) -> Response:
+        data: RunRequest = {  # type: ignore
+            "workflow_params": json.dumps({}),
+            "workflow_type": "CWL",
+            "workflow_type_version": "v1.0",
+            "tags": json.dumps(tags),
+            "workflow_engine_parameters": json.dumps(wf_engine_params),
+            "workflow_url": "stub.cwl",
+        }
+
+        return client.post("/runs", data=data, headers=headers,
+                           content_type="multipart/form-data")
+
+    return _post_stub_run
+
+
+@pytest.fixture
+def wait_state() -> Callable[..., str]:
+    """
+    Wait for a run to reach one of `states`, for at most 5 seconds, and
+    return its last state.
+    """
+    def _wait_state(client: FlaskClient, run_id: str,
+                    states: List[str]) -> str:
+        for _ in range(100):
+            state: str = \
+                client.get(f"/runs/{run_id}/status").get_json()["state"]
+            if state in states:
+                break
+            sleep(0.05)
+
+        return state
+
+    return _wait_state
@@ -2,9 +2,8 @@
 # coding: utf-8
 import json
 from argparse import Namespace
-from pathlib import Path
 from time import sleep
-from typing import Dict, Union
+from typing import Any, Dict
 
 from flask import Flask
 from flask.testing import FlaskClient
@@ -45,9 +44,9 @@ def access_remote_files(client: FlaskClient) -> Response:  # type: ignore
 
 def test_access_remote_files(delete_env_vars: None, tmpdir: LocalPath) -> None:
     args: Namespace = parse_args(["--run-dir", str(tmpdir)])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.debug = params["debug"]  # type: ignore
+    app.debug = params["debug"]
     app.testing = True
     client: FlaskClient[Response] = app.test_client()
     posts_res: Response = access_remote_files(client)
@@ -86,6 +85,7 @@ def test_access_remote_files(delete_env_vars: None, tmpdir: LocalPath) -> None:
         detail_res_data["request"]["workflow_url"]
     assert run_id == detail_res_data["run_id"]
     assert detail_res_data["run_log"]["exit_code"] == 0
+    stderr_res: Response = client.get(detail_res_data["run_log"]["stderr"])
     assert "Final process status is success" in \
-        detail_res_data["run_log"]["stderr"]
+        stderr_res.get_data(as_text=True)
     assert "COMPLETE" == detail_res_data["state"]  # type: ignore
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import hashlib
+import json
+from argparse import Namespace
+from io import BytesIO
+from pathlib import Path
+from typing import Any, Dict, List
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+from genpei.type import Attachment, RunId
+
+from ..resource_list import CWL_WF
+
+
+def post_with_attachment(client: FlaskClient,  # type: ignore
+                         content: bytes) -> Response:
+    data: Dict[str, Any] = {
+        "workflow_params": json.dumps({}),
+        "workflow_type": "CWL",
+        "workflow_type_version": "v1.0",
+        "tags": json.dumps({}),
+        "workflow_engine_parameters": json.dumps({}),
+        "workflow_url": CWL_WF.name,
+        "workflow": (BytesIO(content), "input.txt"),
+    }
+    response: Response = client.post("/runs", data=data,
+                                     content_type="multipart/form-data")
+
+    return response
+
+
+def test_stream_attachments(delete_env_vars: None,
+                            tmpdir: LocalPath) -> None:
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--max-file-size", "1024"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    content: bytes = b"genpei" * 100
+    res: Response = post_with_attachment(client, content)
+    res_data: RunId = res.get_json()
+
+    assert res.status_code == 200
+
+    run_dir: Path = Path(tmpdir).joinpath(res_data["run_id"][:2],
+                                          res_data["run_id"])
+    exe_file: Path = \
+        run_dir.joinpath(RUN_DIR_STRUCTURE["exe_dir"], "input.txt")
+
+    assert exe_file.read_bytes() == content
+
+    with run_dir.joinpath(RUN_DIR_STRUCTURE["attachments"]).open() as f:
+        attachments: List[Attachment] = json.load(f)
+
+    assert attachments == [{
+        "name": "input.txt",
+        "sha256": hashlib.sha256(content).hexdigest(),
+        "size": len(content)
+    }]
+
+    res = post_with_attachment(client, b"genpei" * 1000)
+
+    assert res.status_code == 413
+    assert len(client.get("/runs").get_json()["runs"]) == 1
+    assert len(list(Path(tmpdir).glob("*/*"))) == 1
+    # The prefix dir of the rejected run is removed as well
+    assert len([path for path in Path(tmpdir).iterdir()
+                if path.is_dir()]) == 1
+
+
+def test_duplicate_attachments(delete_env_vars: None,
+                               tmpdir: LocalPath) -> None:
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    data: Dict[str, Any] = {
+        "workflow_params": json.dumps({}),
+        "workflow_type": "CWL",
+        "workflow_type_version": "v1.0",
+        "tags": json.dumps({}),
+        "workflow_engine_parameters": json.dumps({}),
+        "workflow_url": CWL_WF.name,
+        "workflow": (BytesIO(b"first"), "input.txt"),
+        "tool": (BytesIO(b"second"), "input.txt"),
+    }
+    res: Response = client.post("/runs", data=data,
+                                content_type="multipart/form-data")
+
+    assert res.status_code == 400
+    assert "more than once" in res.get_json()["msg"]
+    assert list(Path(tmpdir).glob("*/*")) == []
+
+
+def test_content_addressed_store(delete_env_vars: None,
+                                 tmpdir: LocalPath) -> None:
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--content-addressed-store"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    content: bytes = b"genpei" * 100
+    sha256: str = hashlib.sha256(content).hexdigest()
+
+    assert client.get(f"/blobs/{sha256}").status_code == 404
+
+    exe_files: List[Path] = []
+    for _ in range(2):
+        run_id: str = post_with_attachment(client, content).get_json()[
+            "run_id"]
+        exe_files.append(Path(tmpdir).joinpath(
+            run_id[:2], run_id, RUN_DIR_STRUCTURE["exe_dir"], "input.txt"))
+
+    assert exe_files[0].stat().st_ino == exe_files[1].stat().st_ino
+    assert exe_files[1].read_bytes() == content
+
+    blob_res: Response = client.get(f"/blobs/{sha256}")
+
+    assert blob_res.status_code == 200
+    assert blob_res.get_json() == {"sha256": sha256, "size": len(content)}
+    assert client.head(f"/blobs/{sha256}").status_code == 200
+
+    data: Dict[str, Any] = {
+        "workflow_params": json.dumps({}),
+        "workflow_type": "CWL",
+        "workflow_type_version": "v1.0",
+        "tags": json.dumps({}),
+        "workflow_engine_parameters": json.dumps({}),
+        "workflow_url": CWL_WF.name,
+        "workflow_attachment_sha256": json.dumps({"linked.txt": sha256}),
+    }
+    res: Response = client.post("/runs", data=data,
+                                content_type="multipart/form-data")
+
+    assert res.status_code == 200
+
+    run_id = res.get_json()["run_id"]
+    linked_file: Path = Path(tmpdir).joinpath(
+        run_id[:2], run_id, RUN_DIR_STRUCTURE["exe_dir"], "linked.txt")
+
+    assert linked_file.stat().st_ino == exe_files[0].stat().st_ino
+
+    data["workflow_attachment_sha256"] = json.dumps({"linked.txt": "0" * 64})
+    res = client.post("/runs", data=data, content_type="multipart/form-data")
+
+    assert res.status_code == 400
+
+    data["workflow_attachment_sha256"] = json.dumps({"../": sha256})
+    res = client.post("/runs", data=data, content_type="multipart/form-data")
+
+    assert res.status_code == 400
+    assert "not a valid file name" in res.get_json()["msg"]
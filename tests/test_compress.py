@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import gzip
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+
+from .test_reindex import make_run_dir
+
+
+def create_client(tmpdir: LocalPath) -> FlaskClient:  # type: ignore
+    for i in range(100):
+        make_run_dir(Path(tmpdir), f"{i:04x}-run", "COMPLETE")
+    with Path(tmpdir).joinpath("00", "0000-run", RUN_DIR_STRUCTURE["stdout"])\
+            .open("w") as f:
+        f.write("a line of the log\n" * 10000)
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+
+    return app.test_client()
+
+
+def test_compress(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    client: FlaskClient[Response] = create_client(tmpdir)
+
+    plain_res: Response = client.get("/runs")
+    res: Response = client.get("/runs", headers={"Accept-Encoding": "gzip"})
+
+    assert plain_res.content_encoding is None
+    assert res.content_encoding == "gzip"
+    assert "Accept-Encoding" in res.vary
+    assert gzip.decompress(res.data) == plain_res.data
+    assert res.headers["ETag"] == "W/" + plain_res.headers["ETag"]
+
+    res = client.get("/runs", headers={"Accept-Encoding": "gzip",
+                                       "If-None-Match": res.headers["ETag"]})
+
+    assert res.status_code == 304
+
+    res = client.get("/runs/0000-run/status",
+                     headers={"Accept-Encoding": "gzip"})
+
+    assert res.content_encoding is None
+
+
+def test_compress_stream(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    client: FlaskClient[Response] = create_client(tmpdir)
+
+    res: Response = client.get("/runs/0000-run/stdout",
+                               headers={"Accept-Encoding": "gzip"})
+
+    assert res.content_encoding == "gzip"
+    assert res.is_streamed
+    assert gzip.decompress(res.data) == b"a line of the log\n" * 10000
+
+    res = client.get("/runs/0000-run/stdout?tail=18",
+                     headers={"Accept-Encoding": "gzip"})
+
+    assert res.content_encoding is None
+    assert res.data == b"a line of the log\n"
+
+    res = client.get("/runs/0000-run/stdout",
+                     headers={"Accept-Encoding": "gzip",
+                              "Range": "bytes=0-17"})
+
+    assert res.status_code == 206
+    assert res.content_encoding is None
+
+
+def test_compress_zstd(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    zstandard = pytest.importorskip("zstandard")
+    client: FlaskClient[Response] = create_client(tmpdir)
+
+    plain_res: Response = client.get("/runs")
+    res: Response = client.get("/runs",
+                               headers={"Accept-Encoding": "gzip, zstd"})
+
+    assert res.content_encoding == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj()\
+        .decompress(res.data) == plain_res.data
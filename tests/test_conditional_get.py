@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_CACHE_MAX_AGE
+from genpei.util import write_file
+
+from .test_reindex import make_run_dir
+
+
+def test_conditional_get_run(delete_env_vars: None,
+                             tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "COMPLETE")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs/aaaa-run")
+    etag: str = res.headers["ETag"]
+
+    assert res.status_code == 200
+    assert res.cache_control.public is True
+    assert res.cache_control.max_age == RUN_CACHE_MAX_AGE
+
+    res = client.get("/runs/aaaa-run", headers={"If-None-Match": etag})
+
+    assert res.status_code == 304
+    assert res.data == b""
+    assert res.headers["ETag"] == etag
+
+    res = client.get("/runs/bbbb-run")
+    etag = res.headers["ETag"]
+
+    assert res.status_code == 200
+    assert res.cache_control.no_cache is True
+
+    write_file("bbbb-run", "state", "COMPLETE", Path(tmpdir))
+    res = client.get("/runs/bbbb-run", headers={"If-None-Match": etag})
+
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+
+def test_conditional_get_runs(delete_env_vars: None,
+                              tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs")
+    etag: str = res.headers["ETag"]
+
+    assert res.status_code == 200
+
+    res = client.get("/runs", headers={"If-None-Match": etag})
+
+    assert res.status_code == 304
+
+    res = client.get("/runs?state=RUNNING", headers={"If-None-Match": etag})
+
+    assert res.status_code == 200
+
+    write_file("aaaa-run", "state", "COMPLETE", Path(tmpdir))
+    res = client.get("/runs", headers={"If-None-Match": etag})
+
+    assert res.status_code == 200
+    assert res.get_json()["runs"][0]["state"] == "COMPLETE"
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import json
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.fairshare import order_queued_runs
+from genpei.registry import (get_owner_turns, list_queued_runs,
+                             record_owner_turn, set_run_owner, update_state)
+from genpei.type import QueuedRun, QueueInfo, RunLog, State
+
+from .test_post_runs_cancel import get_state
+
+SERVICE_INFO: Dict[str, Any] = {"resources": {"cores": 1, "ram": 4096},
+                                "owner_weights": {"bulk": 2}}
+
+
+def stub_params(duration: float) -> Dict[str, str]:
+    return {"--stub-duration": str(duration)}
+
+
+def queued_run(run_id: str, owner: str, seq: int, priority: int = 0,
+               cores: int = 1) -> QueuedRun:
+    return {"run_id": run_id, "owner": owner, "priority": priority,
+            "seq": seq, "resources": {"cores": cores, "ram": 256}}
+
+
+def test_order_queued_runs() -> None:
+    queued_runs: List[QueuedRun] = [
+        queued_run("a1", "a", 1), queued_run("a2", "a", 2),
+        queued_run("a3", "a", 3), queued_run("b1", "b", 4)]
+
+    # b takes its share as soon as it has fewer cores than a
+    assert [run["run_id"] for run in
+            order_queued_runs(queued_runs, {"a": 1}, {})] == \
+        ["b1", "a1", "a2", "a3"]
+    # a weighs twice b
+    assert [run["run_id"] for run in
+            order_queued_runs(queued_runs, {}, {"a": 2})] == \
+        ["a1", "b1", "a2", "a3"]
+    # The owners with the same share take turns
+    assert [run["run_id"] for run in
+            order_queued_runs(queued_runs, {}, {}, {"a": 1})] == \
+        ["b1", "a1", "a2", "a3"]
+
+
+def test_owner_turns(tmpdir: LocalPath) -> None:
+    run_base_dir: Path = Path(tmpdir)
+    record_owner_turn("a", run_base_dir)
+    record_owner_turn("b", run_base_dir)
+    record_owner_turn("a", run_base_dir)
+
+    assert get_owner_turns(run_base_dir) == {"a": 3, "b": 2}
+
+
+def test_list_queued_runs(tmpdir: LocalPath) -> None:
+    run_base_dir: Path = Path(tmpdir)
+    for run_id, owner, priority in [("a1", "a", 0), ("b1", "b", 0),
+                                    ("a2", "a", 5), ("a3", "a", 0)]:
+        update_state(run_id, State.QUEUED, run_base_dir)
+        set_run_owner(run_id, owner, priority, run_base_dir)
+    update_state("b2", State.RUNNING, run_base_dir)
+
+    assert [run["run_id"] for run in list_queued_runs(None, run_base_dir)] \
+        == ["a2", "a1", "a3", "b1"]
+    assert [run["run_id"] for run in list_queued_runs(2, run_base_dir)] == \
+        ["a2", "a1", "b1"]
+
+
+def test_fair_share(stub_client: Callable[..., FlaskClient],
+                    post_stub_run: Callable[..., Response],
+                    wait_state: Callable[..., str]) -> None:
+    client: FlaskClient[Response] = \
+        stub_client(["--max-concurrent-runs", "0"], SERVICE_INFO)
+    running: str = post_stub_run(client, stub_params(1.0),
+                                 {"owner": "bulk"}).get_json()["run_id"]
+    wait_state(client, running, ["RUNNING"])
+    bulk: List[str] = [post_stub_run(client, stub_params(0.5),
+                                     {"owner": "bulk"}).get_json()["run_id"]
+                       for _ in range(3)]
+    interactive: str = post_stub_run(
+        client, stub_params(0.5), {},
+        {"X-Genpei-Owner": "alice"}).get_json()["run_id"]
+
+    queue_info: QueueInfo = client.get("/queue").get_json()
+    owners: Dict[str, Any] = \
+        {owner["owner"]: owner for owner in queue_info["owners"]}
+
+    assert [owner["owner"] for owner in queue_info["owners"]] == \
+        ["alice", "bulk"]
+    assert owners["bulk"]["weight"] == 2.0
+    assert owners["bulk"]["active_runs"] == 1
+    assert owners["bulk"]["committed_cores"] == 1
+    assert owners["bulk"]["queued_runs"] == 3
+    assert owners["bulk"]["next_position"] == 1
+    assert owners["alice"]["weight"] == 1.0
+    assert owners["alice"]["queued_runs"] == 1
+    assert owners["alice"]["next_position"] == 0
+
+    # The single run of alice starts ahead of the runs queued before it
+    assert wait_state(client, interactive, ["RUNNING", "COMPLETE"]) in \
+        ["RUNNING", "COMPLETE"]
+    assert all(get_state(client, run_id) == "QUEUED" for run_id in bulk)
+
+    run_log: RunLog = client.get(f"/runs/{interactive}").get_json()
+
+    assert json.loads(run_log["request"]["tags"]) == \
+        {"owner": "alice", "priority": 0}
+
+    for run_id in bulk:
+        assert wait_state(client, run_id, ["COMPLETE"]) == "COMPLETE"
+
+
+def test_priority(stub_client: Callable[..., FlaskClient],
+                  post_stub_run: Callable[..., Response],
+                  wait_state: Callable[..., str]) -> None:
+    client: FlaskClient[Response] = \
+        stub_client(["--max-concurrent-runs", "0"], SERVICE_INFO)
+
+    res: Response = post_stub_run(client, stub_params(0), {},
+                                  {"X-Genpei-Priority": "high"})
+
+    assert res.status_code == 400
+    assert "priority" in res.get_json()["msg"]
+
+    running: str = \
+        post_stub_run(client, stub_params(0.5)).get_json()["run_id"]
+    wait_state(client, running, ["RUNNING"])
+    low: str = post_stub_run(client, stub_params(0.3)).get_json()["run_id"]
+    high: str = post_stub_run(client, stub_params(0.3),
+                              {"priority": 5}).get_json()["run_id"]
+
+    # The run of the highest priority starts first within an owner
+    assert wait_state(client, high, ["RUNNING", "COMPLETE"]) in \
+        ["RUNNING", "COMPLETE"]
+    assert get_state(client, low) == "QUEUED"
+    assert wait_state(client, low, ["COMPLETE"]) == "COMPLETE"
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import json
+from argparse import Namespace
+from pathlib import Path
+from threading import Timer
+from typing import Any, Dict, Iterator
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.type import StateEvent
+from genpei.util import write_file
+
+from .test_reindex import make_run_dir
+
+
+def read_event(chunks: Iterator[bytes]) -> StateEvent:
+    chunk: str = next(chunks).decode()
+    while chunk.startswith(":"):  # Comments, e.g. keep-alive
+        chunk = next(chunks).decode()
+    fields: Dict[str, str] = \
+        dict(line.split(": ", 1)  # type: ignore
+             for line in chunk.splitlines() if line != "")
+
+    assert fields["event"] == "state"
+
+    event: StateEvent = json.loads(fields["data"])
+
+    return event
+
+
+def test_get_events(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res: Response = client.get("/events?run_id=bbbb-run")
+
+    assert res.status_code == 200
+    assert res.mimetype == "text/event-stream"
+
+    Timer(0.5, write_file,
+          args=("aaaa-run", "state", "COMPLETE", Path(tmpdir))).start()
+    Timer(1.0, write_file,
+          args=("bbbb-run", "state", "COMPLETE", Path(tmpdir))).start()
+    chunks: Iterator[bytes] = res.response  # type: ignore
+    event: StateEvent = read_event(chunks)
+
+    assert event["run_id"] == "bbbb-run"
+    assert event["state"] == "COMPLETE"
+
+    res.close()
+    res = client.get("/events", headers={"Last-Event-ID": "0"})
+    chunks = res.response  # type: ignore
+
+    assert read_event(chunks)["run_id"] == "aaaa-run"
+    assert read_event(chunks)["run_id"] == "bbbb-run"
+
+    res.close()
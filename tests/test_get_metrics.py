@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import os
+import threading
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict, List
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.metrics import Metrics, expose_histogram
+
+from .test_reindex import make_run_dir
+
+
+def get_sample(body: str, sample: str) -> float:
+    for line in body.splitlines():
+        if line.startswith(sample + " "):
+            return float(line.split(" ")[-1])
+    raise KeyError(sample)
+
+
+def test_get_metrics(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    for i in range(3):
+        make_run_dir(Path(tmpdir), f"{i:04x}-run", "COMPLETE")
+    make_run_dir(Path(tmpdir), "0003-run", "EXECUTOR_ERROR")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--max-concurrent-runs", "2"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    client.get("/runs/0000-run")
+    client.get("/runs/unknown")
+    res: Response = client.get("/metrics")
+    body: str = res.get_data(as_text=True)
+
+    assert res.status_code == 200
+    assert res.mimetype == "text/plain"
+    assert get_sample(body, 'genpei_runs{state="COMPLETE"}') == 3
+    assert get_sample(body, 'genpei_runs{state="EXECUTOR_ERROR"}') == 1
+    assert get_sample(body, "genpei_queued_runs") == 0
+    assert get_sample(body, "genpei_max_concurrent_runs") == 2
+
+    duration: str = "genpei_http_request_duration_seconds"
+    fs_operations: str = "genpei_http_request_fs_operations"
+    endpoint: str = 'endpoint="genpei.get_runs_id"'
+
+    assert get_sample(body, f"{duration}_count{{{endpoint}}}") == 2
+    # The unknown run is looked up through the index alone
+    assert get_sample(body,
+                      f'{fs_operations}_bucket{{{endpoint},le="0"}}') == 1
+    assert get_sample(body, f"{fs_operations}_sum{{{endpoint}}}") > 0
+
+
+def test_metrics_shards() -> None:
+    metrics: Metrics = Metrics(["genpei.get_runs"], 3)
+    metrics.observe(metrics.request_duration, 0.02, "genpei.get_runs")
+    pids: List[int] = []
+    for _ in range(2):
+        pid: int = os.fork()
+        if pid == 0:
+            metrics.observe(metrics.request_duration, 3.0, "genpei.get_runs")
+            metrics.observe(metrics.run_spawn, 0.2)
+            os._exit(0)
+        pids.append(pid)
+    for pid in pids:
+        os.waitpid(pid, 0)
+    metrics.observe(metrics.request_duration, 100.0, "unknown")
+    body: str = "\n".join(
+        expose_histogram(metrics.request_duration,
+                         metrics.collect(metrics.request_duration)) +
+        expose_histogram(metrics.run_spawn,
+                         metrics.collect(metrics.run_spawn)))
+
+    duration: str = "genpei_http_request_duration_seconds"
+    endpoint: str = 'endpoint="genpei.get_runs"'
+
+    assert get_sample(body,
+                      f'{duration}_bucket{{{endpoint},le="0.025"}}') == 1
+    assert get_sample(body, f"{duration}_count{{{endpoint}}}") == 3
+    assert get_sample(body, f"{duration}_sum{{{endpoint}}}") == \
+        pytest.approx(6.02)
+    assert get_sample(body,
+                      f'{duration}_bucket{{endpoint="other",le="+Inf"}}') == 1
+    assert get_sample(body, "genpei_run_spawn_seconds_count") == 2
+
+
+def test_metrics_thread_shards() -> None:
+    metrics: Metrics = Metrics(["genpei.get_runs"], 3)
+
+    def observe() -> None:
+        for _ in range(10000):
+            metrics.observe(metrics.run_spawn, 0.2)
+
+    threads: List[threading.Thread] = \
+        [threading.Thread(target=observe) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    body: str = "\n".join(expose_histogram(
+        metrics.run_spawn, metrics.collect(metrics.run_spawn)))
+
+    # The threads left without a shard of their own share the last one
+    assert get_sample(body, "genpei_run_spawn_seconds_count") == 40000
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.type import QueueInfo, RunStatus
+
+from .test_reindex import make_run_dir
+
+
+def test_get_queue(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    make_run_dir(Path(tmpdir), "bbbb-run", "QUEUED")
+    make_run_dir(Path(tmpdir), "cccc-run", "QUEUED")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--max-concurrent-runs", "1"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res: Response = client.get("/queue")
+    res_data: QueueInfo = res.get_json()
+
+    assert res.status_code == 200
+    assert res_data["max_concurrent_runs"] == 1
+    assert res_data["active_runs"] == 1
+    assert res_data["queued_runs"] == 2
+    assert res_data["oldest_queued_wait_time"] >= 0.0
+
+    status_res: Response = client.get("/runs/bbbb-run/status")
+    status_data: RunStatus = status_res.get_json()
+
+    assert status_data["state"] == "QUEUED"  # type: ignore
@@ -1,9 +1,8 @@
 #!/usr/bin/env python3
 # coding: utf-8
 from argparse import Namespace
-from pathlib import Path
 from time import sleep
-from typing import Dict, Union
+from typing import Any, Dict
 
 from flask import Flask
 from flask.testing import FlaskClient
@@ -23,9 +22,9 @@ def get_run_id(client: FlaskClient,  # type: ignore
 
 def test_get_run_id(delete_env_vars: None, tmpdir: LocalPath) -> None:
     args: Namespace = parse_args(["--run-dir", str(tmpdir)])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.debug = params["debug"]  # type: ignore
+    app.debug = params["debug"]
     app.testing = True
     client: FlaskClient[Response] = app.test_client()
     from .post_runs_tests.test_access_remote_files import access_remote_files
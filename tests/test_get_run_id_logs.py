@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+
+from .test_reindex import make_run_dir
+
+
+def test_get_run_id_logs(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    Path(tmpdir).joinpath("aa", "aaaa-run", RUN_DIR_STRUCTURE["stderr"])\
+        .write_text("0123456789")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs/aaaa-run/stderr")
+
+    assert res.status_code == 200
+    assert res.get_data(as_text=True) == "0123456789"
+
+    res = client.get("/runs/aaaa-run/stderr", headers={"Range": "bytes=2-4"})
+
+    assert res.status_code == 206
+    assert res.get_data(as_text=True) == "234"
+
+    res = client.get("/runs/aaaa-run/stderr", query_string={"offset": 7})
+
+    assert res.get_data(as_text=True) == "789"
+
+    res = client.get("/runs/aaaa-run/stderr", query_string={"tail": 2})
+
+    assert res.get_data(as_text=True) == "89"
+
+    res = client.get("/runs/aaaa-run/stdout")
+
+    assert res.status_code == 200
+    assert res.get_data(as_text=True) == ""
+
+    assert client.get("/runs/aaaa-run/stderr", query_string={
+        "offset": -1}).status_code == 400
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+from genpei.type import OutputListResponse, RunLog
+
+from .test_reindex import make_run_dir
+
+
+def make_outputs(run_dir: Path, num: int) -> None:
+    outputs_dir: Path = run_dir.joinpath(RUN_DIR_STRUCTURE["outputs_dir"])
+    outputs_dir.joinpath("sub").mkdir(parents=True)
+    for i in range(num):
+        outputs_dir.joinpath("sub", f"out_{i}.txt").write_text(str(i))
+    run_dir.joinpath(RUN_DIR_STRUCTURE["cmd"]).write_text(
+        f"cwltool --outdir {outputs_dir} wf.cwl params.json")
+
+
+def test_get_run_id_outputs(delete_env_vars: None,
+                            tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "COMPLETE")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    complete_dir: Path = Path(tmpdir).joinpath("aa", "aaaa-run")
+    running_dir: Path = Path(tmpdir).joinpath("bb", "bbbb-run")
+    make_outputs(complete_dir, 3)
+    make_outputs(running_dir, 2)
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    run_log: RunLog = client.get("/runs/aaaa-run").get_json()
+
+    assert sorted(run_log["outputs"].keys()) == \
+        ["sub/out_0.txt", "sub/out_1.txt", "sub/out_2.txt"]
+    assert complete_dir.joinpath(RUN_DIR_STRUCTURE["outputs"]).exists()
+
+    output_list: OutputListResponse = client.get(
+        "/runs/aaaa-run/outputs", query_string={"page_size": 2}).get_json()
+
+    assert [output["name"] for output in output_list["outputs"]] == \
+        ["sub/out_0.txt", "sub/out_1.txt"]
+    assert output_list["outputs"][0]["size"] == 1
+
+    output_list = client.get("/runs/aaaa-run/outputs", query_string={
+        "page_size": 2,
+        "page_token": output_list["next_page_token"]
+    }).get_json()
+
+    assert [output["name"] for output in output_list["outputs"]] == \
+        ["sub/out_2.txt"]
+    assert output_list["next_page_token"] == ""
+
+    run_log = client.get("/runs/bbbb-run").get_json()
+
+    assert run_log["outputs"] == {}
+
+    output_list = client.get("/runs/bbbb-run/outputs").get_json()
+
+    assert len(output_list["outputs"]) == 2
+    assert not running_dir.joinpath(RUN_DIR_STRUCTURE["outputs"]).exists()
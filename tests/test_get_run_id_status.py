@@ -2,8 +2,9 @@
 # coding: utf-8
 from argparse import Namespace
 from pathlib import Path
-from time import sleep
-from typing import Dict, Union
+from threading import Timer
+from time import monotonic, sleep
+from typing import Any, Dict
 
 from flask import Flask
 from flask.testing import FlaskClient
@@ -11,7 +12,11 @@ from flask.wrappers import Response
 from py._path.local import LocalPath
 
 from genpei.app import create_app, handle_default_params, parse_args
-from genpei.type import RunId, RunStatus
+from genpei.registry import compare_and_set_state
+from genpei.type import RunId, RunStatus, State
+from genpei.util import write_file
+
+from .test_reindex import make_run_dir
 
 
 def get_run_id_status(client: FlaskClient,  # type: ignore
@@ -23,9 +28,9 @@ def get_run_id_status(client: FlaskClient,  # type: ignore
 
 def test_get_runs(delete_env_vars: None, tmpdir: LocalPath) -> None:
     args: Namespace = parse_args(["--run-dir", str(tmpdir)])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.debug = params["debug"]  # type: ignore
+    app.debug = params["debug"]
     app.testing = True
     client: FlaskClient[Response] = app.test_client()
     from .post_runs_tests.test_access_remote_files import access_remote_files
@@ -43,3 +48,50 @@ def test_get_runs(delete_env_vars: None, tmpdir: LocalPath) -> None:
     assert "run_id" in res_data
     assert "state" in res_data
     assert run_id == res_data["run_id"]
+
+
+def test_get_run_id_status_wait(delete_env_vars: None,
+                                tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    started_at: float = monotonic()
+    res: Response = client.get("/runs/aaaa-run/status?wait=1")
+    res_data: RunStatus = res.get_json()
+
+    assert res.status_code == 200
+    assert res_data["state"] == "RUNNING"  # type: ignore
+    assert monotonic() - started_at >= 1
+
+    Timer(0.5, write_file,
+          args=("aaaa-run", "state", "COMPLETE", Path(tmpdir))).start()
+    started_at = monotonic()
+    res = client.get("/runs/aaaa-run/status?wait=10&since=RUNNING")
+    res_data = res.get_json()
+
+    assert res.status_code == 200
+    assert res_data["state"] == "COMPLETE"  # type: ignore
+    assert monotonic() - started_at < 10
+
+    res = client.get("/runs/aaaa-run/status?wait=10&since=RUNNING")
+    res_data = res.get_json()
+
+    assert res_data["state"] == "COMPLETE"  # type: ignore
+
+    # The index has changed the state, but state.txt is not written yet
+    compare_and_set_state("aaaa-run", [State.COMPLETE], State.CANCELED,
+                          Path(tmpdir))
+    started_at = monotonic()
+    res = client.get("/runs/aaaa-run/status?wait=2&since=COMPLETE")
+    res_data = res.get_json()
+
+    assert res_data["state"] == "CANCELED"  # type: ignore
+    assert monotonic() - started_at < 1
+
+    res = client.get("/runs/aaaa-run/status?wait=10&since=FOO")
+
+    assert res.status_code == 400
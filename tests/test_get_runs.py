@@ -1,9 +1,11 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import json
 from argparse import Namespace
+from base64 import urlsafe_b64encode
 from pathlib import Path
 from time import sleep
-from typing import Dict, Union
+from typing import Any, Dict, List
 
 from flask import Flask
 from flask.testing import FlaskClient
@@ -12,6 +14,7 @@ from py._path.local import LocalPath
 
 from genpei.app import create_app, handle_default_params, parse_args
 from genpei.type import RunId, RunListResponse
+from genpei.util import write_file
 
 
 def get_runs(client: FlaskClient) -> Response:  # type: ignore
@@ -20,11 +23,15 @@ def get_runs(client: FlaskClient) -> Response:  # type: ignore
     return response
 
 
+def encode_token(page_token: Dict[str, Any]) -> str:
+    return urlsafe_b64encode(json.dumps(page_token).encode()).decode()
+
+
 def test_get_runs(delete_env_vars: None, tmpdir: LocalPath) -> None:
     args: Namespace = parse_args(["--run-dir", str(tmpdir)])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.debug = params["debug"]  # type: ignore
+    app.debug = params["debug"]
     app.testing = True
     client: FlaskClient[Response] = app.test_client()
     from .post_runs_tests.test_access_remote_files import access_remote_files
@@ -44,3 +51,61 @@ def test_get_runs(delete_env_vars: None, tmpdir: LocalPath) -> None:
     assert "run_id" in res_data["runs"][0]
     assert "state" in res_data["runs"][0]
     assert run_id == res_data["runs"][0]["run_id"]
+
+
+def test_get_runs_paging(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    from .test_reindex import make_run_dir
+    for i, state in enumerate(["COMPLETE", "RUNNING", "RUNNING",
+                               "QUEUED", "RUNNING"]):
+        make_run_dir(Path(tmpdir), f"{i}{i}-run", state)
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res_data: RunListResponse = \
+        client.get("/runs", query_string={"page_size": 2}).get_json()
+
+    assert len(res_data["runs"]) == 2
+    assert res_data["next_page_token"] != ""
+
+    with app.app_context():
+        write_file("55-run", "run_request", "{}")
+    run_ids: List[str] = [run["run_id"] for run in res_data["runs"]]
+    while res_data["next_page_token"] != "":
+        res_data = client.get("/runs", query_string={
+            "page_size": 2,
+            "page_token": res_data["next_page_token"]
+        }).get_json()
+        run_ids.extend([run["run_id"] for run in res_data["runs"]])
+
+    assert sorted(run_ids) == [f"{i}{i}-run" for i in range(5)]
+
+    res_data = client.get("/runs",
+                          query_string={"state": "RUNNING"}).get_json()
+
+    assert len(res_data["runs"]) == 3
+    assert res_data["next_page_token"] == ""
+    assert all(run["state"] == "RUNNING"  # type: ignore
+               for run in res_data["runs"])
+
+    assert client.get("/runs", query_string={
+        "state": "FOO"}).status_code == 400
+    assert client.get("/runs", query_string={
+        "page_size": 0}).status_code == 400
+    assert client.get("/runs", query_string={
+        "page_token": "foo"}).status_code == 400
+    page_token: Dict[str, Any] = {
+        "snapshot": 5, "after_seq": 0, "states": ["RUNNING"],
+        "submitted_after": None, "submitted_before": None}
+    for key, value in [("states", [1]), ("states", "RUNNING"),
+                       ("states", ["FOO"]), ("after_seq", "0"),
+                       ("snapshot", None), ("submitted_after", 0),
+                       ("submitted_before", "yesterday")]:
+        assert client.get("/runs", query_string={
+            "page_token": encode_token({**page_token, key: value})
+        }).status_code == 400
+    assert client.get("/runs", query_string={
+        "page_token": encode_token(page_token)}).status_code == 200
+    assert client.get("/runs", query_string={
+        "submitted_after": "yesterday"}).status_code == 400
@@ -1,22 +1,27 @@
 #!/usr/bin/env python3
 # coding: utf-8
+import json
+import os
 from argparse import Namespace
 from pathlib import Path
-from typing import Dict, Union
+from typing import Any, Dict
 
 from flask import Flask
 from flask.testing import FlaskClient
 from flask.wrappers import Response
+from py._path.local import LocalPath
 
 from genpei.app import create_app, handle_default_params, parse_args
-from genpei.type import ServiceInfo
+from genpei.const import DEFAULT_SERVICE_INFO
+from genpei.type import ServiceInfo, State
+from genpei.util import write_file
 
 
 def test_get_service_info(delete_env_vars: None) -> None:
     args: Namespace = parse_args([])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
-    app.debug = params["debug"]  # type: ignore
+    app.debug = params["debug"]
     app.testing = True
     client: FlaskClient[Response] = app.test_client()
     res: Response = client.get("/service-info")
@@ -32,3 +37,58 @@ def test_get_service_info(delete_env_vars: None) -> None:
     assert "auth_instructions_url" in res_data
     assert "contact_info_url" in res_data
     assert "tags" in res_data
+
+
+def test_system_state_counts(delete_env_vars: None,
+                             tmpdir: LocalPath) -> None:
+    from .test_reindex import make_run_dir
+    make_run_dir(Path(tmpdir), "aaaa-run", "COMPLETE")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    make_run_dir(Path(tmpdir), "cccc-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res_data: ServiceInfo = client.get("/service-info").get_json()
+
+    assert res_data["system_state_counts"] == \
+        {"COMPLETE": 1, "RUNNING": 2}  # type: ignore
+
+    with app.app_context():
+        write_file("bbbb-run", "state", State.COMPLETE.name)
+        write_file("dddd-run", "run_request", "{}")
+    res_data = client.get("/service-info").get_json()
+
+    assert res_data["system_state_counts"] == \
+        {"COMPLETE": 2, "RUNNING": 1, "UNKNOWN": 1}  # type: ignore
+
+
+def test_service_info_reload(delete_env_vars: None,
+                             tmpdir: LocalPath) -> None:
+    service_info: Path = Path(tmpdir).joinpath("service-info.json")
+    service_info.write_text(DEFAULT_SERVICE_INFO.read_text())
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--service-info", str(service_info)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res_data: ServiceInfo = client.get("/service-info").get_json()
+
+    assert res_data["tags"] == {"wes_name": "genpei"}
+
+    content: Dict[str, Any] = json.loads(service_info.read_text())
+    content["tags"]["wes_name"] = "reloaded"
+    service_info.write_text(json.dumps(content))
+    os.utime(service_info, ns=(0, 1))
+    res_data = client.get("/service-info").get_json()
+
+    assert res_data["tags"] == {"wes_name": "reloaded"}
+
+    service_info.write_text("{")
+    os.utime(service_info, ns=(0, 2))
+    res: Response = client.get("/service-info")
+
+    assert res.status_code == 200
+    assert res.get_json()["tags"] == {"wes_name": "reloaded"}
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+import pytest
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.util import read_file
+
+from .test_reindex import make_run_dir
+
+
+def create_client(tmpdir: LocalPath, json_backend: str) \
+        -> FlaskClient:  # type: ignore
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--json-backend", json_backend])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+
+    return app.test_client()
+
+
+def test_json_backend(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    pytest.importorskip("orjson")
+    for i in range(10):
+        make_run_dir(Path(tmpdir), f"{i:04x}-run", "COMPLETE")
+    responses: Dict[str, Dict[str, bytes]] = {}
+    for json_backend in ["json", "orjson"]:
+        client: FlaskClient[Response] = create_client(tmpdir, json_backend)
+        responses[json_backend] = {
+            path: client.get(path).data
+            for path in ["/runs", "/runs/0000-run", "/service-info",
+                         "/runs/0000-run/outputs", "/runs/unknown"]
+        }
+        assert client.application.config["JSON_BACKEND"] == json_backend
+
+    assert responses["json"] == responses["orjson"]
+
+    manifest = read_file("0000-run", "outputs", Path(tmpdir))
+
+    assert isinstance(manifest, list)
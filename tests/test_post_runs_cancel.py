@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from argparse import Namespace
+from pathlib import Path
+from time import sleep
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.type import RunIdList, RunStatus
+
+from .test_reindex import make_run_dir
+
+
+def get_state(client: FlaskClient, run_id: str) -> str:  # type: ignore
+    res: Response = client.get(f"/runs/{run_id}/status")
+    res_data: RunStatus = res.get_json()
+
+    return res_data["state"]  # type: ignore
+
+
+def test_post_runs_cancel(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    make_run_dir(Path(tmpdir), "bbbb-run", "QUEUED")
+    make_run_dir(Path(tmpdir), "cccc-run", "QUEUED")
+    make_run_dir(Path(tmpdir), "dddd-run", "QUEUED")
+    make_run_dir(Path(tmpdir), "eeee-run", "COMPLETE")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--max-concurrent-runs", "1"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.post("/runs/bbbb-run/cancel")
+
+    assert res.status_code == 200
+    assert get_state(client, "bbbb-run") == "CANCELED"
+
+    res = client.post("/runs/cancel",
+                      data={"run_id": ["cccc-run", "eeee-run"]})
+    res_data: RunIdList = res.get_json()
+
+    assert res.status_code == 200
+    assert res_data["run_ids"] == ["cccc-run"]
+    assert get_state(client, "cccc-run") == "CANCELED"
+    assert get_state(client, "eeee-run") == "COMPLETE"
+
+    res = client.post("/runs/cancel", data={"state": "QUEUED"})
+    res_data = res.get_json()
+
+    assert res.status_code == 200
+    assert res_data["run_ids"] == ["dddd-run"]
+    assert get_state(client, "dddd-run") == "CANCELED"
+
+    res = client.post("/runs/cancel")
+
+    assert res.status_code == 400
+
+    res = client.post("/runs/cancel", data={"run_id": "ffff-run"})
+
+    assert res.status_code == 404
+
+    res = client.post("/runs/aaaa-run/cancel")
+
+    assert res.status_code == 200
+    assert get_state(client, "aaaa-run") == "CANCELING"
+
+    for _ in range(50):
+        if get_state(client, "aaaa-run") == "CANCELED":
+            break
+        sleep(0.1)
+
+    assert get_state(client, "aaaa-run") == "CANCELED"
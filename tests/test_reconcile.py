@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import subprocess
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+from genpei.type import RunStatus
+
+from .test_reindex import make_run_dir
+
+
+def write_pid(run_base_dir: Path, run_id: str, pid: int) -> None:
+    run_dir: Path = run_base_dir.joinpath(run_id[:2]).joinpath(run_id)
+    with run_dir.joinpath(RUN_DIR_STRUCTURE["pid"]).open("w") as f:
+        f.write(str(pid))
+
+
+def get_state(client: FlaskClient, run_id: str) -> str:  # type: ignore
+    res: Response = client.get(f"/runs/{run_id}/status")
+    res_data: RunStatus = res.get_json()
+
+    return res_data["state"]  # type: ignore
+
+
+def test_reconcile(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    dead_process: "subprocess.Popen[bytes]" = subprocess.Popen(["true"])
+    dead_process.wait()
+    dead_pid: int = dead_process.pid
+    make_run_dir(Path(tmpdir), "aaaa-run", "RUNNING")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    write_pid(Path(tmpdir), "bbbb-run", dead_pid)
+    make_run_dir(Path(tmpdir), "cccc-run", "RUNNING")
+    Path(tmpdir).joinpath("cc", "cccc-run", RUN_DIR_STRUCTURE["pid"]).unlink()
+    make_run_dir(Path(tmpdir), "dddd-run", "CANCELING")
+    write_pid(Path(tmpdir), "dddd-run", dead_pid)
+    make_run_dir(Path(tmpdir), "eeee-run", "INITIALIZING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--max-concurrent-runs", "1"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    assert get_state(client, "aaaa-run") == "RUNNING"
+    assert get_state(client, "bbbb-run") == "SYSTEM_ERROR"
+    assert get_state(client, "cccc-run") == "SYSTEM_ERROR"
+    assert get_state(client, "dddd-run") == "CANCELED"
+    assert get_state(client, "eeee-run") == "QUEUED"
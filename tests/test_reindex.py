@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import json
+import subprocess
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict, List
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import RUN_DIR_STRUCTURE
+from genpei.type import RunListResponse, RunStatus
+
+# The processes standing for the runs, killed by the `run_processes`
+# fixture after each test
+RUN_PROCESSES: List["subprocess.Popen[bytes]"] = []
+
+
+def make_run_dir(run_base_dir: Path, run_id: str, state: str) -> None:
+    run_dir: Path = run_base_dir.joinpath(run_id[:2]).joinpath(run_id)
+    run_dir.mkdir(parents=True)
+    with run_dir.joinpath(RUN_DIR_STRUCTURE["run_request"]).open("w") as f:
+        json.dump({"workflow_type": "CWL"}, f)
+    with run_dir.joinpath(RUN_DIR_STRUCTURE["state"]).open("w") as f:
+        f.write(state)
+    if state in ["RUNNING", "CANCELING"]:
+        # A live process in a session of its own stands for the run, so
+        # that the reconciliation at startup and a cancel are harmless.
+        process: "subprocess.Popen[bytes]" = \
+            subprocess.Popen(["sleep", "60"], start_new_session=True)
+        RUN_PROCESSES.append(process)
+        with run_dir.joinpath(RUN_DIR_STRUCTURE["pid"]).open("w") as f:
+            f.write(str(process.pid))
+
+
+def test_reindex(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "COMPLETE")
+    make_run_dir(Path(tmpdir), "bbbb-run", "RUNNING")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir), "--reindex"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs")
+    res_data: RunListResponse = res.get_json()
+
+    assert res.status_code == 200
+    assert sorted([run["run_id"] for run in res_data["runs"]]) == \
+        ["aaaa-run", "bbbb-run"]
+
+    status_res: Response = client.get("/runs/bbbb-run/status")
+    status_data: RunStatus = status_res.get_json()
+
+    assert status_res.status_code == 200
+    assert status_data["state"] == "RUNNING"  # type: ignore
+
+    missing_res: Response = client.get("/runs/cccc-run/status")
+
+    assert missing_res.status_code == 404
+
+
+def test_index_built_for_existing_run_dir(delete_env_vars: None,
+                                          tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "aaaa-run", "COMPLETE")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+    res: Response = client.get("/runs/aaaa-run/status")
+
+    assert res.status_code == 200
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from time import sleep
+from typing import Any, Callable, Dict
+
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+
+from genpei.type import QueueInfo, RunLog
+
+from .test_post_runs_cancel import get_state
+
+SERVICE_INFO: Dict[str, Any] = {"resources": {"cores": 4, "ram": 4096}}
+
+
+def resource_params(cores: int, duration: float) -> Dict[str, str]:
+    return {"--cores": str(cores), "--stub-duration": str(duration)}
+
+
+def test_run_resources_validation(
+        stub_client: Callable[..., FlaskClient],
+        post_stub_run: Callable[..., Response]) -> None:
+    client: FlaskClient[Response] = \
+        stub_client(["--max-concurrent-runs", "0"], SERVICE_INFO)
+    service_info: Dict[str, Any] = client.get("/service-info").get_json()
+
+    assert service_info["resources"] == {"cores": 4, "ram": 4096}
+
+    res: Response = post_stub_run(client, resource_params(8, 0))
+
+    assert res.status_code == 400
+    assert "more than the 4 cores" in res.get_json()["msg"]
+
+    res = post_stub_run(client, resource_params(0, 0))
+
+    assert res.status_code == 400
+
+    res = post_stub_run(client, resource_params(1, 0), {"ram": "8192"})
+
+    assert res.status_code == 400
+    assert "8192 ram" in res.get_json()["msg"]
+
+
+def test_backfill(stub_client: Callable[..., FlaskClient],
+                  post_stub_run: Callable[..., Response],
+                  wait_state: Callable[..., str]) -> None:
+    client: FlaskClient[Response] = \
+        stub_client(["--max-concurrent-runs", "0"], SERVICE_INFO)
+    large: str = \
+        post_stub_run(client, resource_params(3, 1.5)).get_json()["run_id"]
+    wait_state(client, large, ["RUNNING"])
+    blocked: str = \
+        post_stub_run(client, resource_params(2, 0)).get_json()["run_id"]
+    small: str = \
+        post_stub_run(client, resource_params(1, 0)).get_json()["run_id"]
+
+    # The small run fits in the core left by the large one
+    assert wait_state(client, small, ["COMPLETE"]) == "COMPLETE"
+    assert get_state(client, large) == "RUNNING"
+    assert get_state(client, blocked) == "QUEUED"
+
+    queue_info: QueueInfo = client.get("/queue").get_json()
+
+    assert queue_info["resources"] == {"cores": 4, "ram": 4096}
+    assert queue_info["committed_resources"] == {"cores": 3, "ram": 256}
+
+    assert wait_state(client, blocked, ["COMPLETE"]) == "COMPLETE"
+
+    run_log: RunLog = client.get(f"/runs/{large}").get_json()
+
+    assert "--parallel --parallel-max 3" in \
+        run_log["run_log"]["cmd"]  # type: ignore
+    assert "--cores" not in run_log["run_log"]["cmd"]  # type: ignore
+
+
+def test_no_backfill(stub_client: Callable[..., FlaskClient],
+                     post_stub_run: Callable[..., Response],
+                     wait_state: Callable[..., str]) -> None:
+    client: FlaskClient[Response] = stub_client(
+        ["--max-concurrent-runs", "0", "--backfill-timeout", "0"],
+        SERVICE_INFO)
+    large: str = \
+        post_stub_run(client, resource_params(3, 1.0)).get_json()["run_id"]
+    wait_state(client, large, ["RUNNING"])
+    blocked: str = \
+        post_stub_run(client, resource_params(2, 0)).get_json()["run_id"]
+    small: str = \
+        post_stub_run(client, resource_params(1, 0)).get_json()["run_id"]
+    sleep(0.3)
+
+    # Nothing starts ahead of the run waiting at the head of the queue
+    assert get_state(client, large) == "RUNNING"
+    assert get_state(client, small) == "QUEUED"
+
+    assert wait_state(client, blocked, ["COMPLETE"]) == "COMPLETE"
+    assert wait_state(client, small, ["COMPLETE"]) == "COMPLETE"
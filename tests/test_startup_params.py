@@ -2,20 +2,24 @@
 # coding: utf-8
 from argparse import Namespace
 from pathlib import Path
-from typing import Dict, Union
+from typing import Any, Dict
 
 from _pytest.monkeypatch import MonkeyPatch
 from flask import Flask
+from py._path.local import LocalPath
 
 from genpei.app import create_app, handle_default_params, parse_args
 from genpei.const import DEFAULT_HOST, DEFAULT_PORT
+from genpei.metrics import is_process_alive
+from genpei.scheduler import Scheduler
+from genpei.server import get_server_options
 
 base_dir: Path = Path(__file__).parent.parent.resolve()
 
 
 def test_default_params(delete_env_vars: None) -> None:
     args: Namespace = parse_args([])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
 
     assert params["host"] == DEFAULT_HOST
@@ -35,7 +39,7 @@ def test_env_vars(delete_env_vars: None, monkeypatch: MonkeyPatch) -> None:
                        str(base_dir.joinpath("genpei/service-info.json")))
 
     args: Namespace = parse_args([])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
 
     assert params["host"] == "127.0.0.1"
@@ -54,7 +58,7 @@ def test_parse_args(delete_env_vars: None) -> None:
                     "--run-dir", str(base_dir.joinpath("run")),
                     "--service-info",
                     str(base_dir.joinpath("genpei/service-info.json"))])
-    params: Dict[str, Union[str, int, Path]] = handle_default_params(args)
+    params: Dict[str, Any] = handle_default_params(args)
     app: Flask = create_app(params)
 
     assert params["host"] == "127.0.0.1"
@@ -63,3 +67,44 @@ def test_parse_args(delete_env_vars: None) -> None:
     assert app.config["RUN_DIR"] == base_dir.joinpath("run")
     assert app.config["SERVICE_INFO"] == \
         base_dir.joinpath("genpei/service-info.json")
+
+
+def test_server_options(delete_env_vars: None,
+                        monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("GENPEI_BACKLOG", "128")
+    args: Namespace = \
+        parse_args(["--host", "0.0.0.0",
+                    "--port", "8888",
+                    "--workers", "4",
+                    "--threads", "8",
+                    "--keep-alive", "5"])
+    params: Dict[str, Any] = handle_default_params(args)
+    options: Dict[str, Any] = get_server_options(params)
+
+    assert options["bind"] == "0.0.0.0:8888"
+    assert options["workers"] == 4
+    assert options["threads"] == 8
+    assert options["keepalive"] == 5
+    assert options["backlog"] == 128
+
+
+def test_scheduler_process(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--workers", "2"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    scheduler: Scheduler = app.extensions["genpei_scheduler"]
+
+    # No thread runs in the master the workers are forked from
+    assert scheduler.thread is None
+
+    scheduler.start_process()
+    assert scheduler.scheduler_pid is not None
+    scheduler_pid: int = scheduler.scheduler_pid
+
+    assert is_process_alive(scheduler_pid)
+
+    scheduler.stop_process()
+
+    assert scheduler.scheduler_pid is None
+    assert not is_process_alive(scheduler_pid)
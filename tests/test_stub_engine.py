@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# coding: utf-8
+from pathlib import Path
+from typing import Callable, List
+
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+
+from genpei.const import TERMINAL_STATES
+from genpei.type import RunLog
+
+
+def test_stub_engine(stub_client: Callable[..., FlaskClient],
+                     post_stub_run: Callable[..., Response],
+                     wait_state: Callable[..., str]) -> None:
+    client: FlaskClient[Response] = \
+        stub_client(["--max-concurrent-runs", "2"])
+    run_ids: List[str] = [
+        post_stub_run(client, {"--stub-duration": "0.2",
+                               "--stub-outputs": "3",
+                               "--stub-output-size": "100"})
+        .get_json()["run_id"] for _ in range(3)]
+    failed_run_id: str = post_stub_run(
+        client, {"--stub-failure-rate": "1.0"}).get_json()["run_id"]
+    for run_id in [*run_ids, failed_run_id]:
+        wait_state(client, run_id, [state.name for state in TERMINAL_STATES])
+
+    for run_id in run_ids:
+        res: Response = client.get(f"/runs/{run_id}")
+        res_data: RunLog = res.get_json()
+
+        assert res_data["state"] == "COMPLETE"  # type: ignore
+        assert res_data["run_log"]["cmd"].startswith("stub ")  # type: ignore
+        assert res_data["run_log"]["exit_code"] == 0  # type: ignore
+        assert sorted(res_data["outputs"]) == \
+            ["output_0.txt", "output_1.txt", "output_2.txt"]  # type: ignore
+        assert Path(res_data["outputs"]["output_0.txt"])\
+            .stat().st_size == 100  # type: ignore
+        assert "output_0" in \
+            client.get(f"/runs/{run_id}/stdout").get_data(as_text=True)
+
+    res = client.get(f"/runs/{failed_run_id}")
+    res_data = res.get_json()
+
+    assert res_data["state"] == "EXECUTOR_ERROR"  # type: ignore
+    assert res_data["run_log"]["exit_code"] == 1  # type: ignore
+    assert res_data["outputs"] == {}  # type: ignore
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+import pstats
+from argparse import Namespace
+from pathlib import Path
+from typing import Any, Dict
+
+from flask import Flask
+from flask.testing import FlaskClient
+from flask.wrappers import Response
+from py._path.local import LocalPath
+
+from genpei.app import create_app, handle_default_params, parse_args
+from genpei.const import TRACE_HEADER
+
+from .post_runs_tests.test_stream_attachments import post_with_attachment
+from .test_reindex import make_run_dir
+
+
+def test_trace(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    make_run_dir(Path(tmpdir), "0000-run", "COMPLETE")
+    profile_dir: Path = Path(tmpdir).joinpath("profile")
+    args: Namespace = parse_args(["--run-dir", str(tmpdir), "--trace",
+                                  "--profile-dir", str(profile_dir)])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs/0000-run")
+
+    assert "Server-Timing" not in res.headers
+    assert not profile_dir.exists()
+
+    res = client.get("/runs/0000-run", headers={TRACE_HEADER: "1"})
+    timings: Dict[str, str] = {
+        timing.split(";")[0]: timing
+        for timing in res.headers["Server-Timing"].split(", ")}
+
+    assert res.status_code == 200
+    assert "get_state" in timings
+    assert "read_file" in timings
+    assert "get_outputs" in timings
+    assert "total" in timings
+
+    profile_file: Path = \
+        profile_dir.joinpath(res.headers[f"{TRACE_HEADER}-Profile"])
+    stats: pstats.Stats = pstats.Stats(str(profile_file))
+
+    assert stats.total_calls > 0  # type: ignore
+
+
+def test_trace_sample_rate(delete_env_vars: None, tmpdir: LocalPath) -> None:
+    args: Namespace = parse_args(["--run-dir", str(tmpdir),
+                                  "--trace-sample-rate", "1.0"])
+    params: Dict[str, Any] = handle_default_params(args)
+    app: Flask = create_app(params)
+    app.testing = True
+    client: FlaskClient[Response] = app.test_client()
+
+    res: Response = client.get("/runs")
+
+    assert "GenpeiJSONProvider.response" in res.headers["Server-Timing"]
+    assert f"{TRACE_HEADER}-Profile" not in res.headers
+
+    res = post_with_attachment(client, b"genpei")
+
+    # The attachments are uploaded while the form is parsed
+    assert res.status_code == 200
+    assert "GenpeiRequest._load_form_data" in res.headers["Server-Timing"]
+    assert "prepare_exe_dir" in res.headers["Server-Timing"]